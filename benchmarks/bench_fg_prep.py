@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark Feature Group preparation
+===================================
+
+Compare the time and the peak memory of `check_fg_prep` and `cast_object_to_string` with their previous
+implementation, on a wide frame of object columns.
+
+    python benchmarks/bench_fg_prep.py --rows 1000000 --object-columns 20
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+from time import perf_counter
+
+import numpy
+import pandas
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from feature_group_ingestion import cast_object_to_string, check_fg_prep  # noqa: E402
+
+
+def legacy_cast_object_to_string(data_frame: pandas.DataFrame) -> pandas.DataFrame:
+    obj_cols = data_frame.select_dtypes(["object"]).columns.tolist()
+    data_frame[obj_cols] = data_frame[obj_cols].astype("str").astype("string")
+    return data_frame
+
+
+def legacy_check_fg_prep(features: pandas.DataFrame,
+                         record_identifier_name: str = 'PassengerId',
+                         event_time_feature_name: str = 'EventTime') -> pandas.DataFrame:
+    lg_fg = len(features[record_identifier_name])
+    lg_uniq = len(features[record_identifier_name].unique())
+    if lg_fg != lg_uniq:
+        raise Exception(f'\tColumn {record_identifier_name} for feature group has {abs(lg_fg - lg_uniq)}')
+
+    features[event_time_feature_name] = pandas.to_datetime('now', utc=True).strftime('%Y-%m-%dT%H:%M:%SZ')
+    features[event_time_feature_name] = features[event_time_feature_name].astype(str).astype('string')
+
+    return legacy_cast_object_to_string(features)
+
+
+def make_data(n_rows: int, n_object_columns: int) -> pandas.DataFrame:
+    rng = numpy.random.default_rng(0)
+    values = numpy.array(['S', 'C', 'Q', None], dtype=object)
+    data = pandas.DataFrame({f'object_{n}': values[rng.integers(0, len(values), n_rows)]
+                             for n in range(n_object_columns)})
+    data['PassengerId'] = numpy.arange(n_rows)
+    data['fare'] = rng.uniform(0, 500, n_rows)
+    return data
+
+
+def measure(function, data: pandas.DataFrame) -> dict:
+    tracemalloc.start()
+    starting_time = perf_counter()
+    function(data)
+    seconds = perf_counter() - starting_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': round(seconds, 4), 'peak_mb': round(peak / 2 ** 20, 1)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("Benchmark Feature Group preparation")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--object-columns", type=int, default=20)
+    args = parser.parse_args()
+
+    benchmarks = {
+        'cast_object_to_string': (legacy_cast_object_to_string, cast_object_to_string),
+        'check_fg_prep': (legacy_check_fg_prep, lambda data: check_fg_prep(data, 'PassengerId', 'EventTime')),
+    }
+
+    for name, (legacy, current) in benchmarks.items():
+        for label, function in [('legacy', legacy), ('current', current)]:
+            result = measure(function, make_data(args.rows, args.object_columns))
+            print(f'{name:<24}{label:<10}{result["seconds"]:>10.4f} s{result["peak_mb"]:>10.1f} MB')
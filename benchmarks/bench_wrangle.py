@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark Data Wrangling
+========================
+
+Compare reading and wrangling a Titanic-shaped CSV file with the previous implementation, which read every column
+and then scanned the whole frame to replace the null tokens, and with the current one, which drops the columns and
+parses the null tokens in the reader.
+
+    python benchmarks/bench_wrangle.py --rows 2000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from time import perf_counter
+
+import numpy
+import pandas
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from data_io import read_data  # noqa: E402
+from data_wrangling import DROP_COLUMNS, NULL_TOKENS, wrangle  # noqa: E402
+
+
+def legacy_wrangle(path: str) -> pandas.DataFrame:
+    data = read_data(path)
+    data.columns = [col.lower().strip() for col in data.columns]
+    data = data.drop(['cabin', 'ticket', 'name'], axis=1)
+    return data.replace(['nan', '', ' ', None, 'NaN'], numpy.nan)
+
+
+def current_wrangle(path: str) -> pandas.DataFrame:
+    return wrangle.step(read_data(path, drop=DROP_COLUMNS, na_values=NULL_TOKENS))
+
+
+def make_csv(path: str, n_rows: int) -> None:
+    rng = numpy.random.default_rng(0)
+    pandas.DataFrame({
+        'PassengerId': numpy.arange(1, n_rows + 1),
+        'Survived': rng.integers(0, 2, n_rows),
+        'Pclass': rng.integers(1, 4, n_rows),
+        'Name': numpy.array(['Braund, Mr. Owen Harris', 'Heikkinen, Miss. Laina'], dtype=object)[
+            rng.integers(0, 2, n_rows)],
+        'Sex': numpy.array(['male', 'female'], dtype=object)[rng.integers(0, 2, n_rows)],
+        'Age': numpy.where(rng.random(n_rows) < 0.2, numpy.nan, rng.integers(1, 80, n_rows)),
+        'SibSp': rng.integers(0, 6, n_rows),
+        'Parch': rng.integers(0, 6, n_rows),
+        'Ticket': numpy.array(['A/5 21171', 'PC 17599', 'STON/O2. 3101282'], dtype=object)[
+            rng.integers(0, 3, n_rows)],
+        'Fare': rng.uniform(0, 500, n_rows).round(4),
+        'Cabin': numpy.array(['', 'C85', 'C123', ' '], dtype=object)[rng.integers(0, 4, n_rows)],
+        'Embarked': numpy.array(['S', 'C', 'Q', 'nan'], dtype=object)[rng.integers(0, 4, n_rows)],
+    }).to_csv(path, index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("Benchmark Data Wrangling")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'titanic.csv')
+        make_csv(path, args.rows)
+
+        results = {}
+        for label, function in [('legacy', legacy_wrangle), ('current', current_wrangle)]:
+            starting_time = perf_counter()
+            results[label] = function(path)
+            print(f'{label:<10}{perf_counter() - starting_time:>10.4f} s')
+
+    pandas.testing.assert_frame_equal(results['legacy'], results['current'])
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark Pipeline Stages
+=========================
+
+Time the pipeline stages on synthetic Titanic-shaped data (see `synthetic`) of increasing sizes, to find the scaling
+cliffs of every stage. For every size and stage the throughput and the peak memory allocated by Python are recorded:
+
+- in memory: `wrangle`, `process_features`, `validate_features`, `check_fg_prep` and `cast_object_to_string`, called
+  undecorated on the output of the previous stage
+- through `data_args`: the wrangling, processing and validation steps reading and writing files in `--format`, as
+  the pipeline runs them. Sizes above `--max-memory-rows` are only run this way, streamed in chunks of
+  `--chunk-size` rows
+
+The time is measured in a first run and the memory in a second one traced with tracemalloc, which slows it down.
+A stage whose time per row grows more than `--cliff` times from one size to the next is flagged. The results are
+appended as JSON lines to `--output`, if given.
+
+    python benchmarks/run_benchmarks.py --rows 10000 100000 1000000 10000000 --format parquet
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from time import perf_counter
+from typing import Callable
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import feature_group_ingestion  # noqa: E402
+from data_wrangling import wrangle  # noqa: E402
+from feature_group_ingestion import cast_object_to_string, check_fg_prep  # noqa: E402
+from feature_processing import process_features  # noqa: E402
+from feature_validation import validate_features, validate_file  # noqa: E402
+from synthetic import DEFAULT_CHUNK_SIZE, make_titanic, write_titanic  # noqa: E402
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+MAX_MEMORY_ROWS = 10_000_000
+CLIFF = 2.0
+
+
+def measure(function: Callable[[], object], setup: Callable[[], tuple] = tuple, trace_memory: bool = True) -> dict:
+    """
+    Time a stage and trace its peak memory
+
+    Params:
+        - function (Callable): The stage, called with the result of `setup`
+        - setup (Callable): Prepares the input of every run of the stage, not timed
+        - trace_memory (bool): Run the stage a second time to trace its peak memory
+
+    Return:
+        - dict: The seconds and the peak MB allocated by Python, None if not traced
+    """
+    inputs = setup()
+    starting_time = perf_counter()
+    function(*inputs)
+    seconds = perf_counter() - starting_time
+
+    peak_mb = None
+    if trace_memory:
+        inputs = setup()
+        tracemalloc.start()
+        function(*inputs)
+        peak_mb = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        tracemalloc.stop()
+
+    return {'seconds': round(seconds, 4), 'peak_mb': peak_mb}
+
+
+def memory_stages(n_rows: int) -> dict[str, tuple[Callable, Callable]]:
+    """The stages run in memory, with the setup of their input"""
+    raw = make_titanic(n_rows)
+    wrangled = wrangle.step(raw.copy())
+    processed = process_features.step(wrangled.copy())
+    validation_args = argparse.Namespace(validation_mode='collect')
+
+    return {
+        'wrangle': (wrangle.step, lambda: (raw.copy(),)),
+        'process_features': (process_features.step, lambda: (wrangled.copy(),)),
+        'validate_features': (lambda data: validate_features.step(data, args=validation_args), lambda: (processed,)),
+        'check_fg_prep': (lambda data: check_fg_prep(data, 'PassengerId', 'EventTime'),
+                          lambda: (processed.copy(),)),
+        'cast_object_to_string': (cast_object_to_string, lambda: (wrangled.copy(),)),
+    }
+
+
+def io_stages(n_rows: int, data_path: str, file_format: str, chunk_size: int | None) -> dict[str, tuple]:
+    """The steps run through `data_args` on files, the raw file is written first"""
+    write_titanic(os.path.join(data_path, f'raw.{file_format}'), n_rows, file_format=file_format)
+
+    def step_args(step_name: str, input_file: str, output_file: str | None = None) -> argparse.Namespace:
+        return argparse.Namespace(step_name=step_name, data_path=data_path, input_file=input_file,
+                                  output_file=output_file, file_format=file_format, columns=None,
+                                  chunk_size=chunk_size, workers=None, cache_dir=None, compact_dtypes=False,
+                                  validation_mode='collect')
+
+    wrangle_args = step_args('io_wrangle', f'raw.{file_format}', f'wrangled.{file_format}')
+    process_args = step_args('io_process_features', f'wrangled.{file_format}', f'processed.{file_format}')
+    validate_args = step_args('io_validate_features', f'processed.{file_format}')
+
+    return {
+        'io_wrangle': (lambda: wrangle(args=wrangle_args), tuple),
+        'io_process_features': (lambda: process_features(args=process_args), tuple),
+        'io_validate_features': (lambda: validate_file(validate_args) if chunk_size
+                                 else validate_features(args=validate_args), tuple),
+    }
+
+
+def run(args: argparse.Namespace) -> list[dict]:
+    results = []
+    seconds_per_row: dict[str, float] = {}
+
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as data_path:
+            streamed = n_rows > args.max_memory_rows
+            stages = {} if streamed else memory_stages(n_rows)
+            stages.update(io_stages(n_rows, data_path, args.file_format, args.chunk_size if streamed else None))
+
+            for stage, (function, setup) in stages.items():
+                # The steps print their summaries, only the results are shown
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = measure(function, setup, trace_memory=not args.no_memory)
+
+                per_row = result['seconds'] / n_rows
+                cliff = stage in seconds_per_row and per_row > args.cliff * seconds_per_row[stage]
+                seconds_per_row[stage] = per_row
+
+                result = {'stage': stage, 'rows': n_rows, 'format': args.file_format, 'streamed': streamed,
+                          'rows_per_s': round(n_rows / result['seconds']) if result['seconds'] else None,
+                          **result, 'cliff': cliff}
+                results.append(result)
+
+                peak = '-' if result['peak_mb'] is None else f'{result["peak_mb"]:.1f}'
+                print(f'{stage:<24}{n_rows:>12}{result["seconds"]:>10.4f} s{result["rows_per_s"] or 0:>14} rows/s'
+                      f'{peak:>10} MB{"  <- cliff" if cliff else ""}')
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("Benchmark Pipeline Stages")
+    parser.add_argument("--rows", type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument("--format", dest="file_format", choices=["csv", "parquet", "feather", "mmap"],
+                        default="parquet")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--max-memory-rows", type=int, default=MAX_MEMORY_ROWS)
+    parser.add_argument("--cliff", type=float, default=CLIFF)
+    parser.add_argument("--no-memory", action="store_true", help="Don't trace the memory, halves the run time")
+    parser.add_argument("--output", type=str, default=None, help="JSON lines file the results are appended to")
+    args = parser.parse_args()
+
+    # check_fg_prep warns about the EventTime column it creates on every run
+    feature_group_ingestion.logger.setLevel(logging.ERROR)
+
+    results = run(args)
+
+    if args.output is not None:
+        with open(args.output, 'a') as file:
+            file.writelines(json.dumps(result) + '\n' for result in results)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark Feature Serving
+=========================
+
+Latency percentiles of the feature lookups of `feature_serving`, on the processed features of synthetic Titanic
+passengers (see `synthetic`):
+
+- `index_get` and `index_batch`: a record and a batch of `--batch-size` records from the in-memory index
+- `fallback_miss` and `fallback_hit`: a record not indexed, read through from a `LocalFeatureStore` answering after
+  `--latency-ms`, and the same record again from the LRU cache
+- `socket_get` and `socket_batch`: a record and a batch through the localhost TCP endpoint
+
+    python benchmarks/serving_latency.py --rows 1000000 --lookups 10000 --batch-size 100
+"""
+import argparse
+import json
+import os
+import sys
+
+from time import perf_counter
+from typing import Callable, Sequence
+
+import numpy
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from data_wrangling import wrangle  # noqa: E402
+from feature_processing import process_features  # noqa: E402
+from feature_serving import FeatureIndex, FeatureService, ServingClient, ServingServer  # noqa: E402
+from local_feature_store import LocalFeatureStore, feature_definitions  # noqa: E402
+from synthetic import make_titanic  # noqa: E402
+
+PERCENTILES = [50, 90, 99]
+
+
+def latencies(lookup: Callable, keys: Sequence) -> dict:
+    """Percentiles and maximum in microseconds of the lookup of every key"""
+    times = numpy.empty(len(keys))
+    for i, key in enumerate(keys):
+        starting_time = perf_counter()
+        lookup(key)
+        times[i] = perf_counter() - starting_time
+
+    times *= 10 ** 6
+    result = {f'p{q}_us': round(float(value), 1) for q, value in zip(PERCENTILES, numpy.percentile(times, PERCENTILES))}
+    result['max_us'] = round(float(times.max()), 1)
+    return result
+
+
+def run(args: argparse.Namespace) -> list[dict]:
+    data = process_features.step(wrangle.step(make_titanic(args.rows)))
+    rng = numpy.random.default_rng(0)
+
+    starting_time = perf_counter()
+    index = FeatureIndex(data)
+    print(f'Index of {len(index)} records built in {perf_counter() - starting_time:.2f} s, '
+          f'{index.memory_usage() / 2 ** 20:.1f} MB')
+
+    # The records of the second half are only in the fallback store
+    indexed = FeatureIndex(data.iloc[:len(data) // 2])
+    store = LocalFeatureStore(latency=args.latency_ms / 1000)
+    records = data.iloc[len(data) // 2:].reset_index().assign(EventTime='2023-01-01T00:00:00Z')
+    store.create_feature_group(FeatureGroupName='titanic', RecordIdentifierFeatureName='PassengerId',
+                               EventTimeFeatureName='EventTime', FeatureDefinitions=feature_definitions(records))
+    missing = records['PassengerId'].to_numpy()[rng.choice(len(records), args.lookups, replace=False)].tolist()
+    for record_id in missing:
+        record = records[records['PassengerId'] == record_id].astype(str).iloc[0]
+        store.put_record(FeatureGroupName='titanic',
+                         Record=[{'FeatureName': name, 'ValueAsString': value} for name, value in record.items()])
+    service = FeatureService(indexed, client=store, feature_group_name='titanic')
+
+    ids = data.index.to_numpy()
+    keys = ids[rng.integers(0, len(ids), args.lookups)].tolist()
+    batches = [ids[rng.integers(0, len(ids), args.batch_size)].tolist() for _ in range(args.lookups // 10 or 1)]
+
+    results = {'index_get': latencies(index.get, keys),
+               'index_batch': latencies(index.get_batch, batches),
+               'fallback_miss': latencies(service.get, missing),
+               'fallback_hit': latencies(service.get, missing)}
+
+    with ServingServer(FeatureService(index)) as server, ServingClient(server.address) as client:
+        results['socket_get'] = latencies(client.get, keys)
+        results['socket_batch'] = latencies(client.get_batch, batches)
+
+    results = [{'lookup': lookup, 'rows': args.rows, 'batch_size': args.batch_size, **result}
+               for lookup, result in results.items()]
+    for result in results:
+        print(f'{result["lookup"]:<16}' + ''.join(f'{key:>10} {value:>10.1f}' for key, value in result.items()
+                                                  if key.endswith('_us')))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("Benchmark Feature Serving")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=5.0,
+                        help="Milliseconds the fallback store waits on every call")
+    parser.add_argument("--output", type=str, default=None, help="File the results are appended to, as JSON lines")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'a') as file:
+            file.writelines(json.dumps(result) + '\n' for result in results)
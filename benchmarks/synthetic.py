@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic Titanic Data
+======================
+
+Generator of Titanic-shaped passengers at any scale, with the schema and the distributions of the original dataset:
+class and port frequencies, age and fare depending on the class, 20% of missing ages, 77% of missing cabins and a
+survival rate depending on the sex and the class. The generated data passes the feature validation once wrangled and
+processed.
+
+The rows are generated in chunks, reproducible from the seed and the chunk size, so files of 10^8 rows are written
+without keeping them in memory:
+
+    python benchmarks/synthetic.py --rows 100000000 --output /tmp/titanic.parquet
+"""
+import argparse
+import os
+import sys
+
+from typing import Iterator
+
+import numpy
+import pandas
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from data_io import INDEX_COL, write_chunks  # noqa: E402
+
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+PCLASS = ([1, 2, 3], [0.24, 0.21, 0.55])
+EMBARKED = (['S', 'C', 'Q', None], [0.722, 0.189, 0.087, 0.002])
+SIBSP = ([0, 1, 2, 3, 4, 5, 8], [0.682, 0.235, 0.031, 0.018, 0.02, 0.006, 0.008])
+PARCH = ([0, 1, 2, 3, 4, 5], [0.761, 0.132, 0.09, 0.006, 0.005, 0.006])
+# Mean and standard deviation of the age, median fare of every class
+AGE_BY_CLASS = {1: (38.2, 14.8), 2: (29.9, 14.0), 3: (25.1, 12.5)}
+FARE_BY_CLASS = {1: 60.3, 2: 14.3, 3: 8.05}
+# Survival rate by sex and class
+SURVIVAL = {('female', 1): 0.968, ('female', 2): 0.921, ('female', 3): 0.5,
+            ('male', 1): 0.369, ('male', 2): 0.157, ('male', 3): 0.135}
+
+TITLES = {'male': ['Mr.', 'Master.', 'Dr.', 'Rev.'], 'female': ['Miss.', 'Mrs.', 'Ms.']}
+SURNAMES = ['Braund', 'Cumings', 'Heikkinen', 'Futrelle', 'Allen', 'Moran', 'McCarthy', 'Palsson', 'Johnson',
+            'Nasser', 'Sandstrom', 'Bonnell', 'Saundercock', 'Andersson', 'Vestrom', 'Hewlett', 'Rice', 'Williams']
+FIRST_NAMES = ['Owen Harris', 'John Bradley', 'Laina', 'Jacques Heath', 'William Henry', 'James', 'Timothy J',
+               'Gosta Leonard', 'Oscar W', 'Nicholas', 'Marguerite Rut', 'Elizabeth', 'Anders Johan', 'Hulda']
+TICKET_PREFIXES = ['', '', '', 'A/5 ', 'PC ', 'STON/O2. ', 'C.A. ', 'SC/PARIS ', 'W./C. ', 'SOTON/OQ ']
+DECKS = ['A', 'B', 'C', 'D', 'E', 'F', 'G']
+
+AGE_NULL_RATE = 0.199
+CABIN_RATE_BY_CLASS = {1: 0.81, 2: 0.09, 3: 0.02}
+
+
+def _choice(rng: numpy.random.Generator, distribution: tuple[list, list], size: int) -> numpy.ndarray:
+    values, weights = distribution
+    return numpy.array(values, dtype=object if None in values else None)[
+        rng.choice(len(values), size=size, p=numpy.asarray(weights) / sum(weights))]
+
+
+def _pool(*parts: list[str]) -> numpy.ndarray:
+    """All the strings made of a value of every part, rows are sampled from them instead of built one by one"""
+    pool = numpy.array([''], dtype=object)
+    for part in parts:
+        pool = (pool[:, None] + numpy.array(part, dtype=object)[None, :]).ravel()
+    return pool
+
+
+NAMES = {sex: _pool(SURNAMES, [', '], [f'{title} ' for title in titles], FIRST_NAMES) for sex, titles in TITLES.items()}
+TICKETS = _pool(TICKET_PREFIXES, [str(number) for number in range(110_000, 112_000)] +
+                [str(number) for number in range(347_000, 350_000)])
+CABINS = _pool(DECKS, [str(number) for number in range(1, 150)])
+
+
+def titanic_chunk(n_rows: int, start: int = 0, seed: int = 0) -> pandas.DataFrame:
+    """
+    Generate Titanic-shaped passengers
+
+    Params:
+        - n_rows (int): Number of passengers
+        - start (int): PassengerId of the first passenger minus one
+        - seed (int): Seed of the generator, combined with `start` so every chunk is reproducible
+
+    Return:
+        - pandas.DataFrame: The passengers indexed by `PassengerId`, with the columns of the original dataset
+    """
+    rng = numpy.random.default_rng([seed, start])
+
+    pclass = _choice(rng, PCLASS, n_rows)
+    sex = numpy.where(rng.random(n_rows) < 0.648, 'male', 'female').astype(object)
+
+    age_mean = numpy.select([pclass == 1, pclass == 2], [AGE_BY_CLASS[1][0], AGE_BY_CLASS[2][0]], AGE_BY_CLASS[3][0])
+    age_std = numpy.select([pclass == 1, pclass == 2], [AGE_BY_CLASS[1][1], AGE_BY_CLASS[2][1]], AGE_BY_CLASS[3][1])
+    age = numpy.clip(rng.normal(age_mean, age_std), 0.42, 80).round()
+    age[rng.random(n_rows) < AGE_NULL_RATE] = numpy.nan
+
+    fare_median = numpy.select([pclass == 1, pclass == 2], [FARE_BY_CLASS[1], FARE_BY_CLASS[2]], FARE_BY_CLASS[3])
+    fare = numpy.clip(fare_median * rng.lognormal(0, 0.6, n_rows), 0, 512.3292).round(4)
+
+    survival = numpy.zeros(n_rows)
+    for (sex_value, class_value), rate in SURVIVAL.items():
+        survival[(sex == sex_value) & (pclass == class_value)] = rate
+
+    is_male = sex == 'male'
+    names = numpy.where(is_male, NAMES['male'][rng.integers(0, len(NAMES['male']), n_rows)],
+                        NAMES['female'][rng.integers(0, len(NAMES['female']), n_rows)])
+    tickets = TICKETS[rng.integers(0, len(TICKETS), n_rows)]
+
+    cabin_rate = numpy.select([pclass == 1, pclass == 2], [CABIN_RATE_BY_CLASS[1], CABIN_RATE_BY_CLASS[2]],
+                              CABIN_RATE_BY_CLASS[3])
+    cabins = CABINS[rng.integers(0, len(CABINS), n_rows)]
+    cabins[rng.random(n_rows) >= cabin_rate] = None
+
+    return pandas.DataFrame({
+        'Survived': (rng.random(n_rows) < survival).astype(numpy.int64),
+        'Pclass': pclass.astype(numpy.int64),
+        'Name': names,
+        'Sex': sex,
+        'Age': age,
+        'SibSp': _choice(rng, SIBSP, n_rows).astype(numpy.int64),
+        'Parch': _choice(rng, PARCH, n_rows).astype(numpy.int64),
+        'Ticket': tickets,
+        'Fare': fare,
+        'Cabin': cabins,
+        'Embarked': _choice(rng, EMBARKED, n_rows),
+    }, index=pandas.RangeIndex(start + 1, start + n_rows + 1, name=INDEX_COL))
+
+
+def iter_titanic(n_rows: int, chunk_size: int = DEFAULT_CHUNK_SIZE, seed: int = 0) -> Iterator[pandas.DataFrame]:
+    """Generate `n_rows` passengers in chunks of `chunk_size` rows"""
+    for start in range(0, n_rows, chunk_size):
+        yield titanic_chunk(min(chunk_size, n_rows - start), start=start, seed=seed)
+
+
+def make_titanic(n_rows: int, chunk_size: int = DEFAULT_CHUNK_SIZE, seed: int = 0) -> pandas.DataFrame:
+    """Generate `n_rows` passengers in memory"""
+    return pandas.concat(iter_titanic(n_rows, chunk_size=chunk_size, seed=seed))
+
+
+def write_titanic(path: str,
+                  n_rows: int,
+                  file_format: str | None = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  seed: int = 0) -> None:
+    """Write `n_rows` passengers to a file, one chunk in memory at a time, see `data_io.write_chunks`"""
+    write_chunks(iter_titanic(n_rows, chunk_size=chunk_size, seed=seed), path=path, file_format=file_format)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser("Synthetic Titanic Data")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--output", type=str, required=True)
+    parser.add_argument("--format", dest="file_format", choices=["csv", "parquet", "feather", "mmap"], default=None)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_titanic(args.output, args.rows, file_format=args.file_format, chunk_size=args.chunk_size, seed=args.seed)
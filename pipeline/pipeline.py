@@ -3,7 +3,32 @@
 Pipeline
 ========
 
-Script to ...
+Script to build and run the SageMaker pipeline of the feature group, one processing step per module of `src`:
+
+    WrangleData -> FeatureEngineering -> FeatureValidation
+                                      -> IngestFeatureGroup, after FeatureValidation
+
+The validation and the ingestion only need the processed features, but the ingestion writes to the feature group
+(`--ingest-mode bulk` to the offline store), which a failed validation doesn't undo: by default the ingestion waits for
+the validation, so invalid features are never ingested. With `--no-validate-before-ingest` they run in parallel, and a
+failed validation fails the execution after the features were ingested.
+
+The steps exchange their datasets in the `mmap` format of `data_io`: the next step maps the files of the previous one
+without deserialising them. The steps are cached with `CacheConfig`, a step whose inputs and arguments didn't change
+since a previous execution is not run again, except the ingestion: its result is the feature group, not an output of
+the step, so it runs on every execution. The code is uploaded to a path named after its hash, so a change of the code
+changes the inputs of the steps.
+
+The code, the input data and the outputs are given to the steps as pipeline parameters, the SDK doesn't upload them.
+With `--local` the pipeline runs in a `LocalPipelineSession`: the steps are containers of the local Docker daemon, the
+code, data and outputs are local directories and no AWS service is called. The image, the SKLearn image of
+`FRAMEWORK_VERSION` by default, must be available locally and hold the packages of `src/requirements.txt`. Point
+`--endpoint-url` to a `local_feature_store` server to describe the feature group without AWS. The duration of every
+step and of the whole execution are printed:
+
+    python pipeline/pipeline.py --local --input-data="bin/titanic.csv" --output-uri="bin/pipeline" \\
+        --image-uri="titanic-featuregroup:latest" --featuregroup-name="titanic" \\
+        --endpoint-url="http://host.docker.internal:8500" --offline-store-uri="/opt/ml/processing/output"
 
 Notes
 -----
@@ -11,104 +36,338 @@ Notes
 Date: 01/2023
 Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
 """
-import sagemaker
-import boto3
+import argparse
+import hashlib
+import json
+import os
 
-from sagemaker.workflow.pipeline_context import LocalPipelineSession
-from sagemaker import get_execution_role
+from time import perf_counter
+from typing import Any
 
-from sagemaker.workflow.steps import Step, StepTypeEnum, ProcessingStep
+import boto3
+
+from sagemaker import image_uris
+from sagemaker.processing import ProcessingInput, ProcessingOutput, Processor
+from sagemaker.workflow.functions import Join
+from sagemaker.workflow.parameters import ParameterString
 from sagemaker.workflow.pipeline import Pipeline
+from sagemaker.workflow.pipeline_context import LocalPipelineSession, PipelineSession
+from sagemaker.workflow.steps import CacheConfig, ProcessingStep
 
-from sagemaker.processing import FrameworkProcessor
+PIPELINE_NAME = 'titanic-featuregroup'
+REGION = 'eu-west-1'
+# Placeholder role of the local executions, an ARN isn't resolved with IAM
+ROLE = 'arn:aws:iam::000000000000:role/local'
+FRAMEWORK_VERSION = '1.0-1'
+INSTANCE_TYPE = 'ml.m5.xlarge'
 
-from sagemaker.sklearn.estimator import SKLearn
+SOURCE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+PROCESSING_DIR = '/opt/ml/processing'
+FILE_FORMAT = 'mmap'
 
-REGION = 'eu-west-1'
-ROLE = 'local'
-FRAMEWORK_VERSION = "0.20.0"
+# Cached step results are reused during 30 days
+CACHE_EXPIRE_AFTER = 'P30D'
 
-boto_session = boto3.session.Session(region_name=REGION,
-                                     aws_access_key_id="",
-                                     aws_secret_access_key="",
-                                     aws_session_token="",
-                                     )
+# (step name, step module, step whose output is the input, output dataset, step arguments)
+STEPS = [
+    ("WrangleData", "data_wrangling.py", None, "wrangled_data", ["--step-name", "Data Wrangling"]),
+    ("FeatureEngineering", "feature_processing.py", "WrangleData", "processed_features",
+     ["--step-name", "Features Processing"]),
+    ("FeatureValidation", "feature_validation.py", "FeatureEngineering", None, ["--step-name", "Features Validation"]),
+    ("IngestFeatureGroup", "feature_group_ingestion.py", "FeatureEngineering", None,
+     ["--step-name", "Feature Group Ingestion"]),
+]
 
-pipeline_session = LocalPipelineSession(boto_session=boto_session)
-# ROLE = get_execution_role(sagemaker_session=pipeline_session)
+# Steps writing out of their outputs, never reused from a previous execution
+UNCACHED_STEPS = {"IngestFeatureGroup"}
 
-config = pipeline_session.config if pipeline_session.config else {}
-config['region'] = 'eu-west-1'
-config['local_code'] = True
+# Output dataset of every step
+STEPS_OUTPUTS = {step_name: output for step_name, _, _, output, _ in STEPS if output is not None}
 
-pipeline_session.config = config
 
-script_processor = FrameworkProcessor(
-    sagemaker_session=pipeline_session,
-    role=ROLE,
-    instance_count=1,
-    instance_type="local",
-    estimator_cls=SKLearn,
-    framework_version=FRAMEWORK_VERSION
-)
+def open_session(local: bool, region: str = REGION) -> PipelineSession:
+    """
+    Get the session the pipeline is defined and run with
 
-from sagemaker.processing import ProcessingInput, ProcessingOutput
+    Params:
+        - local (bool): Run the pipeline locally, with fake credentials as no AWS service is called
+        - region (str): AWS region
 
-base_path = 'titanic-featuregroup'
+    Return:
+        - PipelineSession: The pipeline session, a LocalPipelineSession if local
+    """
+    if not local:
+        return PipelineSession(boto_session=boto3.session.Session(region_name=region))
 
-input_data = r'file:///bin/titanic.csv'
+    boto_session = boto3.session.Session(region_name=region,
+                                         aws_access_key_id="local",
+                                         aws_secret_access_key="local",
+                                         aws_session_token="local")
+    session = LocalPipelineSession(boto_session=boto_session)
 
-inputs = [ProcessingInput(source=input_data, destination="/opt/ml/processing/input")]
-outputs = [
-    ProcessingOutput(output_name="train_data", source="/opt/ml/processing/train"),
-    ProcessingOutput(output_name="test_data", source="/opt/ml/processing/test"),
-]
+    config = session.config if session.config else {}
+    config['region'] = region
+    session.config = config
+
+    return session
+
+
+def source_hash(source_dir: str = SOURCE_DIR) -> str:
+    """Hash of the code of the steps, the Python files and the requirements of `source_dir`"""
+    digest = hashlib.sha256()
+    for file_name in sorted(os.listdir(source_dir)):
+        if file_name.endswith(('.py', '.txt')):
+            digest.update(file_name.encode())
+            with open(os.path.join(source_dir, file_name), 'rb') as file:
+                digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+def upload_source(session: PipelineSession, source_dir: str = SOURCE_DIR) -> str:
+    """
+    Upload the code of the steps to the default bucket of the session, once per version of the code
+
+    Params:
+        - session (PipelineSession): Session of the pipeline
+        - source_dir (str): Directory with the step modules
+
+    Return:
+        - str: Uri of the uploaded code
+    """
+    key_prefix = f"{PIPELINE_NAME}/code/{source_hash(source_dir)}"
+    for file_name in os.listdir(source_dir):
+        if file_name.endswith(('.py', '.txt')):
+            session.upload_data(os.path.join(source_dir, file_name), key_prefix=key_prefix)
+    return f"s3://{session.default_bucket()}/{key_prefix}"
+
+
+def build_pipeline(session: PipelineSession,
+                   input_data: str,
+                   output_uri: str,
+                   source_uri: str | None = None,
+                   role: str = ROLE,
+                   image_uri: str | None = None,
+                   endpoint_url: str | None = None,
+                   offline_store_uri: str | None = None,
+                   validate_before_ingest: bool = True,
+                   cache: bool = True) -> Pipeline:
+    """
+    Generate the pipeline of the steps in `STEPS`, each step reading the output of the step it depends on
+
+    Params:
+        - session (PipelineSession): Session of the pipeline, see `open_session`
+        - input_data (str): Uri of the raw dataset file, the default of the `InputData` parameter. The files given
+            to the executions must have the same name
+        - output_uri (str): Uri the outputs of the steps are stored in, the default of the `OutputUri` parameter
+        - source_uri (str): Uri of the code of the steps, the default of the `SourceUri` parameter. `SOURCE_DIR` if
+            local, uploaded with `upload_source` otherwise, if not given
+        - role (str): Role of the processing jobs
+        - image_uri (str): Image of the processing jobs, the SKLearn image of `FRAMEWORK_VERSION` if not given
+        - endpoint_url (str): Endpoint of the SageMaker APIs for the ingestion, e.g. a local feature store
+        - offline_store_uri (str): Directory or uri the features are written to in bulk mode. The offline store of
+            the Feature Group if not given
+        - validate_before_ingest (bool): Ingest the features once validated, instead of in parallel
+        - cache (bool): Reuse the results of the steps unchanged since a previous execution, but the `UNCACHED_STEPS`
+
+    Return:
+        - Pipeline: The pipeline
+    """
+    local = isinstance(session, LocalPipelineSession)
+    instance_type = "local" if local else INSTANCE_TYPE
+
+    if source_uri is None:
+        source_uri = f"file://{SOURCE_DIR}" if local else upload_source(session)
+    if image_uri is None:
+        image_uri = image_uris.retrieve("sklearn", region=session.boto_region_name, version=FRAMEWORK_VERSION,
+                                        py_version="py3", instance_type=INSTANCE_TYPE)
+
+    # The uris given as pipeline variables are passed as they are to the steps, nothing is uploaded
+    parameters = {
+        'SourceUri': ParameterString(name="SourceUri", default_value=source_uri),
+        'InputData': ParameterString(name="InputData", default_value=input_data),
+        'OutputUri': ParameterString(name="OutputUri", default_value=output_uri),
+        'FeatureGroupName': ParameterString(name="FeatureGroupName", default_value=PIPELINE_NAME),
+        'IngestMode': ParameterString(name="IngestMode", default_value="bulk"),
+        'ValidationMode': ParameterString(name="ValidationMode", default_value="fail-fast"),
+    }
 
-steps = [
-    ProcessingStep(
-        name="WrangleData",
-        step_args=script_processor.run(
-            code="data_wrangling.py",
-            source_dir='src',   # if there is a requirements.txt in src it will install those dependencies
-            inputs=inputs,
-            outputs=outputs,
-            arguments=["--data-path", input_data]
+    # Arguments of the steps besides the input and output files
+    step_arguments = {
+        "FeatureValidation": ["--validation-mode", parameters['ValidationMode']],
+        "IngestFeatureGroup": ["--featuregroup-name", parameters['FeatureGroupName'],
+                               "--region", session.boto_region_name,
+                               "--ingest-mode", parameters['IngestMode']]
+    }
+    if endpoint_url is not None:
+        step_arguments["IngestFeatureGroup"] += ["--endpoint-url", endpoint_url]
+    if offline_store_uri is not None:
+        step_arguments["IngestFeatureGroup"] += ["--offline-store-uri", offline_store_uri]
+
+    cache_config = CacheConfig(enable_caching=cache, expire_after=CACHE_EXPIRE_AFTER)
+
+    steps: dict[str, ProcessingStep] = {}
+    for step_name, code, input_step, output, arguments in STEPS:
+        processor = Processor(
+            sagemaker_session=session,
+            role=role,
+            image_uri=image_uri,
+            instance_count=1,
+            instance_type=instance_type,
+            entrypoint=["python3", f"{PROCESSING_DIR}/code/{code}"],
+            base_job_name=f"{PIPELINE_NAME}-{step_name}"
         )
-    ),
-    # Step(
-    #     name="FeatureEngineering",
-    #     step_type=StepTypeEnum.PROCESSING,
-    # ),
-    # Step(
-    #     name="FeatureValidation",
-    #     step_type=StepTypeEnum.PROCESSING,
-    # ),
-    # Step(
-    #     name="IngestFeatureGroup",
-    #     step_type=StepTypeEnum.PROCESSING,
-    # ),
-]
 
-if __name__ == '__main__':
-    pipeline = Pipeline(
-        name="titanic-featuregroup",
-        steps=steps,
-        sagemaker_session=pipeline_session
-    )
+        # The raw file for the first step, the dataset written by the step it depends on for the others
+        if input_step is None:
+            source, input_file = parameters['InputData'], os.path.basename(input_data)
+        else:
+            source = steps[input_step].properties.ProcessingOutputConfig.Outputs[STEPS_OUTPUTS[input_step]]
+            source, input_file = source.S3Output.S3Uri, f"{STEPS_OUTPUTS[input_step]}.{FILE_FORMAT}"
+
+        inputs = [ProcessingInput(source=parameters['SourceUri'], destination=f"{PROCESSING_DIR}/code",
+                                  input_name="code"),
+                  ProcessingInput(source=source, destination=f"{PROCESSING_DIR}/input", input_name="input")]
+
+        # The formats are inferred from the extensions of the files
+        arguments = arguments + ["--data-path", PROCESSING_DIR, "--input-file", f"input/{input_file}"]
+        outputs = []
+        if output is not None:
+            outputs = [ProcessingOutput(output_name=output,
+                                        source=f"{PROCESSING_DIR}/output",
+                                        destination=Join(on="/", values=[parameters['OutputUri'], output]))]
+            arguments += ["--output-file", f"output/{output}.{FILE_FORMAT}"]
+
+        depends_on = None
+        if validate_before_ingest and step_name == "IngestFeatureGroup":
+            depends_on = [steps["FeatureValidation"]]
+
+        steps[step_name] = ProcessingStep(
+            name=step_name,
+            step_args=processor.run(inputs=inputs,
+                                    outputs=outputs,
+                                    arguments=arguments + step_arguments.get(step_name, [])),
+            cache_config=None if step_name in UNCACHED_STEPS else cache_config,
+            depends_on=depends_on
+        )
+
+    return Pipeline(name=PIPELINE_NAME,
+                    parameters=list(parameters.values()),
+                    steps=list(steps.values()),
+                    sagemaker_session=session)
+
+
+def step_durations(execution_steps: dict[str, Any]) -> dict[str, float | None]:
+    """
+    Seconds every step of an execution took, from `execution.list_steps()`
+
+    Params:
+        - execution_steps (dict): The steps of the execution
 
-    pipeline.create(
-        role_arn=ROLE,  # sagemaker.get_execution_role(sagemaker_session=pipeline_session),
-        description="local pipeline example"
-    )
+    Return:
+        - dict: Duration of every step by name, None if the step didn't finish
+    """
+    durations: dict[str, float | None] = {}
+    for step in execution_steps['PipelineExecutionSteps']:
+        start, end = step.get('StartTime'), step.get('EndTime')
+        if start is None or end is None:
+            durations[step['StepName']] = None
+        else:
+            # Datetimes from SageMaker, timestamps from the local executions
+            seconds = end - start
+            durations[step['StepName']] = seconds.total_seconds() if hasattr(seconds, 'total_seconds') else seconds
+    return durations
 
-    ## pipeline will execute locally
-    print('\t\t => Starting pipeline exection')
-    execution = pipeline.start()
 
-    steps = execution.list_steps()
-    print(f'\t\t => Pipeline steps: {steps}')
+def run_pipeline(pipeline: Pipeline, role: str = ROLE, **parameters: str) -> dict[str, Any]:
+    """
+    Create or update the pipeline and execute it, waiting for the execution to finish
+
+    Params:
+        - pipeline (Pipeline): The pipeline, see `build_pipeline`
+        - role (str): Role of the pipeline
+        - parameters: Values of the pipeline parameters of this execution
+
+    Return:
+        - dict: Status and duration of the execution, and duration of every step
+    """
+    pipeline.upsert(role_arn=role, description="Titanic feature group pipeline")
+
+    starting_time = perf_counter()
+    execution = pipeline.start(parameters=parameters)
+    if not isinstance(pipeline.sagemaker_session, LocalPipelineSession):
+        # The local executions are run by `start`, the remote ones are waited for
+        execution.wait(delay=10, max_attempts=360)
+    seconds = perf_counter() - starting_time
+
+    durations = step_durations(execution.list_steps())
+    status = execution.describe()['PipelineExecutionStatus']
+
+    for step_name, step_seconds in durations.items():
+        print(f'\t\t => {step_name:<24}{"-" if step_seconds is None else f"{step_seconds:.2f} s"}')
+    print(f'\t\t => Pipeline execution {status} after {seconds:.2f} s')
+
+    return {'status': status, 'seconds': seconds, 'steps': durations}
+
+
+def parse_pipeline_args() -> argparse.Namespace:
+    """Parse the arguments to build and run the pipeline"""
+    parser = argparse.ArgumentParser("Build and run the feature group pipeline")
+    parser.add_argument("--input-data", dest="input_data", type=str, required=True,
+                        help="Uri of the raw dataset file, a local path with --local")
+    parser.add_argument("--output-uri", dest="output_uri", type=str, default=None,
+                        help="Uri to store the outputs of the steps in, a local path with --local. A prefix of the "
+                             "default bucket if not given")
+    parser.add_argument("--featuregroup-name", dest="fg_name", type=str, default=PIPELINE_NAME)
+    parser.add_argument("--region", dest="region", type=str, default=REGION)
+    parser.add_argument("--role", dest="role", type=str, default=ROLE)
+    parser.add_argument("--local", dest="local", action="store_true",
+                        help="Run the pipeline in a LocalPipelineSession, without AWS")
+    parser.add_argument("--image-uri", dest="image_uri", type=str, default=None,
+                        help="Image of the processing jobs, with the packages of src/requirements.txt")
+    parser.add_argument("--ingest-mode", dest="ingest_mode", type=str, choices=["threads", "async", "bulk"],
+                        default="bulk")
+    parser.add_argument("--validation-mode", dest="validation_mode", type=str,
+                        choices=["fail-fast", "collect", "sampled"], default="fail-fast")
+    parser.add_argument("--endpoint-url", dest="endpoint_url", type=str, default=None,
+                        help="Endpoint of the SageMaker APIs for the ingestion, e.g. a local feature store")
+    parser.add_argument("--offline-store-uri", dest="offline_store_uri", type=str, default=None,
+                        help="Bulk mode: directory or uri to write the offline store files to")
+    parser.add_argument("--validate-before-ingest", dest="validate_before_ingest",
+                        action=argparse.BooleanOptionalAction, default=True,
+                        help="Ingest the features once validated, instead of in parallel")
+    parser.add_argument("--no-cache", dest="cache", action="store_false",
+                        help="Run every step, without reusing the results of previous executions")
+    parser.add_argument("--definition", dest="definition", action="store_true",
+                        help="Print the definition of the pipeline instead of running it")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_pipeline_args()
+    pipeline_session = open_session(local=args.local, region=args.region)
+
+    if args.local:
+        args.input_data = f"file://{os.path.abspath(args.input_data)}"
+        args.output_uri = f"file://{os.path.abspath(args.output_uri or os.path.join('bin', PIPELINE_NAME))}"
+    elif args.output_uri is None:
+        args.output_uri = f"s3://{pipeline_session.default_bucket()}/{PIPELINE_NAME}"
 
-    ## FIXME
-    training_job_name = steps['PipelineExecutionSteps'][0]['Metadata']['TrainingJob']['Arn']
+    pipeline = build_pipeline(session=pipeline_session,
+                              input_data=args.input_data,
+                              output_uri=args.output_uri,
+                              role=args.role,
+                              image_uri=args.image_uri,
+                              endpoint_url=args.endpoint_url,
+                              offline_store_uri=args.offline_store_uri,
+                              validate_before_ingest=args.validate_before_ingest,
+                              cache=args.cache)
 
-    step_outputs = pipeline_session.sagemaker_client.describe_training_job(TrainingJobName=training_job_name)
+    if args.definition:
+        print(json.dumps(json.loads(pipeline.definition()), indent=2))
+    else:
+        print('\t\t => Starting pipeline execution')
+        run_pipeline(pipeline,
+                     role=args.role,
+                     FeatureGroupName=args.fg_name,
+                     IngestMode=args.ingest_mode,
+                     ValidationMode=args.validation_mode)
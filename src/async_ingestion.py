@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Async Ingestion
+===============
+
+asyncio ingestion of a pandas.DataFrame into the online store of a Feature Group, as an alternative to the
+threads and processes of `FeatureGroup.ingest`:
+
+- the PutRecord calls in flight are bounded by a semaphore
+- throttled or transient failures are retried with exponential backoff and full jitter
+- the records that still fail are collected per batch and written to a dead-letter JSON lines file, which can be
+  replayed later with `replay_dead_letters`
+
+Any client with a coroutine `put_record(FeatureGroupName=..., Record=...)` can be used, e.g. a local stub of the
+feature store runtime API. `open_client` uses aiobotocore when it is installed and otherwise a boto3 client run in a
+thread pool, with as many threads and HTTP connections as PutRecord calls in flight.
+"""
+import asyncio
+import json
+import random
+
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Iterable, Iterator, Sequence
+
+import boto3
+import pandas
+
+from botocore.config import Config
+
+try:
+    from aiobotocore.session import get_session as get_aiobotocore_session
+except ImportError:
+    get_aiobotocore_session = None
+
+Record = list[dict[str, str]]
+
+DEFAULT_CONCURRENCY = 64
+BATCH_SIZE = 1_000
+MAX_RETRIES = 8
+BACKOFF_BASE = 0.05
+BACKOFF_CAP = 5.0
+
+RETRYABLE_ERRORS = {'ThrottlingException', 'Throttling', 'ServiceUnavailable', 'InternalFailure',
+                    'RequestTimeout', 'SlowDown'}
+
+
+class BotoAsyncClient:
+    """
+    Adapter running the calls of a boto3 `sagemaker-featurestore-runtime` client in its own thread pool
+
+    The default executor of the event loop has min(32, cpu_count + 4) threads, which would bound the calls in flight
+    below the concurrency of the ingestion
+
+    Params:
+        - client: boto3 `sagemaker-featurestore-runtime` client
+        - max_workers (int): Number of threads, i.e. the maximum number of calls in flight
+    """
+
+    def __init__(self, client: Any, max_workers: int = DEFAULT_CONCURRENCY):
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='put-record')
+
+    async def put_record(self, **kwargs: Any) -> dict[str, Any]:
+        return await asyncio.get_running_loop().run_in_executor(self.executor,
+                                                                lambda: self.client.put_record(**kwargs))
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+
+def open_client(region: str | None,
+                endpoint_url: str | None = None,
+                concurrency: int = DEFAULT_CONCURRENCY) -> Any:
+    """
+    Get an async feature store runtime client, to be used as an async context manager
+
+    Params:
+        - region (str): AWS region
+        - endpoint_url (str): Endpoint of the feature store runtime API, e.g. a local stub
+        - concurrency (int): Maximum number of PutRecord calls in flight, sizes the connection pool
+
+    Return:
+        - An async context manager yielding the client
+    """
+    config = Config(max_pool_connections=concurrency)
+    if get_aiobotocore_session is not None:
+        return get_aiobotocore_session().create_client('sagemaker-featurestore-runtime',
+                                                       region_name=region,
+                                                       endpoint_url=endpoint_url,
+                                                       config=config)
+
+    session = boto3.session.Session(region_name=region)
+    client = session.client('sagemaker-featurestore-runtime', endpoint_url=endpoint_url, config=config)
+    return _SyncContext(BotoAsyncClient(client, max_workers=concurrency))
+
+
+class _SyncContext:
+
+    def __init__(self, client: BotoAsyncClient):
+        self.client = client
+
+    async def __aenter__(self) -> BotoAsyncClient:
+        return self.client
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.client.close()
+
+
+def to_records(data: pandas.DataFrame, batch_size: int = BATCH_SIZE) -> Iterator[Record]:
+    """
+    Convert the rows of the data into PutRecord records, the null values are left out
+
+    The rows are converted one batch at a time as the records are consumed, so only a batch of records is held in
+    memory at once
+
+    Params:
+        - data (pandas.DataFrame): The features, prepared with `check_fg_prep`
+        - batch_size (int): Number of rows converted at once
+
+    Return:
+        - Iterator[Record]: A list of {"FeatureName", "ValueAsString"} per row
+    """
+    columns = data.columns.tolist()
+
+    for start in range(0, len(data), batch_size):
+        batch = data.iloc[start:start + batch_size]
+        values = [batch[col].astype(str).tolist() for col in columns]
+        not_null = [batch[col].notna().tolist() for col in columns]
+
+        for row in range(len(batch)):
+            yield [{'FeatureName': col, 'ValueAsString': value[row]}
+                   for col, value, valid in zip(columns, values, not_null) if valid[row]]
+
+
+def _error_code(exc: Exception) -> str | None:
+    """Error code of a botocore ClientError or of any exception exposing the same `response`"""
+    response = getattr(exc, 'response', None)
+    if isinstance(response, dict):
+        code = response.get('Error', {}).get('Code')
+        return str(code) if code is not None else None
+    return None
+
+
+class AsyncIngestion:
+    """
+    Ingestion of records with bounded concurrency and retries
+
+    Params:
+        - client: Async client with a `put_record` coroutine
+        - feature_group_name (str): Name of the Feature Group
+        - concurrency (int): Maximum number of PutRecord calls in flight
+        - max_retries (int): Maximum retries of a throttled or transient failure
+    """
+
+    def __init__(self,
+                 client: Any,
+                 feature_group_name: str,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 max_retries: int = MAX_RETRIES):
+        self.client = client
+        self.feature_group_name = feature_group_name
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.n_ingested = 0
+        self.n_retries = 0
+        self.failures: list[tuple[Record, str]] = []
+
+    async def _put(self, semaphore: asyncio.Semaphore, record: Record) -> tuple[Record, str] | None:
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                try:
+                    await self.client.put_record(FeatureGroupName=self.feature_group_name, Record=record)
+                    return None
+                except Exception as exc:  # pylint: disable=broad-except
+                    if _error_code(exc) not in RETRYABLE_ERRORS or attempt == self.max_retries:
+                        return record, f'{type(exc).__name__}: {exc}'
+
+            # The backoff is done out of the semaphore so other records can use the slot
+            self.n_retries += 1
+            await asyncio.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+
+        return None
+
+    async def ingest(self, records: Iterable[Record], batch_size: int = BATCH_SIZE) -> None:
+        """
+        Ingest the records, the failures are collected in `failures`
+
+        Params:
+            - records (Iterable[Record]): The records to ingest
+            - batch_size (int): Number of records scheduled at once, to bound the memory used
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        batch: list[Record] = []
+
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                await self._ingest_batch(semaphore, batch)
+                batch = []
+
+        if batch:
+            await self._ingest_batch(semaphore, batch)
+
+    async def _ingest_batch(self, semaphore: asyncio.Semaphore, batch: Sequence[Record]) -> None:
+        results = await asyncio.gather(*(self._put(semaphore, record) for record in batch))
+        failures = [result for result in results if result is not None]
+
+        self.n_ingested += len(batch) - len(failures)
+        self.failures.extend(failures)
+
+    def write_dead_letters(self, path: str) -> None:
+        """Append the failed records to a JSON lines file"""
+        with open(path, 'a') as file:
+            for record, error in self.failures:
+                file.write(json.dumps({'FeatureGroupName': self.feature_group_name,
+                                       'Record': record,
+                                       'Error': error}) + '\n')
+
+    def report(self, seconds: float) -> dict[str, Any]:
+        return {'ingested': self.n_ingested,
+                'failed': len(self.failures),
+                'retries': self.n_retries,
+                'seconds': round(seconds, 3),
+                'records_per_second': round(self.n_ingested / seconds, 1) if seconds else None}
+
+
+async def _run(client: Any,
+               records: Iterable[Record],
+               feature_group_name: str,
+               concurrency: int,
+               dead_letter_file: str | None,
+               region: str | None = None,
+               endpoint_url: str | None = None) -> dict[str, Any]:
+    if client is None:
+        # Clients are bound to the event loop they are created in
+        async with open_client(region=region, endpoint_url=endpoint_url, concurrency=concurrency) as loop_client:
+            return await _run(loop_client, records, feature_group_name, concurrency, dead_letter_file)
+
+    ingestion = AsyncIngestion(client=client, feature_group_name=feature_group_name, concurrency=concurrency)
+
+    starting_time = perf_counter()
+    await ingestion.ingest(records)
+    report = ingestion.report(perf_counter() - starting_time)
+
+    if ingestion.failures and dead_letter_file is not None:
+        ingestion.write_dead_letters(dead_letter_file)
+
+    return report
+
+
+def async_ingest(data: pandas.DataFrame,
+                 feature_group_name: str,
+                 client: Any = None,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 dead_letter_file: str | None = None,
+                 region: str | None = None,
+                 endpoint_url: str | None = None) -> dict[str, Any]:
+    """
+    Ingest a pandas.DataFrame into the online store of a Feature Group with asyncio
+
+    Params:
+        - data (pandas.DataFrame): The features, prepared with `check_fg_prep`
+        - feature_group_name (str): Name of the Feature Group
+        - client: Async client with a `put_record` coroutine, see `open_client` when not given
+        - concurrency (int): Maximum number of PutRecord calls in flight
+        - dead_letter_file (str): JSON lines file to append the records that failed to
+        - region (str): AWS region of the client opened when none is given
+        - endpoint_url (str): Endpoint of the client opened when none is given
+
+    Return:
+        - dict: Report with the records ingested, failed, retried and the throughput
+    """
+    return asyncio.run(_run(client=client,
+                            records=to_records(data),
+                            feature_group_name=feature_group_name,
+                            concurrency=concurrency,
+                            dead_letter_file=dead_letter_file,
+                            region=region,
+                            endpoint_url=endpoint_url))
+
+
+def replay_dead_letters(path: str,
+                        client: Any = None,
+                        concurrency: int = DEFAULT_CONCURRENCY,
+                        dead_letter_file: str | None = None,
+                        region: str | None = None,
+                        endpoint_url: str | None = None) -> dict[str, dict[str, Any]]:
+    """
+    Ingest again the records of a dead-letter file
+
+    Params:
+        - path (str): The dead-letter file written by a previous ingestion
+        - client: Async client with a `put_record` coroutine, see `open_client` when not given
+        - concurrency (int): Maximum number of PutRecord calls in flight
+        - dead_letter_file (str): JSON lines file to append the records that failed again to
+        - region (str): AWS region of the client opened when none is given
+        - endpoint_url (str): Endpoint of the client opened when none is given
+
+    Return:
+        - dict: Report with the records ingested, failed, retried and the throughput per Feature Group
+    """
+    records: dict[str, list[Record]] = {}
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                letter = json.loads(line)
+                records.setdefault(letter['FeatureGroupName'], []).append(letter['Record'])
+
+    return {name: asyncio.run(_run(client=client,
+                                   records=fg_records,
+                                   feature_group_name=name,
+                                   concurrency=concurrency,
+                                   dead_letter_file=dead_letter_file,
+                                   region=region,
+                                   endpoint_url=endpoint_url))
+            for name, fg_records in records.items()}
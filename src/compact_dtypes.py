@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Compact Dtypes
+==============
+
+Compact representation of the features to reduce the memory used per row:
+
+- low-cardinality string columns become categoricals, an integer code per row instead of a Python string
+- string columns with only True/False values become booleans
+- integers are downcast to the smallest integer type holding their values
+- floats are downcast to float32 only when no value changes
+
+The compact dtypes are kept by the Parquet and Feather files written between steps. They are converted back to the
+types supported by a Feature Group, see `feature_group_dtypes`, just before the ingestion.
+"""
+import numpy
+import pandas
+
+# Maximum number of distinct values of a string column stored as categorical
+MAX_CATEGORIES = 1_024
+
+
+def _compact_strings(series: pandas.Series) -> pandas.Series:
+    # A single hash pass, the codes are reused to build the categorical
+    codes, uniques = pandas.factorize(series, sort=True)
+
+    if 0 < len(uniques) <= 2 and all(isinstance(value, (bool, numpy.bool_)) for value in uniques) and \
+            (codes >= 0).all():
+        return series.astype(bool)
+
+    if len(uniques) > MAX_CATEGORIES or 2 * len(uniques) > len(series):
+        return series
+
+    return pandas.Series(pandas.Categorical.from_codes(codes, categories=uniques), index=series.index,
+                         name=series.name)
+
+
+def _compact_float(series: pandas.Series) -> pandas.Series:
+    compact = series.astype(numpy.float32)
+    lossless = (compact.to_numpy(dtype=numpy.float64) == series.to_numpy()) | series.isna().to_numpy()
+    return compact if lossless.all() else series
+
+
+def compact_dtypes(data: pandas.DataFrame) -> pandas.DataFrame:
+    """
+    Convert every column to its most compact dtype without changing its values
+
+    Params:
+        - data (pandas.DataFrame): The dataset
+
+    Return:
+        - pandas.DataFrame: The dataset with compact dtypes, the columns are replaced in place
+    """
+    for col in data.columns:
+        series = data[col]
+
+        if isinstance(series.dtype, pandas.CategoricalDtype) or pandas.api.types.is_bool_dtype(series.dtype):
+            continue
+
+        if pandas.api.types.is_object_dtype(series.dtype) or pandas.api.types.is_string_dtype(series.dtype):
+            data[col] = _compact_strings(series)
+        elif pandas.api.types.is_integer_dtype(series.dtype):
+            data[col] = pandas.to_numeric(series, downcast='integer')
+        elif series.dtype == numpy.float64:
+            data[col] = _compact_float(series)
+
+    return data
+
+
+def feature_group_dtypes(data: pandas.DataFrame) -> pandas.DataFrame:
+    """
+    Convert the compact dtypes back to the types of the features without compaction, all supported by a Feature
+    Group: categoricals to the type of their categories, booleans and small integers to int64 and float32 to float64
+
+    Params:
+        - data (pandas.DataFrame): The dataset
+
+    Return:
+        - pandas.DataFrame: The dataset with Feature Group types, the columns are replaced in place
+    """
+    for col in data.columns:
+        dtype = data[col].dtype
+
+        if isinstance(dtype, pandas.CategoricalDtype):
+            data[col] = data[col].astype(dtype.categories.dtype)
+        elif pandas.api.types.is_bool_dtype(dtype) or dtype in (numpy.int8, numpy.int16, numpy.int32):
+            data[col] = data[col].astype(numpy.int64)
+        elif dtype == numpy.float32:
+            data[col] = data[col].astype(numpy.float64)
+
+    return data
+
+
+def memory_per_row(data: pandas.DataFrame) -> float:
+    """Bytes used per row, including the Python strings of the object columns"""
+    return float(data.memory_usage(deep=True, index=True).sum()) / max(1, len(data))
@@ -0,0 +1,576 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Data IO
+=======
+
+Storage layer used by the pipeline steps to read and write datasets. The format is chosen from the file
+extension or forced with the `--format` argument:
+
+- csv: plain text, kept for compatibility with the raw Kaggle dataset
+- parquet: columnar and compressed, keeps dtypes (categoricals, strings ...) and the `PassengerId` index
+- feather: Arrow IPC file, the fastest to read and write between steps
+- mmap: directory of uncompressed Arrow IPC files with a manifest, exchanged between steps without copies, see below
+
+New backends can be plugged in with `register_backend`.
+
+Datasets bigger than the memory can be streamed in chunks of rows with `iter_data` and `write_chunks`.
+
+Part of the wrangling can be pushed down into the readers: `drop` columns are not read at all, matched
+case-insensitively, and `na_values` tokens are parsed as nulls by the text readers.
+
+The mmap datasets are memory-mapped when read: the numeric columns without nulls are NumPy views of the mapped files
+and the strings are Arrow-backed (`string[pyarrow]`), nothing is deserialised. A dataset written from one read keeps
+the columns the step didn't modify in their files, linked into the output directory, and only the columns the step
+added or replaced are written, to a sidecar file:
+
+    <dataset>.mmap/manifest.json        columns of the dataset, the file and name of every column in the files
+    <dataset>.mmap/<uuid>.arrow         columns of the input, linked, or written by the step
+
+The mapped columns are read-only: modifying their values in place, e.g. `data.loc[rows, col] = value` or
+`data[col].fillna(value, inplace=True)`, raises `ValueError: assignment destination is read-only`. The steps reading
+mmap datasets replace the columns instead, `data[col] = data[col].fillna(value)`, which also lets the writer keep
+the other columns in their files, or work on a `copy()` of the dataset.
+"""
+import itertools
+import json
+import os
+import shutil
+import uuid
+
+from typing import Any, Callable, Iterable, Iterator, Sequence
+
+import numpy
+import pandas
+import pyarrow
+import pyarrow.ipc
+import pyarrow.parquet
+
+INDEX_COL = 'PassengerId'
+
+Reader = Callable[[str, Sequence[str] | None], pandas.DataFrame]
+Writer = Callable[[pandas.DataFrame, str], None]
+ChunkReader = Callable[[str, Sequence[str] | None, int], Iterator[pandas.DataFrame]]
+ChunkWriter = Callable[[Iterable[pandas.DataFrame], str], None]
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def _projection(columns: Sequence[str] | None) -> list[str] | None:
+    """Columns to read from a file that stores the index as a regular column"""
+    if columns is None:
+        return None
+    return [INDEX_COL] + [col for col in columns if col != INDEX_COL]
+
+
+def _read_csv(path: str,
+              columns: Sequence[str] | None = None,
+              na_values: Sequence[str] | None = None) -> pandas.DataFrame:
+    return pandas.read_csv(filepath_or_buffer=path,
+                           index_col=INDEX_COL,
+                           usecols=_projection(columns),
+                           na_values=na_values,
+                           low_memory=False,
+                           sep=','
+                           )
+
+
+def _write_csv(data: pandas.DataFrame, path: str) -> None:
+    data.to_csv(path_or_buf=path,
+                sep=',',
+                index=True)
+
+
+def _read_parquet(path: str, columns: Sequence[str] | None = None) -> pandas.DataFrame:
+    # The index is restored from the pandas metadata stored in the file, even with a projection
+    return pandas.read_parquet(path, columns=None if columns is None else list(columns))
+
+
+def _write_parquet(data: pandas.DataFrame, path: str) -> None:
+    data.to_parquet(path, index=True)
+
+
+def _read_feather(path: str, columns: Sequence[str] | None = None) -> pandas.DataFrame:
+    data = pandas.read_feather(path, columns=_projection(columns))
+    if INDEX_COL in data.columns:
+        data = data.set_index(INDEX_COL)
+    return data
+
+
+def _write_feather(data: pandas.DataFrame, path: str) -> None:
+    # Feather only stores a default RangeIndex, the index is kept as a regular column
+    data.reset_index().to_feather(path)
+
+
+def _iter_csv(path: str,
+              columns: Sequence[str] | None,
+              chunk_size: int,
+              na_values: Sequence[str] | None = None) -> Iterator[pandas.DataFrame]:
+    with pandas.read_csv(filepath_or_buffer=path,
+                         index_col=INDEX_COL,
+                         usecols=_projection(columns),
+                         na_values=na_values,
+                         sep=',',
+                         chunksize=chunk_size
+                         ) as reader:
+        yield from reader
+
+
+def _write_csv_chunks(chunks: Iterable[pandas.DataFrame], path: str) -> None:
+    with open(path, 'w', newline='') as file:
+        for n_chunk, chunk in enumerate(chunks):
+            chunk.to_csv(path_or_buf=file, sep=',', index=True, header=n_chunk == 0)
+
+
+def _table_to_pandas(table: pyarrow.Table) -> pandas.DataFrame:
+    data = table.to_pandas()
+    if INDEX_COL in data.columns:
+        data = data.set_index(INDEX_COL)
+    return data
+
+
+def _iter_parquet(path: str, columns: Sequence[str] | None, chunk_size: int) -> Iterator[pandas.DataFrame]:
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=_projection(columns)):
+        yield _table_to_pandas(pyarrow.Table.from_batches([batch]))
+
+
+def _write_parquet_chunks(chunks: Iterable[pandas.DataFrame], path: str) -> None:
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                table = pyarrow.Table.from_pandas(chunk, preserve_index=True)
+                writer = pyarrow.parquet.ParquetWriter(path, table.schema)
+            else:
+                # Chunks are cast to the schema of the first one, e.g. columns with only nulls in a chunk or
+                # parsed with another type from a CSV file
+                table = pyarrow.Table.from_pandas(chunk, preserve_index=True).cast(writer.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _iter_feather(path: str, columns: Sequence[str] | None, chunk_size: int) -> Iterator[pandas.DataFrame]:
+    with pyarrow.ipc.open_file(path) as reader:
+        projection = None if columns is None else _projection(columns)
+
+        for n_batch in range(reader.num_record_batches):
+            batch = reader.get_batch(n_batch)
+            if projection is not None:
+                batch = batch.select(projection)
+
+            for offset in range(0, batch.num_rows, chunk_size):
+                yield _table_to_pandas(pyarrow.Table.from_batches([batch.slice(offset, chunk_size)]))
+
+
+def _write_feather_chunks(chunks: Iterable[pandas.DataFrame], path: str) -> None:
+    writer = None
+    schema = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                table = pyarrow.Table.from_pandas(chunk.reset_index(), preserve_index=False)
+                schema = table.schema
+                writer = pyarrow.ipc.new_file(path, schema)
+            else:
+                table = pyarrow.Table.from_pandas(chunk.reset_index(), preserve_index=False).cast(schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+MANIFEST = 'manifest.json'
+# Key of `DataFrame.attrs` with the files of a dataset read from a mmap dataset
+MMAP_SOURCE = 'mmap_source'
+
+
+class _MmapSource(dict[str, Any]):
+    """Files of a mmap dataset read, shared and not copied by the frames derived from it"""
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> '_MmapSource':
+        return self
+
+
+def _fingerprint(values: Any) -> tuple[Any, ...] | None:
+    """Memory of the values of a column or index, equal only if the values are the same, e.g. not modified"""
+    array = getattr(values, 'array', values)
+    if isinstance(array, pandas.arrays.ArrowStringArray):
+        return tuple((chunk.offset, len(chunk), *(buffer.address for buffer in chunk.buffers() if buffer is not None))
+                     for chunk in array._data.chunks)
+    array = numpy_values = getattr(values, 'values', values)
+    if isinstance(numpy_values, pandas.Categorical):
+        array = numpy_values.codes
+    if not hasattr(array, '__array_interface__'):
+        return None
+    interface = array.__array_interface__
+    return interface['data'][0], interface['shape'], interface['strides'], str(numpy_values.dtype)
+
+
+def _to_arrow(series: pandas.Series) -> pyarrow.Array:
+    # NaN is kept as a value instead of a null, so the column is read back without copying it to fill the nulls
+    if isinstance(series.dtype, numpy.dtype) and series.dtype.kind == 'f':
+        return pyarrow.array(series.to_numpy(), from_pandas=False)
+    return pyarrow.array(series, from_pandas=True)
+
+
+def _arrow_types(arrow_type: pyarrow.DataType) -> Any:
+    return pandas.StringDtype('pyarrow') if arrow_type in (pyarrow.string(), pyarrow.large_string()) else None
+
+
+def _mmap_manifest(path: str) -> dict[str, Any]:
+    with open(os.path.join(path, MANIFEST)) as file:
+        manifest: dict[str, Any] = json.load(file)
+    return manifest
+
+
+def _read_mmap(path: str, columns: Sequence[str] | None = None) -> pandas.DataFrame:
+    manifest = _mmap_manifest(path)
+    locations = {name: (file['path'], stored) for file in manifest['files'] for name, stored in file['columns'].items()}
+    names = [col for col in (manifest['columns'] if columns is None else columns) if col != INDEX_COL]
+
+    tables: dict[str, pyarrow.Table] = {}
+
+    def column(file_name: str, stored: str) -> pyarrow.ChunkedArray:
+        if file_name not in tables:
+            # Memory-mapped, the buffers of the table are the pages of the file
+            with pyarrow.ipc.open_file(pyarrow.memory_map(os.path.join(path, file_name))) as reader:
+                tables[file_name] = reader.read_all()
+        return tables[file_name][stored]
+
+    table = pyarrow.Table.from_arrays([column(*locations[name]) for name in names], names=names)
+    data = table.to_pandas(split_blocks=True, types_mapper=_arrow_types)
+    index = column(manifest['index']['path'], manifest['index']['column'])
+    data.index = pandas.Index(index.to_numpy(), name=manifest['index']['name'])
+
+    # The columns not modified by the step are found by their memory when the result is written. The tables and the
+    # columns are kept alive with the result, so their memory can't be reused by other columns
+    data.attrs[MMAP_SOURCE] = _MmapSource(
+        path=os.path.abspath(path),
+        index=(_fingerprint(data.index), manifest['index']),
+        columns={_fingerprint(data[name]): locations[name] for name in names},
+        references=(tables, [data[name].array for name in names]),
+    )
+    return data
+
+
+def _link(source: str, destination: str) -> None:
+    """Hard link a file into the output dataset, copied when the filesystem doesn't support links"""
+    if os.path.exists(destination):
+        return
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def _arrow_table(data: pandas.DataFrame, columns: Sequence[str], index: bool) -> pyarrow.Table:
+    arrays = [_to_arrow(data[col]) for col in columns]
+    names = [str(col) for col in columns]
+    if index:
+        arrays.insert(0, pyarrow.array(data.index.to_numpy()))
+        names.insert(0, data.index.name or INDEX_COL)
+    return pyarrow.Table.from_arrays(arrays, names=names)
+
+
+def _write_ipc(tables: Iterable[pyarrow.Table], path: str) -> str:
+    """Write the tables as record batches of a new uncompressed Arrow IPC file of the dataset, returning its name"""
+    file_name = f'{uuid.uuid4().hex}.arrow'
+    writer, schema = None, None
+    with pyarrow.OSFile(os.path.join(path, file_name), 'wb') as sink:
+        for table in tables:
+            if writer is None:
+                schema = table.schema
+                writer = pyarrow.ipc.new_file(sink, schema)
+            writer.write_table(table.cast(schema))
+        if writer is not None:
+            writer.close()
+    return file_name
+
+
+def _write_manifest(path: str, manifest: dict[str, Any]) -> None:
+    # The manifest is replaced at once, then the files not used anymore are removed
+    with open(os.path.join(path, f'{MANIFEST}.tmp'), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(os.path.join(path, f'{MANIFEST}.tmp'), os.path.join(path, MANIFEST))
+
+    used = {file['path'] for file in manifest['files']} | {manifest['index']['path']}
+    for file_name in os.listdir(path):
+        if file_name.endswith('.arrow') and file_name not in used:
+            os.remove(os.path.join(path, file_name))
+
+
+def _write_mmap(data: pandas.DataFrame, path: str) -> None:
+    os.makedirs(path, exist_ok=True)
+    index_name = data.index.name or INDEX_COL
+    files: dict[str, dict[str, str]] = {}
+
+    # With the rows of a dataset read, the columns not replaced are still the mapped ones and their files are linked.
+    # The mapped buffers are read-only, so a column can't be modified in place
+    source = data.attrs.get(MMAP_SOURCE)
+    same_rows = source is not None and source['index'][0] == _fingerprint(data.index)
+    reused = {}
+    if same_rows:
+        reused = {col: source['columns'][key] for col in data.columns
+                  if (key := _fingerprint(data[col])) is not None and key in source['columns']}
+        index = dict(source['index'][1])
+        for file_name in {index['path'], *(file_name for file_name, _ in reused.values())}:
+            _link(os.path.join(source['path'], file_name), os.path.join(path, file_name))
+        for col, (file_name, stored) in reused.items():
+            files.setdefault(file_name, {})[str(col)] = stored
+
+    # The sidecar with the columns added or replaced by the step, or the whole dataset when the rows changed
+    written = [col for col in data.columns if col not in reused]
+    if written or not same_rows:
+        file_name = _write_ipc([_arrow_table(data, written, index=not same_rows)], path)
+        files.setdefault(file_name, {}).update({str(col): str(col) for col in written})
+        if not same_rows:
+            index = {'path': file_name, 'column': index_name, 'name': index_name}
+
+    _write_manifest(path, {'version': 1,
+                           'num_rows': len(data),
+                           'index': index,
+                           'columns': [str(col) for col in data.columns],
+                           'files': [{'path': name, 'columns': columns} for name, columns in files.items()]})
+
+
+def _iter_mmap(path: str, columns: Sequence[str] | None, chunk_size: int) -> Iterator[pandas.DataFrame]:
+    data = _read_mmap(path, columns)
+    for offset in range(0, len(data), chunk_size):
+        yield data.iloc[offset:offset + chunk_size]
+
+
+def _write_mmap_chunks(chunks: Iterable[pandas.DataFrame], path: str) -> None:
+    os.makedirs(path, exist_ok=True)
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        # No chunks, e.g. an empty input streamed: a dataset without rows nor columns
+        _write_mmap(pandas.DataFrame(index=pandas.Index([], dtype='int64', name=INDEX_COL)), path)
+        return
+    num_rows = 0
+
+    def tables() -> Iterator[pyarrow.Table]:
+        nonlocal num_rows
+        for chunk in itertools.chain([first], chunks):
+            num_rows += len(chunk)
+            yield _arrow_table(chunk, list(chunk.columns), index=True)
+
+    # Every chunk is a record batch of the same file
+    file_name = _write_ipc(tables(), path)
+    index_name = first.index.name or INDEX_COL
+    _write_manifest(path, {'version': 1,
+                           'num_rows': num_rows,
+                           'index': {'path': file_name, 'column': index_name, 'name': index_name},
+                           'columns': [str(col) for col in first.columns],
+                           'files': [{'path': file_name, 'columns': {str(col): str(col) for col in first.columns}}]})
+
+
+def _csv_columns(path: str) -> list[str]:
+    return [str(col) for col in pandas.read_csv(filepath_or_buffer=path, nrows=0, sep=',').columns]
+
+
+def _parquet_columns(path: str) -> list[str]:
+    return [col for col in pyarrow.parquet.read_schema(path).names if not col.startswith('__index_level_')]
+
+
+def _feather_columns(path: str) -> list[str]:
+    with pyarrow.ipc.open_file(path) as reader:
+        names: list[str] = reader.schema.names
+    return names
+
+
+def _mmap_columns(path: str) -> list[str]:
+    manifest = _mmap_manifest(path)
+    return [manifest['index']['name'], *manifest['columns']]
+
+
+STORAGE_BACKENDS: dict[str, tuple[Reader, Writer]] = {
+    'csv': (_read_csv, _write_csv),
+    'parquet': (_read_parquet, _write_parquet),
+    'feather': (_read_feather, _write_feather),
+    'mmap': (_read_mmap, _write_mmap),
+}
+
+CHUNK_BACKENDS: dict[str, tuple[ChunkReader, ChunkWriter]] = {
+    'csv': (_iter_csv, _write_csv_chunks),
+    'parquet': (_iter_parquet, _write_parquet_chunks),
+    'feather': (_iter_feather, _write_feather_chunks),
+    'mmap': (_iter_mmap, _write_mmap_chunks),
+}
+
+# Columns stored in a file, without reading its data. Formats without it can't push down `drop`
+SCHEMA_READERS: dict[str, Callable[[str], list[str]]] = {
+    'csv': _csv_columns,
+    'parquet': _parquet_columns,
+    'feather': _feather_columns,
+    'mmap': _mmap_columns,
+}
+
+# Formats parsing text, whose readers accept `na_values`
+TEXT_FORMATS = {'csv'}
+
+EXTENSIONS: dict[str, str] = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.ipc': 'feather',
+    '.mmap': 'mmap',
+}
+
+
+def register_backend(name: str, reader: Reader, writer: Writer, extensions: Sequence[str] = (),
+                     chunk_reader: ChunkReader | None = None, chunk_writer: ChunkWriter | None = None) -> None:
+    """
+    Register a new storage backend
+
+    Params:
+        - name (str): Name of the format, as used in the `--format` argument
+        - reader (Callable): Function receiving the path and the columns to read, returning a pandas.DataFrame
+            indexed by `PassengerId`
+        - writer (Callable): Function receiving the pandas.DataFrame and the path to write it to
+        - extensions (Sequence[str]): File extensions resolved to this format
+        - chunk_reader (Callable): Function receiving the path, the columns to read and the chunk size, yielding
+            pandas.DataFrame chunks. Needed to stream the format
+        - chunk_writer (Callable): Function receiving an iterable of pandas.DataFrame chunks and the path to write
+            them to. Needed to stream the format
+    """
+    STORAGE_BACKENDS[name] = (reader, writer)
+    if chunk_reader is not None and chunk_writer is not None:
+        CHUNK_BACKENDS[name] = (chunk_reader, chunk_writer)
+    for extension in extensions:
+        EXTENSIONS[extension.lower()] = name
+
+
+def resolve_format(path: str, file_format: str | None = None) -> str:
+    """
+    Get the storage format of a file, from the explicit format or from the file extension
+
+    Params:
+        - path (str): Path of the file
+        - file_format (str): Format forced by the user, takes precedence over the extension
+
+    Return:
+        - str: Name of the storage backend
+    """
+    if file_format is None:
+        file_format = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+        if file_format is None:
+            raise ValueError(f'Unable to infer the format of {path}, use one of {sorted(EXTENSIONS)} '
+                             f'or set the format explicitly.')
+
+    if file_format not in STORAGE_BACKENDS:
+        raise ValueError(f'Unknown format {file_format}, available formats are {sorted(STORAGE_BACKENDS)}.')
+
+    return file_format
+
+
+def _pushdown(path: str,
+              file_format: str,
+              columns: Sequence[str] | None,
+              drop: Sequence[str] | None,
+              na_values: Sequence[str] | None) -> tuple[Sequence[str] | None, dict[str, Any]]:
+    """Columns to read without the `drop` ones and the extra arguments of the reader"""
+    if drop and file_format in SCHEMA_READERS:
+        dropped = {col.lower().strip() for col in drop}
+        columns = [col for col in (columns or SCHEMA_READERS[file_format](path))
+                   if str(col).lower().strip() not in dropped and col != INDEX_COL]
+
+    options = {'na_values': list(na_values)} if na_values and file_format in TEXT_FORMATS else {}
+
+    return columns, options
+
+
+def read_data(path: str,
+              file_format: str | None = None,
+              columns: Sequence[str] | None = None,
+              drop: Sequence[str] | None = None,
+              na_values: Sequence[str] | None = None) -> pandas.DataFrame:
+    """
+    Read a dataset indexed by `PassengerId`
+
+    Params:
+        - path (str): Path of the file
+        - file_format (str): Format of the file, inferred from the extension when not given
+        - columns (Sequence[str]): Columns to read, all of them when not given
+        - drop (Sequence[str]): Columns not to read, case-insensitive and ignoring surrounding spaces
+        - na_values (Sequence[str]): Extra tokens parsed as nulls in text formats
+
+    Return:
+        - pandas.DataFrame: The dataset
+    """
+    file_format = resolve_format(path, file_format)
+    reader, _ = STORAGE_BACKENDS[file_format]
+    columns, options = _pushdown(path, file_format, columns=columns, drop=drop, na_values=na_values)
+    return reader(path, columns, **options)
+
+
+def write_data(data: pandas.DataFrame, path: str, file_format: str | None = None) -> None:
+    """
+    Write a dataset keeping its `PassengerId` index
+
+    Params:
+        - data (pandas.DataFrame): The dataset
+        - path (str): Path of the file
+        - file_format (str): Format of the file, inferred from the extension when not given
+    """
+    _, writer = STORAGE_BACKENDS[resolve_format(path, file_format)]
+    writer(data, path)
+
+
+def _chunk_backend(path: str, file_format: str | None) -> tuple[ChunkReader, ChunkWriter]:
+    file_format = resolve_format(path, file_format)
+
+    if file_format not in CHUNK_BACKENDS:
+        raise ValueError(f'Format {file_format} can not be streamed in chunks.')
+
+    return CHUNK_BACKENDS[file_format]
+
+
+def iter_data(path: str,
+              file_format: str | None = None,
+              columns: Sequence[str] | None = None,
+              chunk_size: int = DEFAULT_CHUNK_SIZE,
+              drop: Sequence[str] | None = None,
+              na_values: Sequence[str] | None = None) -> Iterator[pandas.DataFrame]:
+    """
+    Read a dataset indexed by `PassengerId` in chunks of at most `chunk_size` rows
+
+    Params:
+        - path (str): Path of the file
+        - file_format (str): Format of the file, inferred from the extension when not given
+        - columns (Sequence[str]): Columns to read, all of them when not given
+        - chunk_size (int): Maximum number of rows per chunk
+        - drop (Sequence[str]): Columns not to read, case-insensitive and ignoring surrounding spaces
+        - na_values (Sequence[str]): Extra tokens parsed as nulls in text formats
+
+    Return:
+        - Iterator[pandas.DataFrame]: The chunks of the dataset
+    """
+    file_format = resolve_format(path, file_format)
+    reader, _ = _chunk_backend(path, file_format)
+    columns, options = _pushdown(path, file_format, columns=columns, drop=drop, na_values=na_values)
+    return reader(path, columns, chunk_size, **options)
+
+
+def write_chunks(chunks: Iterable[pandas.DataFrame], path: str, file_format: str | None = None) -> None:
+    """
+    Write a dataset chunk by chunk, so only one chunk is kept in memory
+
+    Params:
+        - chunks (Iterable[pandas.DataFrame]): The chunks of the dataset, all with the same columns
+        - path (str): Path of the file
+        - file_format (str): Format of the file, inferred from the extension when not given
+    """
+    _, writer = _chunk_backend(path, file_format)
+    writer(chunks, path)
@@ -19,34 +19,44 @@ Step to wrangle the data, including:
 # Import local scripts in AWS
 # import sys # TODO
 # sys.path.insert(0, '/opt/ml/processing/code')
-import numpy
 from pandas import DataFrame
 
 from utils import parse_args, data_args
 
+# Useless columns for our purpose
+DROP_COLUMNS = ['cabin', 'ticket', 'name']
 
-@data_args
+# Values normalized to nulls
+NULL_TOKENS = ['nan', '', ' ', 'NaN']
+
+
+@data_args(row_local=True, read_options={'drop': DROP_COLUMNS, 'na_values': NULL_TOKENS})
 def wrangle(data: DataFrame) -> DataFrame:
     """
     Clean, select and format data
 
+    When the step reads its input, the columns are dropped and the null tokens parsed by the reader, so the
+    cleaning below has nothing left to do.
+
     Params:
         - data (pandas.DataFrame): The original dataset
 
     Return:
         - pandas.DataFrame: The processed dataset
     """
-    # Columns names formatting
+    # Columns names formatting, the columns are relabelled without copying the data
     data.columns = [col.lower().strip() for col in data.columns]
 
     # Useless columns for our purpose
-    data = data.drop(
-        ['cabin', 'ticket', 'name'],
-        axis=1
-    )
+    dropped = [col for col in DROP_COLUMNS if col in data.columns]
+    if dropped:
+        data = data.drop(dropped, axis=1)
 
-    # Normalize nans
-    data = data.replace(['nan', '', ' ', None, 'NaN'], numpy.nan)
+    # Normalize nans. Only object and string columns can hold the tokens and only the columns holding them are replaced
+    for col in data.columns[(data.dtypes == object) | (data.dtypes == 'string')]:
+        nulls = data[col].isin(NULL_TOKENS + [None])
+        if nulls.any():
+            data[col] = data[col].mask(nulls).infer_objects()
 
     return data
 
@@ -12,11 +12,15 @@ Feature Group Ingestion
 Script to ingest a pandas.DataFrame into a Feature Group
 
 """
+import os
 import sys
+import argparse
+import contextlib
 import logging
-import multiprocessing
 
 from datetime import datetime
+from time import perf_counter, process_time
+from typing import Callable, Iterator
 
 import boto3
 import pandas
@@ -24,6 +28,11 @@ import sagemaker
 
 from sagemaker.feature_store.feature_group import FeatureGroup
 
+from async_ingestion import DEFAULT_CONCURRENCY, async_ingest
+from compact_dtypes import feature_group_dtypes
+from ingestion_manifest import IngestionManifest, record_hashes
+from ingestion_scheduler import PROBE_ROWS, IngestionScheduler
+from offline_store import bulk_write, resolved_output_uri
 from utils import data_args, parse_args
 
 
@@ -39,9 +48,22 @@ logger = get_logger()
 SEP = ';'
 
 
+ARROW_STRING = pandas.StringDtype("pyarrow")
+MAX_REPORTED_IDS = 20
+
+# Environment variable configuring the endpoint of the boto3 feature store runtime clients
+ENDPOINT_VARIABLE = 'AWS_ENDPOINT_URL_SAGEMAKER_FEATURESTORE_RUNTIME'
+
+
 def cast_object_to_string(data_frame: pandas.DataFrame) -> pandas.DataFrame:
-    obj_cols = data_frame.select_dtypes(["object"]).columns.tolist()
-    data_frame[obj_cols] = data_frame[obj_cols].astype("str").astype("string")
+    """
+    Cast the object columns to Arrow backed strings, in a single conversion per column. The null values are kept as
+    nulls instead of being converted to the string 'nan', so they are left out of the ingested records.
+
+    The columns are replaced in place, the other columns are not copied.
+    """
+    for col in data_frame.columns[data_frame.dtypes == object]:
+        data_frame[col] = data_frame[col].astype(ARROW_STRING)
     return data_frame
 
 
@@ -49,92 +71,346 @@ def check_fg_prep(features: pandas.DataFrame,
                   record_identifier_name: str = 'TransactionID',
                   event_time_feature_name: str = 'EventTime'):
 
-    if record_identifier_name in features.columns:
-        lg_fg = len(features[record_identifier_name])
-        lg_uniq = len(features[record_identifier_name].unique())
-
-        if lg_fg != lg_uniq:
-            exc = Exception(f'\tColumn {record_identifier_name} for feature group has {abs(lg_fg - lg_uniq)}')
-            logger.exception(exc)
-            raise (exc)
-
-    else:
+    if record_identifier_name not in features.columns:
         logger.warning(
             str(f'RecordIdentifier column with name {record_identifier_name} doesnt appear in feature group.' +
                 f'\nCreating column {record_identifier_name} with values from dataframe index.'))
         features[record_identifier_name] = features.index
 
+    # Hash based detection of the duplicated identifiers
+    duplicated = features[record_identifier_name].duplicated(keep=False)
+
+    if duplicated.any():
+        duplicated_ids = features[record_identifier_name][duplicated].unique()
+        exc = Exception(f'\tColumn {record_identifier_name} for feature group has {len(duplicated_ids)} duplicated '
+                        f'values: {", ".join(map(str, duplicated_ids[:MAX_REPORTED_IDS]))}'
+                        f'{" ..." if len(duplicated_ids) > MAX_REPORTED_IDS else ""}')
+        logger.exception(exc)
+        raise (exc)
+
     if event_time_feature_name not in features.columns:
         logger.warning(str(f'EventTime column with name {event_time_feature_name} doesnt appear in feature group.' +
                            f'\nCreating column {event_time_feature_name} with values from now: {datetime.now()}'))
 
-        features[event_time_feature_name] = pandas.to_datetime('now').strftime('%Y-%m-%dT%H:%M:%SZ')
-        features[event_time_feature_name] = features[event_time_feature_name].astype(str).astype('string')
+        event_time = pandas.Timestamp.now(tz='UTC').strftime('%Y-%m-%dT%H:%M:%SZ')
+        features[event_time_feature_name] = pandas.Series(event_time, index=features.index, dtype=ARROW_STRING)
 
-    # HardCast objects to string type
-    features = cast_object_to_string(features)
+    # Compact dtypes back to Feature Group types, then HardCast objects to string type
+    features = cast_object_to_string(feature_group_dtypes(features))
 
     return features
 
 
+def add_ingestion_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """Add the arguments needed to ingest into a Feature Group to the steps parser"""
+    parser.add_argument(
+        "-f",
+        "--featuregroup-name",
+        dest="fg_name",
+        type=str,
+        help="The feature group name. (Mandatory)"
+    )
+
+    parser.add_argument(
+        "-r",
+        "--region",
+        dest="region",
+        type=str,
+        help="The output path of the result dataframe.",
+        default='eu-west-1'
+    )
+
+    parser.add_argument(
+        "--incremental-manifest",
+        dest="incremental_manifest",
+        type=str,
+        help="Path of the SQLite manifest of the records already ingested. If given, only the new or modified "
+             "records are ingested.",
+        default=None
+    )
+
+    parser.add_argument(
+        "--max-workers",
+        dest="max_workers",
+        type=int,
+        help="Maximum number of threads per ingestion process, or of files written at once in bulk mode. Sized from "
+             "the measured latency, or the available CPUs in bulk mode, if not given.",
+        default=None
+    )
+
+    parser.add_argument(
+        "--max-processes",
+        dest="max_processes",
+        type=int,
+        help="Maximum number of ingestion processes. Sized from the available CPUs if not given.",
+        default=None
+    )
+
+    parser.add_argument(
+        "--ingest-mode",
+        dest="ingest_mode",
+        type=str,
+        choices=["threads", "async", "bulk"],
+        help="Ingest with the processes and threads of FeatureGroup.ingest, with asyncio or, for backfills, "
+             "writing the records directly to the offline store.",
+        default="threads"
+    )
+
+    parser.add_argument(
+        "--concurrency",
+        dest="concurrency",
+        type=int,
+        help="Maximum number of PutRecord calls in flight in the async ingestion.",
+        default=DEFAULT_CONCURRENCY
+    )
+
+    parser.add_argument(
+        "--offline-store-uri",
+        dest="offline_store_uri",
+        type=str,
+        help="Bulk mode: directory or uri to write the offline store files to. The offline store of the Feature "
+             "Group if not given.",
+        default=None
+    )
+
+    parser.add_argument(
+        "--endpoint-url",
+        dest="endpoint_url",
+        type=str,
+        help="Endpoint of the SageMaker and feature store runtime APIs, e.g. a local feature store.",
+        default=None
+    )
+
+    parser.add_argument(
+        "--dead-letter-file",
+        dest="dead_letter_file",
+        type=str,
+        help="JSON lines file to store the records that failed in the async ingestion, to replay them later.",
+        default=None
+    )
+
+    return parser
+
+
+def open_sagemaker_session(region: str, endpoint_url: str | None = None) -> sagemaker.Session:
+    """
+    Get a SageMaker session, with its clients pointed to `endpoint_url` if given
+
+    Args:
+        region (str): AWS region
+        endpoint_url (str): Endpoint of the SageMaker and feature store runtime APIs, e.g. a local feature store
+
+    Returns:
+        sagemaker.Session: The session
+    """
+    boto_session = boto3.session.Session(region_name=region)
+    if endpoint_url is None:
+        return sagemaker.Session(boto_session=boto_session)
+
+    return sagemaker.Session(
+        boto_session=boto_session,
+        sagemaker_client=boto_session.client('sagemaker', endpoint_url=endpoint_url),
+        sagemaker_featurestore_runtime_client=boto_session.client('sagemaker-featurestore-runtime',
+                                                                  endpoint_url=endpoint_url))
+
+
+@contextlib.contextmanager
+def runtime_endpoint(endpoint_url: str | None) -> Iterator[None]:
+    """
+    Point the feature store runtime clients created in the context to `endpoint_url`, if given. The processes of
+    `FeatureGroup.ingest` create their own clients, configured from the environment, which is restored on exit.
+
+    Args:
+        endpoint_url (str): Endpoint of the feature store runtime API, e.g. a local feature store
+    """
+    if endpoint_url is None:
+        yield
+        return
+
+    previous = os.environ.get(ENDPOINT_VARIABLE)
+    os.environ[ENDPOINT_VARIABLE] = endpoint_url
+    try:
+        yield
+    finally:
+        if previous is None:
+            os.environ.pop(ENDPOINT_VARIABLE, None)
+        else:
+            os.environ[ENDPOINT_VARIABLE] = previous
+
+
+def select_changed_records(data: pandas.DataFrame,
+                           manifest: IngestionManifest,
+                           record_identifier_name: str,
+                           event_time_feature_name: str) -> tuple[pandas.DataFrame, Callable[[], None]]:
+    """
+    Select the records inserted or modified since the last ingestion recorded in the manifest
+
+    Args:
+        data (pandas.DataFrame): The features to ingest
+        manifest (IngestionManifest): The manifest of the records already ingested
+        record_identifier_name (str): Column with the record identifier, the index is used if it doesn't exist
+        event_time_feature_name (str): Column with the event time, not part of the record content
+
+    Returns:
+        pandas.DataFrame: The records to ingest
+        Callable: Function to call once the records are ingested to update the manifest
+    """
+    if record_identifier_name in data.columns:
+        record_ids = data[record_identifier_name]
+    else:
+        record_ids = data.index.to_series()
+
+    columns = [col for col in data.columns if col != event_time_feature_name]
+    # The hashes are computed on the ingested types, they don't depend on the dtypes the features were stored with
+    hashes = record_hashes(feature_group_dtypes(data), exclude=[event_time_feature_name])
+
+    changed, deleted = manifest.changes(record_ids=record_ids, hashes=hashes, columns=columns)
+
+    logger.info(f'{changed.sum()} of {len(data)} records are new or modified.')
+    if deleted:
+        logger.warning(f'{len(deleted)} records were deleted from the input since the last ingestion: '
+                       f'{", ".join(deleted[:20])}{" ..." if len(deleted) > 20 else ""}')
+
+    def commit() -> None:
+        manifest.record(record_ids=record_ids[changed], hashes=hashes[changed], columns=columns, deleted=deleted)
+
+    if not changed.all():
+        data = data[changed].copy()
+
+    return data, commit
+
+
+def scheduled_ingest(feature_group: FeatureGroup,
+                     data: pandas.DataFrame,
+                     max_workers: int | None = None,
+                     max_processes: int | None = None) -> None:
+    """
+    Ingest the data into the Feature Group sizing and adapting the number of processes and threads, see
+    `ingestion_scheduler`
+
+    Args:
+        feature_group (FeatureGroup): The Feature Group
+        data (pandas.DataFrame): The features, prepared with `check_fg_prep`
+        max_workers (int): Maximum number of threads per process
+        max_processes (int): Maximum number of processes
+    """
+    scheduler = IngestionScheduler(n_rows=len(data), max_workers=max_workers, max_processes=max_processes)
+
+    # The latency is measured on a first batch ingested by a single thread
+    probe = data.iloc[:PROBE_ROWS]
+    wall_time, cpu_time = perf_counter(), process_time()
+    feature_group.ingest(data_frame=probe, max_workers=1, max_processes=1, wait=True)
+    n_processes, n_workers = scheduler.calibrate(n_rows=len(probe),
+                                                 wall_time=perf_counter() - wall_time,
+                                                 cpu_time=process_time() - cpu_time)
+
+    for batch in scheduler.rounds(data.iloc[PROBE_ROWS:]):
+        print(f"Ingesting {len(batch)} rows with {n_processes} processes of {n_workers} workers")
+        starting_time = perf_counter()
+        feature_group.ingest(data_frame=batch, max_workers=n_workers, max_processes=n_processes, wait=True)
+        n_processes, n_workers = scheduler.observe(n_rows=len(batch), wall_time=perf_counter() - starting_time)
+
+
 @data_args
-def ingest(data: pandas.DataFrame) -> None:
+def ingest(data: pandas.DataFrame, args: argparse.Namespace) -> None:
     """
-    Desc.
+    Ingest the features into the Feature Group
 
     Args:
-        data (pandas.DataFrame):
+        data (pandas.DataFrame): The validated features
+        args (argparse.Namespace): Step arguments, with the Feature Group name and region
     """
-    boto_session = boto3.session.Session(region_name=args.region)
-    sagemaker_session = sagemaker.Session(boto_session=boto_session)
+    if args.incremental_manifest is None:
+        ingest_features(data=data, args=args)
+        return
+
+    # The manifest is closed whether the ingestion succeeds or fails
+    with IngestionManifest(args.incremental_manifest) as manifest:
+        ingest_features(data=data, args=args, manifest=manifest)
+
 
-    n_workers = round(len(data) / 5e4)
-    print(f"Number of workers: {n_workers} for a total number of rows of {len(data)}")
+def ingest_features(data: pandas.DataFrame,
+                    args: argparse.Namespace,
+                    manifest: IngestionManifest | None = None) -> None:
+    """
+    Ingest the features into the Feature Group, only the new or modified records if a manifest is given
 
-    n_processes = multiprocessing.cpu_count()
-    print(f"Number of processes: {n_processes} for a CPU count of {n_processes}")
+    Args:
+        data (pandas.DataFrame): The validated features
+        args (argparse.Namespace): Step arguments, with the Feature Group name and region
+        manifest (IngestionManifest): The manifest of the records already ingested, updated once they are ingested
+    """
+    endpoint_url = getattr(args, 'endpoint_url', None)
+    sagemaker_session = open_sagemaker_session(region=args.region, endpoint_url=endpoint_url)
 
     print(f'Ingesting rows into Feature Group: {args.fg_name}')
     feature_group = FeatureGroup(name=args.fg_name,
                                  sagemaker_session=sagemaker_session)
 
     fg_description = feature_group.describe()
+    record_identifier_name = fg_description['RecordIdentifierFeatureName']
+    event_time_feature_name = fg_description['EventTimeFeatureName']
+
+    if manifest is not None:
+        data, commit = select_changed_records(data=data,
+                                              manifest=manifest,
+                                              record_identifier_name=record_identifier_name,
+                                              event_time_feature_name=event_time_feature_name)
+        if data.empty:
+            print('No new or modified records to ingest.')
+            commit()
+            return
 
     data = check_fg_prep(features=data,
-                         record_identifier_name=fg_description['RecordIdentifierFeatureName'],
-                         event_time_feature_name=fg_description['EventTimeFeatureName'])
+                         record_identifier_name=record_identifier_name,
+                         event_time_feature_name=event_time_feature_name)
+
+    if args.ingest_mode == 'bulk':
+        output_uri = getattr(args, 'offline_store_uri', None) or resolved_output_uri(fg_description)
+        if output_uri is None:
+            raise Exception(f'Feature Group {args.fg_name} has no offline store, set --offline-store-uri')
+
+        report = bulk_write(data=data,
+                            output_uri=output_uri,
+                            event_time_feature_name=event_time_feature_name,
+                            max_workers=args.max_workers)
+        print(f"Bulk ingestion into {output_uri}: {report}")
+    elif args.ingest_mode == 'async':
+        report = async_ingest(data=data,
+                              feature_group_name=args.fg_name,
+                              concurrency=args.concurrency,
+                              dead_letter_file=args.dead_letter_file,
+                              region=args.region,
+                              endpoint_url=endpoint_url)
+        print(f"Async ingestion: {report}")
+
+        if report['failed']:
+            # The manifest is not updated, the failed records would be skipped in the next run
+            hint = (f"see {args.dead_letter_file}" if args.dead_letter_file is not None
+                    else "pass --dead-letter-file to keep the failed records")
+            raise Exception(f"{report['failed']} records failed to be ingested, {hint}")
+    else:
+        with runtime_endpoint(endpoint_url):
+            scheduled_ingest(feature_group=feature_group,
+                             data=data,
+                             max_workers=args.max_workers,
+                             max_processes=args.max_processes)
 
-    feature_group.ingest(data_frame=data, max_workers=n_workers, max_processes=n_processes, wait=True)
+    if manifest is not None:
+        commit()
 
 
 if __name__ == "__main__":
 
     # -------------- Args --------------
 
-    parser = parse_args(message="Gets arguments for data cleaning",
-                        return_parser=True)
-
-    parser.add_argument(
-        "-f",
-        "--featuregroup-name",
-        dest="fg_name",
-        type=str,
-        help="The feature group name. (Mandatory)"
-    )
-
-    parser.add_argument(
-        "-r",
-        "--region",
-        dest="region",
-        type=str,
-        help="The output path of the result dataframe.",
-        default='eu-west-1'
-    )
+    parser = add_ingestion_args(parse_args(message="Gets arguments for data cleaning",
+                                           return_parser=True))
 
     args, _ = parser.parse_known_args()
 
     # path and file_name are mandatory arguments
-    if args.path is None or args.fg_name is None or \
+    if args.data_path is None or args.fg_name is None or \
             args.input_file is None:
         parser.print_help()
         sys.exit(2)
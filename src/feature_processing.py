@@ -14,17 +14,26 @@ Step to process the features, including tasks like:
 - Adjust features
 - Deal with dates
 ...
+
+The features are declared as specs in `feature_registry.REGISTRY`. `process_record` computes the same features for a
+single record, at inference time.
 """
-import numpy
+from typing import Any, Iterable
+
 import pandas
 
+from feature_registry import REGISTRY
 from utils import data_args, parse_args
 
+# All the features of the registry, compiled once
+PLAN = REGISTRY.compile()
+RECORDS = PLAN.records()
 
-@data_args
+
+@data_args(row_local=True)
 def process_features(data: pandas.DataFrame):
     """
-    Create, modify or combine features
+    Create, modify or combine features, declared in `feature_registry.REGISTRY`
 
     Params:
         data (pandas.DataFrame): The original dataset
@@ -32,29 +41,27 @@ def process_features(data: pandas.DataFrame):
     Return:
         pandas.DataFrame: The processed dataset
     """
+    return PLAN.transform(data)
+
 
-    # Create new features
-    data['hours_traveling'] = data['embarked'].replace({
-        'Q': 85,
-        'C': 102,
-        'S': 108
-    }).astype(float)
+def process_record(record: dict[str, Any]) -> dict[str, Any]:
+    """
+    Create, modify or combine the features of a single record, as `process_features` does for a dataset
 
-    # Transform features
-    data['age_group'] = pandas.cut(
-        data['age'],
-        [0, 3, 10, 18, 30, 50, 70, 100],
-        labels=['baby', 'child', 'teenager', 'young adult', 'adult', 'mature adult', 'senior']
-    )
-    data = data.drop(['age'], axis=1)
+    Params:
+        - record (dict): The values of the wrangled columns of a passenger
 
-    # Combine features
-    data['alone'] = numpy.where((data['sibsp'] == 0) & (data['parch'] == 0), 'yes', 'no')
+    Return:
+        - dict: The processed record, with None for the nulls and the labels of the categorical features
+    """
+    processed: dict[str, Any] = RECORDS.transform(record)
+    return processed
 
-    # Fix features
-    data['fare'] = data['fare'] * 100  # Inflation correction (GBP UKCPI2005)
 
-    return data
+def process_records(records: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Process a micro-batch of records, see `process_record`"""
+    processed: list[dict[str, Any]] = RECORDS.transform_batch(records)
+    return processed
 
 
 if __name__ == '__main__':
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Feature Registry
+================
+
+Declarative definition of the features computed by `process_features`. Every feature is declared with a spec:
+
+- Mapping: values of a column looked up in a table, e.g. the hours traveling of every port
+- Binning: numeric column split in labelled intervals, e.g. the age groups
+- Combination: function of several columns, e.g. whether the passenger travels alone
+- Scaling: linear transformation of a column, e.g. the inflation correction of the fare
+
+The registry compiles the specs of the requested features into a `FeaturePlan`: every input column is converted to
+a NumPy array once and shared by all the specs using it, mappings are a lookup table indexed by the codes of the
+column and binnings a `searchsorted` over the bin edges. Only the requested features and their inputs are computed,
+and `FeaturePlan.lazy` defers the computation of every feature until it is accessed.
+
+Every spec also computes its feature for a single record, `spec.value`, from the same mapping table, bin edges,
+function or factors, so scoring a passenger at inference time doesn't build a one-row DataFrame. `FeaturePlan.records`
+compiles them into a `RecordTransform` of dicts or tuples in plain Python, a few microseconds per record.
+"""
+from bisect import bisect_left
+from operator import itemgetter
+from typing import Any, Callable, Iterable, Sequence
+
+import numpy
+import pandas
+
+from numpy.typing import NDArray
+
+AGE_BINS = [0, 3, 10, 18, 30, 50, 70, 100]
+AGE_GROUPS = ['baby', 'child', 'teenager', 'young adult', 'adult', 'mature adult', 'senior']
+
+
+def _encode(series: pandas.Series) -> tuple[NDArray[numpy.intp], pandas.Index]:
+    """Codes and distinct values of a column, nulls have code -1"""
+    if isinstance(series.dtype, pandas.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+    codes, uniques = pandas.factorize(series)
+    return codes, pandas.Index(uniques)
+
+
+def _is_null(value: Any) -> bool:
+    """Whether a value of a record is null, NaN is the only value not equal to itself"""
+    return value is None or value is pandas.NA or value != value
+
+
+class Mapping:
+    """
+    Feature with the values of a column looked up in a table
+
+    Params:
+        - source (str): Column to map
+        - mapping (dict): Feature value of every value of the column
+        - default: Feature value of the nulls and of the values not in the mapping
+        - dtype: Type of the feature
+    """
+
+    def __init__(self, source: str, mapping: dict[Any, Any], default: Any = numpy.nan, dtype: Any = numpy.float64):
+        self.inputs = [source]
+        self.mapping = mapping
+        self.default = default
+        self.dtype = dtype
+        # The values of the table converted to the type of the feature, as the DataFrame path does
+        self._table = {key: numpy.array(mapped, dtype=dtype).item() for key, mapped in mapping.items()}
+        self._default = None if _is_null(default) else numpy.array(default, dtype=dtype).item()
+
+    def compute(self, columns: dict[str, pandas.Series]) -> NDArray[Any]:
+        codes, uniques = _encode(columns[self.inputs[0]])
+        # A value per distinct value of the column, the last one for the nulls (code -1)
+        table: NDArray[Any] = numpy.array([self.mapping.get(value, self.default) for value in uniques] + [self.default],
+                                          dtype=self.dtype)
+        return table[codes]
+
+    def value(self, value: Any) -> Any:
+        """Feature of a record"""
+        return self._default if _is_null(value) else self._table.get(value, self._default)
+
+
+class Binning:
+    """
+    Categorical feature with the interval every value of a numeric column falls in, right-inclusive like
+    `pandas.cut`. Nulls and values out of the bins are null.
+
+    Params:
+        - source (str): Column to split
+        - bins (Sequence[float]): Increasing edges of the intervals
+        - labels (Sequence[str]): Label of every interval
+    """
+
+    def __init__(self, source: str, bins: Sequence[float], labels: Sequence[str]):
+        if len(labels) != len(bins) - 1:
+            raise ValueError(f'{len(bins)} bin edges need {len(bins) - 1} labels, got {len(labels)}')
+        self.inputs = [source]
+        self.bins = numpy.asarray(bins, dtype=numpy.float64)
+        self.dtype = pandas.CategoricalDtype(labels, ordered=True)
+        self._edges = self.bins.tolist()
+        self._labels = list(labels)
+
+    def compute(self, columns: dict[str, pandas.Series]) -> pandas.Categorical:
+        values = columns[self.inputs[0]].to_numpy(dtype=numpy.float64, na_value=numpy.nan)
+        # Interval (bins[i], bins[i + 1]] has code i, NaN is sorted after all the edges
+        codes = numpy.searchsorted(self.bins, values, side='left') - 1
+        codes[(codes < 0) | (codes >= len(self.bins) - 1)] = -1
+        return pandas.Categorical.from_codes(codes, dtype=self.dtype)
+
+    def value(self, value: Any) -> str | None:
+        """Label of the interval of a record, None when out of the bins"""
+        if _is_null(value):
+            return None
+        code = bisect_left(self._edges, value) - 1
+        return self._labels[code] if 0 <= code < len(self._labels) else None
+
+
+class Combination:
+    """
+    Feature computed from several columns
+
+    Params:
+        - inputs (Sequence[str]): Columns combined, given as NumPy arrays to the function in the same order
+        - function (Callable): Vectorised function of the columns
+        - categories (Sequence[str]): If given, the function returns the code of the category of every row
+    """
+
+    def __init__(self, inputs: Sequence[str], function: Callable[..., NDArray[Any]],
+                 categories: Sequence[str] | None = None):
+        self.inputs = list(inputs)
+        self.function = function
+        self.dtype = None if categories is None else pandas.CategoricalDtype(categories)
+        self._labels = None if categories is None else list(categories)
+
+    def compute(self, columns: dict[str, pandas.Series]) -> NDArray[Any] | pandas.Categorical:
+        result = self.function(*(columns[col].to_numpy() for col in self.inputs))
+        if self.dtype is None:
+            return result
+        return pandas.Categorical.from_codes(numpy.asarray(result, dtype=numpy.int8), dtype=self.dtype)
+
+    def value(self, *values: Any) -> Any:
+        """Feature of a record, the function is called with its values instead of the columns"""
+        result = self.function(*values)
+        return result if self._labels is None else self._labels[int(result)]
+
+
+class Scaling:
+    """
+    Feature with a linear transformation of a column, `factor * value + offset`
+
+    Params:
+        - source (str): Column to scale
+        - factor (float): Multiplicative factor
+        - offset (float): Additive offset
+    """
+
+    def __init__(self, source: str, factor: float = 1.0, offset: float = 0.0):
+        self.inputs = [source]
+        self.factor = factor
+        self.offset = offset
+
+    def compute(self, columns: dict[str, pandas.Series]) -> NDArray[Any]:
+        values: NDArray[Any] = columns[self.inputs[0]].to_numpy() * self.factor
+        return values + self.offset if self.offset else values
+
+    def value(self, value: Any) -> float | None:
+        """Feature of a record"""
+        return None if _is_null(value) else value * self.factor + self.offset
+
+
+Spec = Mapping | Binning | Combination | Scaling
+
+
+class FeatureRegistry:
+    """
+    Registry of the feature specs
+
+    Params:
+        - specs (dict): Spec of every feature, in the order the features are added to the data
+        - drop (Sequence[str]): Input columns replaced by the features and dropped from the result
+    """
+
+    def __init__(self, specs: dict[str, Spec] | None = None, drop: Sequence[str] = ()):
+        self.specs: dict[str, Spec] = dict(specs or {})
+        self.drop = list(drop)
+
+    def register(self, name: str, spec: Spec) -> 'FeatureRegistry':
+        """Add or replace the spec of a feature"""
+        self.specs[name] = spec
+        return self
+
+    def compile(self, features: Iterable[str] | None = None) -> 'FeaturePlan':
+        """
+        Compile the specs of the requested features
+
+        Params:
+            - features (Iterable[str]): Features to compute, all of them when not given
+
+        Return:
+            - FeaturePlan: The plan computing the features
+        """
+        features = list(self.specs) if features is None else list(features)
+
+        unknown = [name for name in features if name not in self.specs]
+        if unknown:
+            raise KeyError(f'Features not in the registry: {unknown}')
+
+        return FeaturePlan({name: self.specs[name] for name in features}, drop=self.drop)
+
+
+class FeaturePlan:
+    """
+    Computation of a set of features, see `FeatureRegistry.compile`
+
+    Params:
+        - specs (dict): Spec of every feature to compute
+        - drop (Sequence[str]): Input columns dropped from the result of `transform`
+    """
+
+    def __init__(self, specs: dict[str, Spec], drop: Sequence[str] = ()):
+        self.specs = specs
+        self.drop = list(drop)
+        # Every input column is read once, whatever the number of specs using it
+        self.inputs = list(dict.fromkeys(col for spec in specs.values() for col in spec.inputs))
+
+    def compute(self, data: pandas.DataFrame) -> dict[str, Any]:
+        """Compute the features of the plan, as arrays aligned with the rows of the data"""
+        columns = {col: data[col] for col in self.inputs}
+        return {name: spec.compute(columns) for name, spec in self.specs.items()}
+
+    def transform(self, data: pandas.DataFrame) -> pandas.DataFrame:
+        """
+        Add the features to the data: existing columns are replaced in place, new ones are appended in the order of
+        the plan, then the `drop` columns are removed
+
+        Params:
+            - data (pandas.DataFrame): The dataset with the input columns
+
+        Return:
+            - pandas.DataFrame: The dataset with the features
+        """
+        for name, values in self.compute(data).items():
+            data[name] = values
+
+        # Deleted in place, so the columns kept are not copied
+        for col in self.drop:
+            if col in data.columns:
+                del data[col]
+        return data
+
+    def lazy(self, data: pandas.DataFrame) -> 'LazyFeatures':
+        """Defer the computation of the features until they are accessed"""
+        return LazyFeatures(self, data)
+
+    def records(self, fields: Sequence[str] | None = None) -> 'RecordTransform':
+        """Compute the features of single records, see `RecordTransform`"""
+        return RecordTransform(self, fields=fields)
+
+
+class RecordTransform:
+    """
+    The `transform` of a plan for single records: the features are computed with `spec.value` in plain Python and
+    give the same values as the DataFrame path, with None for the nulls and the labels of the categorical features
+
+    Params:
+        - plan (FeaturePlan): The features to compute
+        - fields (Sequence[str]): Field of every value of the tuples, only needed to transform tuples
+    """
+
+    def __init__(self, plan: FeaturePlan, fields: Sequence[str] | None = None):
+        self.plan = plan
+        # The values of the inputs of every spec are taken from the record at once
+        self.steps = [(name, spec.value, itemgetter(*spec.inputs), len(spec.inputs) > 1)
+                      for name, spec in plan.specs.items()]
+        self.drop = [col for col in plan.drop if col not in plan.specs]
+
+        self.fields = None if fields is None else list(fields)
+        if self.fields is not None:
+            missing = [col for col in plan.inputs if col not in self.fields]
+            if missing:
+                raise KeyError(f'Inputs not in the fields of the records: {missing}')
+            output = dict.fromkeys(self.fields)
+            output.update(dict.fromkeys(plan.specs))
+            self.output_fields = [col for col in output if col not in self.drop]
+
+    def transform(self, record: dict[str, Any]) -> dict[str, Any]:
+        """
+        Add the features to a record, in the order of `FeaturePlan.transform`
+
+        Params:
+            - record (dict): The values of the input columns
+
+        Return:
+            - dict: A new record with the features
+        """
+        result = dict(record)
+        for name, value, inputs, many in self.steps:
+            result[name] = value(*inputs(record)) if many else value(inputs(record))
+        for col in self.drop:
+            result.pop(col, None)
+        return result
+
+    def transform_tuple(self, values: Sequence[Any]) -> tuple[Any, ...]:
+        """Add the features to a record given as a tuple of the `fields`, in the order of the `output_fields`"""
+        if self.fields is None:
+            raise ValueError('The fields of the tuples are needed to transform them')
+        return tuple(self.transform(dict(zip(self.fields, values))).values())
+
+    def transform_batch(self,
+                        records: Iterable[dict[str, Any] | Sequence[Any]]) -> list[dict[str, Any] | tuple[Any, ...]]:
+        """Transform a micro-batch of records, dicts or tuples, see `transform` and `transform_tuple`"""
+        return [self.transform(record) if isinstance(record, dict) else self.transform_tuple(record)
+                for record in records]
+
+
+class LazyFeatures:
+    """
+    Features computed when first accessed, `features['age_group']`, and kept for the next accesses
+
+    Params:
+        - plan (FeaturePlan): The features that can be accessed
+        - data (pandas.DataFrame): The dataset with the input columns
+    """
+
+    def __init__(self, plan: FeaturePlan, data: pandas.DataFrame):
+        self.plan = plan
+        self.data = data
+        self._computed: dict[str, pandas.Series] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.plan.specs
+
+    def __getitem__(self, name: str) -> pandas.Series:
+        if name not in self._computed:
+            values = FeaturePlan({name: self.plan.specs[name]}).compute(self.data)[name]
+            self._computed[name] = pandas.Series(values, index=self.data.index, name=name)
+        return self._computed[name]
+
+    def to_frame(self, features: Iterable[str] | None = None) -> pandas.DataFrame:
+        """Get the requested features, all of them when not given, as a pandas.DataFrame"""
+        features = list(self.plan.specs) if features is None else list(features)
+        return pandas.DataFrame({name: self[name] for name in features}, index=self.data.index)
+
+
+REGISTRY = FeatureRegistry(
+    specs={
+        # Create new features
+        'hours_traveling': Mapping('embarked', {'Q': 85, 'C': 102, 'S': 108}),
+        # Transform features
+        'age_group': Binning('age', bins=AGE_BINS, labels=AGE_GROUPS),
+        # Combine features
+        'alone': Combination(['sibsp', 'parch'], lambda sibsp, parch: (sibsp == 0) & (parch == 0),
+                             categories=['no', 'yes']),
+        # Fix features
+        'fare': Scaling('fare', factor=100),  # Inflation correction (GBP UKCPI2005)
+    },
+    drop=['age']
+)
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Feature Retrieval
+=================
+
+Point-in-time correct retrieval of the features stored in the offline store of a Feature Group, to build training
+sets without leakage. Every entity, a record identifier and a timestamp, gets the features of the last record of the
+Feature Group with an event time at or before its timestamp, never a later one:
+
+- only the partitions of the offline store up to the latest entity timestamp are read, and only the rows of the
+  requested entities, pushed down to the Parquet reader
+- the records written several times with the same event time are deduplicated, the last written one is kept, and
+  the deleted records (`is_deleted`) give no features
+- the as-of join is the one of `pandas.merge_asof` by record identifier, computed with a binary search over the
+  records sorted by identifier and event time, which scales to millions of entities
+
+The retrieval is also a pipeline step, reading the entities from `--input-file`, a `PassengerId` and a timestamp per
+row, and writing the training set to `--output-file`.
+"""
+import argparse
+import re
+
+from typing import Any, Sequence
+
+import numpy
+import pandas
+import pyarrow
+import pyarrow.compute
+import pyarrow.dataset
+import pyarrow.fs
+
+from numpy.typing import NDArray
+from offline_store import open_filesystem, parse_event_times
+from utils import data_args, parse_args
+
+RECORD_IDENTIFIER = 'PassengerId'
+EVENT_TIME = 'EventTime'
+ENTITY_TIME = 'timestamp'
+# Columns added by the Feature Store to the records of the offline store
+OFFLINE_COLUMNS = ['write_time', 'api_invocation_time', 'is_deleted']
+
+PARTITION = re.compile(r'year=(\d{4})/month=(\d{2})/day=(\d{2})/hour=(\d{2})/')
+
+
+def partition_files(uri: str, until: pandas.Timestamp | None = None) -> tuple[pyarrow.fs.FileSystem, list[str]]:
+    """
+    Parquet files of the offline store of a Feature Group
+
+    Params:
+        - uri (str): Uri of the offline store, see `offline_store.bulk_write`
+        - until (pandas.Timestamp): Only the files of the partitions up to this UTC time are listed
+
+    Return:
+        - pyarrow.fs.FileSystem: The filesystem of the files
+        - list[str]: The paths of the files
+    """
+    filesystem, root = open_filesystem(uri)
+    selector = pyarrow.fs.FileSelector(root, recursive=True)
+    files = [info.path for info in filesystem.get_file_info(selector)
+             if info.type == pyarrow.fs.FileType.File and info.path.endswith('.parquet')]
+
+    if until is not None:
+        last = until.strftime('%Y%m%d%H')
+        files = [path for path in files
+                 if (match := PARTITION.search(path)) is None or ''.join(match.groups()) <= last]
+
+    return filesystem, sorted(files)
+
+
+def read_offline_store(uri: str,
+                       record_ids: Sequence[Any] | None = None,
+                       until: pandas.Timestamp | None = None,
+                       features: Sequence[str] | None = None,
+                       record_identifier_name: str = RECORD_IDENTIFIER,
+                       event_time_feature_name: str = EVENT_TIME) -> pandas.DataFrame:
+    """
+    Read the records of the offline store of a Feature Group
+
+    Params:
+        - uri (str): Uri of the offline store
+        - record_ids (Sequence): Only the records of these identifiers are read, all of them when not given
+        - until (pandas.Timestamp): Only the partitions up to this UTC time are read
+        - features (Sequence[str]): Features to read, all of them when not given
+        - record_identifier_name (str): Column with the record identifier
+        - event_time_feature_name (str): Column with the event time
+
+    Return:
+        - pandas.DataFrame: The records, with their record identifier, event time and the offline store columns
+    """
+    filesystem, files = partition_files(uri, until=until)
+    if not files:
+        raise Exception(f'No records in the offline store {uri}')
+
+    dataset = pyarrow.dataset.dataset(files, filesystem=filesystem, format='parquet')
+
+    columns = None
+    if features is not None:
+        columns = list(dict.fromkeys([record_identifier_name, event_time_feature_name, *features,
+                                      *(col for col in OFFLINE_COLUMNS if col in dataset.schema.names)]))
+
+    row_filter = None
+    if record_ids is not None:
+        id_type = dataset.schema.field(record_identifier_name).type
+        row_filter = pyarrow.compute.field(record_identifier_name).isin(
+            pyarrow.array(pandas.unique(numpy.asarray(record_ids))).cast(id_type))
+
+    return dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+
+
+def asof_rows(entity_ids: NDArray[Any],
+              entity_times: NDArray[numpy.datetime64],
+              record_ids: NDArray[Any],
+              record_times: NDArray[numpy.datetime64],
+              record_versions: NDArray[Any] | None = None,
+              max_age: pandas.Timedelta | None = None) -> NDArray[numpy.intp]:
+    """
+    Position of the last record at or before the time of every entity, with the same identifier. It is the join of
+    `pandas.merge_asof(direction='backward', by=...)`, computed with a `searchsorted` over the records sorted by
+    identifier and time, without sorting the entities nor building the joined frames.
+
+    Params:
+        - entity_ids (numpy.ndarray): Identifier of every entity
+        - entity_times (numpy.ndarray): Time of every entity, `datetime64[ns]`
+        - record_ids (numpy.ndarray): Identifier of every record
+        - record_times (numpy.ndarray): Event time of every record, `datetime64[ns]`
+        - record_versions (numpy.ndarray): Among records with the same identifier and event time the one with the
+            highest version is joined, e.g. the write time, the last record when not given
+        - max_age (pandas.Timedelta): Records older than this at the entity time are not joined
+
+    Return:
+        - numpy.ndarray: Position of the record joined to every entity, -1 when there is none
+    """
+    n_entities = len(entity_ids)
+
+    # Identifiers and times are replaced by their codes, so (identifier, time) is a single sortable int64 key
+    id_codes, _ = pandas.factorize(numpy.concatenate([entity_ids, record_ids]))
+    times, time_codes = numpy.unique(numpy.concatenate([entity_times, record_times]), return_inverse=True)
+    keys = id_codes.astype(numpy.int64) * len(times) + time_codes
+    entity_keys, record_keys = keys[:n_entities], keys[n_entities:]
+
+    sort_keys = (record_keys,) if record_versions is None else (record_versions, record_keys)
+    order = numpy.lexsort(sort_keys)
+
+    # Last record with a key lower or equal than the key of the entity, it must have the same identifier
+    positions = numpy.searchsorted(record_keys[order], entity_keys, side='right') - 1
+    rows = order[numpy.maximum(positions, 0)]
+    found = (positions >= 0) & (id_codes[n_entities:][rows] == id_codes[:n_entities])
+
+    if max_age is not None:
+        found &= entity_times - record_times[rows] <= max_age.to_timedelta64()
+
+    return numpy.where(found, rows, -1)
+
+
+def point_in_time_join(entities: pandas.DataFrame,
+                       records: pandas.DataFrame,
+                       entity_time_column: str = ENTITY_TIME,
+                       record_identifier_name: str = RECORD_IDENTIFIER,
+                       event_time_feature_name: str = EVENT_TIME,
+                       max_age: pandas.Timedelta | None = None) -> pandas.DataFrame:
+    """
+    Join every entity with the last record at or before its timestamp, see `asof_rows`
+
+    Params:
+        - entities (pandas.DataFrame): The record identifier, as a column or the index, and the timestamp of every
+            entity. An identifier can appear at several timestamps
+        - records (pandas.DataFrame): The records of the Feature Group, see `read_offline_store`
+        - entity_time_column (str): Column with the timestamp of the entities, interpreted as UTC when naive
+        - record_identifier_name (str): Column with the record identifier
+        - event_time_feature_name (str): Column with the event time of the records
+        - max_age (pandas.Timedelta): Records older than this at the entity timestamp are not joined
+
+    Return:
+        - pandas.DataFrame: The entities in their original order with the features, null when there is no record,
+            and the event time of the record joined
+    """
+    from_index = record_identifier_name not in entities.columns
+    if from_index:
+        entities = entities.reset_index()
+
+    record_ids = records[record_identifier_name].to_numpy()
+    entity_times = pandas.to_datetime(entities[entity_time_column], utc=True).dt.tz_localize(None).to_numpy()
+    rows = asof_rows(entity_ids=entities[record_identifier_name].to_numpy().astype(record_ids.dtype),
+                     entity_times=entity_times,
+                     record_ids=record_ids,
+                     record_times=parse_event_times(records[event_time_feature_name]),
+                     record_versions=records['write_time'].to_numpy(dtype='datetime64[ns]')
+                     if 'write_time' in records.columns else None,
+                     max_age=max_age)
+
+    if 'is_deleted' in records.columns:
+        # A deleted record hides the previous ones
+        rows[(rows >= 0) & records['is_deleted'].to_numpy(dtype=bool)[rows]] = -1
+
+    features = [col for col in records.columns
+                if col not in entities.columns and col not in OFFLINE_COLUMNS or col == event_time_feature_name]
+    result = entities.copy()
+    for col in features:
+        # Entities without record get nulls, the integer features are converted to float
+        result[col] = pandas.api.extensions.take(records[col].values, rows, allow_fill=True)
+
+    return result.set_index(record_identifier_name) if from_index else result
+
+
+def add_retrieval_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """Add the arguments of the feature retrieval to the steps parser"""
+    parser.add_argument("--offline-store-uri",
+                        dest="offline_store_uri",
+                        type=str,
+                        help="Directory or uri of the offline store of the Feature Group")
+
+    parser.add_argument("--entity-time-column",
+                        dest="entity_time_column",
+                        type=str,
+                        default=ENTITY_TIME,
+                        help="Column of the input file with the timestamp of every entity")
+
+    parser.add_argument("--feature-names",
+                        dest="feature_names",
+                        type=lambda value: [col.strip() for col in value.split(',') if col.strip()],
+                        default=None,
+                        help="Comma separated list of features to retrieve, all of them when not given")
+
+    parser.add_argument("--max-age",
+                        dest="max_age",
+                        type=pandas.Timedelta,
+                        default=None,
+                        help="Records older than this at the entity timestamp are not joined, e.g. 30D")
+
+    return parser
+
+
+@data_args
+def retrieve_features(data: pandas.DataFrame, args: argparse.Namespace) -> pandas.DataFrame:
+    """
+    Build a training set with the features of the entities as of their timestamps
+
+    Params:
+        - data (pandas.DataFrame): The entities, indexed by `PassengerId`, with their timestamp
+        - args (argparse.Namespace): Step arguments, with the offline store uri
+
+    Return:
+        - pandas.DataFrame: The entities with their features
+    """
+    entity_time_column = getattr(args, 'entity_time_column', ENTITY_TIME)
+    until = pandas.to_datetime(data[entity_time_column], utc=True).max()
+
+    records = read_offline_store(args.offline_store_uri,
+                                 record_ids=data.index.to_numpy(),
+                                 until=until,
+                                 features=getattr(args, 'feature_names', None))
+
+    return point_in_time_join(data, records,
+                              entity_time_column=entity_time_column,
+                              max_age=getattr(args, 'max_age', None))
+
+
+if __name__ == '__main__':
+    # If you want to run it locally in your IDE, create the folder bin and use the following parameters:
+    #   --data-path="../bin" --step-name="Features Retrieval" --input-file="entities.csv"
+    #   --output-file="training_set.parquet" --offline-store-uri="../bin/offline-store"
+    args = add_retrieval_args(parse_args(return_parser=True)).parse_known_args()[0]
+    print(f"Received arguments:\n{args}.\n")
+    retrieve_features(args=args)
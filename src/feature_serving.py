@@ -0,0 +1,467 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Feature Serving
+===============
+
+Online serving of the processed features, so the models look them up at prediction time instead of processing them
+again or calling GetRecord for every prediction:
+
+- `FeatureIndex`: the latest record of every `PassengerId` in memory, a numpy array per feature, with the strings
+  stored once as categories. A record is found with a dict lookup and a batch with a single take per feature
+- `FeatureService`: the lookups of the index, with a read-through fallback for the records not in it to a client
+  with the `get_record` of the boto3 `sagemaker-featurestore-runtime` client, e.g. the client itself or a
+  `LocalFeatureStore`. The records of the fallback are kept in an LRU cache, for `ttl` seconds
+- `ServingServer`: localhost TCP endpoint of a service, a JSON request and response per line, and `ServingClient`
+
+    python feature_serving.py --data-path="../bin" --input-file="processed_features.parquet" --port=8600
+"""
+import argparse
+import json
+import socket
+import socketserver
+import threading
+
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Callable, Hashable, Sequence
+
+import numpy
+import pandas
+
+from numpy.typing import NDArray
+from feature_retrieval import EVENT_TIME, OFFLINE_COLUMNS, RECORD_IDENTIFIER, read_offline_store
+from offline_store import parse_event_times
+from utils import parse_args, read_input
+
+CACHE_SIZE = 100_000
+CACHE_TTL = 60.0
+
+Features = dict[str, Any]
+
+
+def _python(value: Any) -> Any:
+    """Python value of a feature, None when null"""
+    if value is None or value is pandas.NA or (isinstance(value, float) and value != value):
+        return None
+    return value.item() if isinstance(value, numpy.generic) else value
+
+
+class FeatureIndex:
+    """
+    Latest features of every record identifier, in memory
+
+    Params:
+        - data (pandas.DataFrame): The features, indexed by the record identifier, one row per identifier
+    """
+
+    def __init__(self, data: pandas.DataFrame):
+        if not data.index.is_unique:
+            raise ValueError(f'The index {data.index.name} has duplicated record identifiers')
+
+        self.ids = data.index
+        self.names = list(data.columns)
+        self.numeric_ids = pandas.api.types.is_integer_dtype(self.ids.dtype)
+        self.positions = dict(zip(self.ids.tolist(), range(len(self.ids))))
+
+        # The numeric features as numpy arrays, the others as the codes of their distinct values
+        self.columns: list[tuple[str, NDArray[Any], list[Any] | None]] = []
+        for name in self.names:
+            series = data[name]
+            numeric = pandas.api.types.is_numeric_dtype(series.dtype)
+            if numeric and not isinstance(series.dtype, pandas.CategoricalDtype):
+                values = series.to_numpy(dtype=float, na_value=numpy.nan) if series.hasnans else series.to_numpy()
+                self.columns.append((name, values, None))
+            else:
+                # The last category is the null one
+                codes, categories = pandas.factorize(series)
+                categories = [_python(value) for value in categories] + [None]
+                codes[codes < 0] = len(categories) - 1
+                self.columns.append((name, codes.astype(numpy.min_scalar_type(len(categories))), categories))
+
+        # The categories as arrays too, to take them in the batches
+        self.category_arrays = {name: numpy.array(categories, dtype=object)
+                                for name, _, categories in self.columns if categories is not None}
+
+    @classmethod
+    def from_records(cls,
+                     records: pandas.DataFrame,
+                     record_identifier_name: str = RECORD_IDENTIFIER,
+                     event_time_feature_name: str = EVENT_TIME) -> 'FeatureIndex':
+        """
+        Index of the latest record of every identifier, the last written one between records with the same event
+        time. The identifiers whose latest record is deleted are not indexed.
+
+        Params:
+            - records (pandas.DataFrame): The records of a Feature Group, see `feature_retrieval.read_offline_store`
+            - record_identifier_name (str): Column with the record identifier
+            - event_time_feature_name (str): Column with the event time
+
+        Return:
+            - FeatureIndex: The index
+        """
+        sort_keys = [parse_event_times(records[event_time_feature_name])]
+        if 'write_time' in records.columns:
+            sort_keys.insert(0, records['write_time'].to_numpy(dtype='datetime64[ns]'))
+        order = numpy.lexsort(sort_keys)
+
+        latest = records.iloc[order].drop_duplicates(record_identifier_name, keep='last')
+        if 'is_deleted' in latest.columns:
+            latest = latest[~latest['is_deleted'].to_numpy(dtype=bool)]
+
+        return cls(latest.drop(columns=[col for col in OFFLINE_COLUMNS if col in latest.columns])
+                         .set_index(record_identifier_name).sort_index())
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def key(self, record_id: Hashable) -> Hashable:
+        """
+        Identifier of the index, the identifiers are strings in the feature store and integers in the index. A string
+        that isn't an integer is kept as it is, so it's not indexed
+        """
+        if self.numeric_ids and isinstance(record_id, str):
+            try:
+                return int(record_id)
+            except ValueError:
+                return record_id
+        return record_id
+
+    def get(self, record_id: Hashable, features: Sequence[str] | None = None) -> Features | None:
+        """Features of a record identifier, None if it is not indexed"""
+        row = self.positions.get(self.key(record_id))
+        if row is None:
+            return None
+
+        record = {}
+        for name, values, categories in self.columns:
+            if features is None or name in features:
+                value = values.item(row)
+                # NaN is the only value not equal to itself
+                record[name] = categories[value] if categories is not None else None if value != value else value
+        return record
+
+    def _rows(self, record_ids: Sequence[Hashable]) -> tuple[list[Hashable], NDArray[numpy.intp]]:
+        """Identifiers of the index and row of every record identifier, -1 when not indexed"""
+        keys = [self.key(record_id) for record_id in record_ids]
+        rows = numpy.fromiter(map(self.positions.get, keys, [-1] * len(keys)), dtype=numpy.intp, count=len(keys))
+        return keys, rows
+
+    def get_batch(self, record_ids: Sequence[Hashable]) -> tuple[pandas.DataFrame, NDArray[numpy.bool_]]:
+        """
+        Features of several record identifiers
+
+        Params:
+            - record_ids (Sequence[Hashable]): The record identifiers
+
+        Return:
+            - pandas.DataFrame: The features of the identifiers, in their order, null when not indexed
+            - numpy.ndarray: Whether every identifier is indexed
+        """
+        keys, rows = self._rows(record_ids)
+        found = rows >= 0
+
+        batch = {}
+        for name, values, categories in self.columns:
+            if categories is None:
+                batch[name] = values[rows] if found.all() else pandas.api.extensions.take(values, rows, allow_fill=True)
+            else:
+                batch[name] = self.category_arrays[name][numpy.where(found, values[rows], -1)]
+        return pandas.DataFrame(batch, index=pandas.Index(keys, name=self.ids.name), copy=False), found
+
+    def get_records(self, record_ids: Sequence[Hashable]) -> list[Features | None]:
+        """
+        Features of several record identifiers as the records of `get`, with a single take per feature
+
+        Params:
+            - record_ids (Sequence[Hashable]): The record identifiers
+
+        Return:
+            - list[dict]: The features of the identifiers, in their order, None when not indexed
+        """
+        _, rows = self._rows(record_ids)
+        hits = numpy.flatnonzero(rows >= 0)
+        # Only the rows of the indexed identifiers are taken, so the integer features are not cast to float by nulls
+        taken = rows[hits]
+
+        columns = []
+        for name, values, categories in self.columns:
+            if categories is not None:
+                columns.append(self.category_arrays[name][values[taken]].tolist())
+            elif values.dtype.kind == 'f':
+                # NaN is the only value not equal to itself
+                columns.append([None if value != value else value for value in values[taken].tolist()])
+            else:
+                columns.append(values[taken].tolist())
+
+        records: list[Features | None] = [None] * len(rows)
+        for position, row in zip(hits.tolist(), zip(*columns)):
+            records[position] = dict(zip(self.names, row))
+        return records
+
+    def memory_usage(self) -> int:
+        """Bytes of the feature arrays"""
+        return sum(values.nbytes + (0 if categories is None else 8 * len(categories))
+                   for _, values, categories in self.columns)
+
+
+class LRUCache:
+    """
+    Least recently used entries, up to `maxsize`, expired `ttl` seconds after being put
+
+    Params:
+        - maxsize (int): Maximum number of entries
+        - ttl (float): Seconds an entry is valid, forever when not given
+        - clock (Callable): Current time in seconds
+    """
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float | None = CACHE_TTL,
+                 clock: Callable[[], float] = monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (self.ttl is not None and self.clock() - entry[0] > self.ttl):
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self.lock:
+            self.entries[key] = (self.clock(), value)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+# Cached for the records the fallback doesn't have, to not call it again for them until they expire
+_MISSING = object()
+
+
+class FeatureService:
+    """
+    Lookups of the features of the record identifiers, in the index and else through the fallback client
+
+    Params:
+        - index (FeatureIndex): The records served from memory, none when not given
+        - client: Client with the `get_record` of the `sagemaker-featurestore-runtime` client, only the index is used
+            when not given
+        - feature_group_name (str): Feature Group of the records of the client
+        - cache_size (int): Records of the client kept in the cache
+        - ttl (float): Seconds the records of the client are kept in the cache
+    """
+
+    def __init__(self,
+                 index: FeatureIndex | None = None,
+                 client: Any = None,
+                 feature_group_name: str | None = None,
+                 cache_size: int = CACHE_SIZE,
+                 ttl: float | None = CACHE_TTL):
+        if client is not None and feature_group_name is None:
+            raise ValueError('The feature group name is required with a client')
+
+        self.index = index
+        self.client = client
+        self.feature_group_name = feature_group_name
+        self.cache = LRUCache(maxsize=cache_size, ttl=ttl)
+        self.n_fallback_calls = 0
+
+    def _fallback(self, record_id: Hashable) -> Features | None:
+        cached = self.cache.get(record_id)
+        if cached is not None:
+            return None if cached is _MISSING else cached
+
+        self.n_fallback_calls += 1
+        response = self.client.get_record(FeatureGroupName=self.feature_group_name,
+                                          RecordIdentifierValueAsString=str(record_id))
+        record = {feature['FeatureName']: feature['ValueAsString'] for feature in response.get('Record', [])} or None
+        self.cache.put(record_id, _MISSING if record is None else record)
+        return record
+
+    def get(self, record_id: Hashable) -> Features | None:
+        """Features of a record identifier, as strings when they come from the client, None if it has no record"""
+        record = None if self.index is None else self.index.get(record_id)
+        if record is None and self.client is not None:
+            record = self._fallback(record_id)
+        return record
+
+    def get_batch(self, record_ids: Sequence[Hashable]) -> list[Features | None]:
+        """Features of several record identifiers, in their order, see `get`"""
+        if self.index is None:
+            records: list[Features | None] = [None] * len(record_ids)
+        else:
+            records = self.index.get_records(record_ids)
+
+        if self.client is not None:
+            records = [record if record is not None else self._fallback(record_id)
+                       for record_id, record in zip(record_ids, records)]
+        return records
+
+    def stats(self) -> dict[str, int]:
+        """Indexed records, cached records, cache hits and misses and calls to the client"""
+        return {'indexed': 0 if self.index is None else len(self.index),
+                'cached': len(self.cache),
+                'cache_hits': self.cache.hits,
+                'cache_misses': self.cache.misses,
+                'fallback_calls': self.n_fallback_calls}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # The responses are small, they are sent at once instead of waiting for the ACK of the previous one
+    disable_nagle_algorithm = True
+
+    server: '_Server'
+
+    def handle(self) -> None:
+        service = self.server.service
+        for line in self.rfile:
+            response: dict[str, Any]
+            try:
+                request = json.loads(line)
+                if 'ids' in request:
+                    response = {'records': service.get_batch(request['ids'])}
+                elif 'id' in request:
+                    response = {'record': service.get(request['id'])}
+                else:
+                    response = {'stats': service.stats()}
+            except Exception as error:
+                response = {'error': f'{type(error).__name__}: {error}'}
+            self.wfile.write(json.dumps(response, default=str).encode() + b'\n')
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: FeatureService):
+        super().__init__(address, _Handler)
+        self.service = service
+
+
+class ServingServer:
+    """
+    TCP server of a feature service, run on a background thread while used as a context manager. Every request is
+    a JSON line, `{"id": ...}`, `{"ids": [...]}` or `{}` for the stats, answered with a JSON line
+
+    Params:
+        - service (FeatureService): The service
+        - host (str): Address to listen on
+        - port (int): Port to listen on, any free port when 0
+    """
+
+    def __init__(self, service: FeatureService, host: str = '127.0.0.1', port: int = 0):
+        self.server = _Server((host, port), service)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def address(self) -> tuple[str, int]:
+        host, port = self.server.socket.getsockname()[:2]
+        return host, port
+
+    def __enter__(self) -> 'ServingServer':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ServingClient:
+    """Client of a `ServingServer`, over a single connection"""
+
+    def __init__(self, address: tuple[str, int], timeout: float | None = 10.0):
+        self.socket = socket.create_connection(address, timeout=timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.socket.makefile('rwb')
+
+    def _call(self, request: dict[str, Any]) -> Any:
+        self.file.write(json.dumps(request).encode() + b'\n')
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if 'error' in response:
+            raise Exception(f'Feature serving error: {response["error"]}')
+        return response
+
+    def get(self, record_id: Hashable) -> Features | None:
+        record: Features | None = self._call({'id': record_id})['record']
+        return record
+
+    def get_batch(self, record_ids: Sequence[Hashable]) -> list[Features | None]:
+        records: list[Features | None] = self._call({'ids': list(record_ids)})['records']
+        return records
+
+    def stats(self) -> dict[str, int]:
+        stats: dict[str, int] = self._call({})['stats']
+        return stats
+
+    def close(self) -> None:
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self) -> 'ServingClient':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def add_serving_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """Add the arguments of the feature serving to the steps parser"""
+    parser.add_argument("--offline-store-uri",
+                        dest="offline_store_uri",
+                        type=str,
+                        default=None,
+                        help="Offline store of the records served, the input file is served when not given")
+
+    parser.add_argument("--host",
+                        dest="host",
+                        type=str,
+                        default='127.0.0.1',
+                        help="Address the serving endpoint listens on")
+
+    parser.add_argument("--port",
+                        dest="port",
+                        type=int,
+                        default=8600,
+                        help="Port the serving endpoint listens on")
+
+    return parser
+
+
+def load_index(args: argparse.Namespace) -> FeatureIndex:
+    """Index of the offline store, if given, or of the input file, indexed by the record identifier"""
+    if args.offline_store_uri:
+        return FeatureIndex.from_records(read_offline_store(args.offline_store_uri))
+    return FeatureIndex(read_input(args))
+
+
+if __name__ == '__main__':
+    # If you want to run it locally in your IDE, create the folder bin and use the following parameters:
+    #   --data-path="../bin" --step-name="Feature Serving" --input-file="processed_features.parquet" --port=8600
+    args = add_serving_args(parse_args(return_parser=True)).parse_known_args()[0]
+    print(f"Received arguments:\n{args}.\n")
+
+    index = load_index(args)
+    print(f"Serving {len(index)} records, {index.memory_usage() / 2 ** 20:.1f} MB, on {args.host}:{args.port}")
+    with ServingServer(FeatureService(index), host=args.host, port=args.port) as server:
+        server.thread.join()
@@ -11,87 +11,697 @@ Feature Validation
 
 Step to validate the values of the features to check data consistency, enforce schema of data, apply
  business rules or constraints ...
+
+The rules are declared once in `FEATURE_RULES` and compiled at import time into `SCHEMA`: every column is validated
+with a single vectorised mask fusing its range, `isin` and `notin` checks. The checks are only evaluated one by one
+to build the failure report of the columns that failed.
+
+Two modes are available with `--validation-mode`:
+- fail-fast: raise on the first column failing its checks
+- collect: validate all the columns and raise with a compact report of all the failures
+- sampled: validate a stratified sample sized from `--validation-confidence` and `--validation-tolerance`, all the
+  rows are only validated when the sample fails
+
+With `--chunk-size` the input file is validated in a single pass chunk by chunk, merging the statistics of every chunk
+(`ValidationStats`). In sampled mode a reservoir sample is validated first and the file is only fully read again when
+the sample fails.
 """
+import argparse
+import collections
+import functools
+import math
+import re
+
+from typing import Any, Callable, Iterable, Sequence
+
+import numpy
 import pandas
 import pandera
 
+from numpy.typing import NDArray
 from pandera import Column, Check
+from data_io import iter_data
+from feature_registry import AGE_GROUPS
 from utils import data_args, parse_args
 
+FEATURE_RULES: dict[str, dict[str, Any]] = {
+    # Values defined in the list must appear in the column `survived`
+    "survived": {'dtype': 'int', 'unique_values_eq': [0, 1]},
+    # Values defined in the list must appear in the column `sex`
+    "sex": {'dtype': 'str', 'unique_values_eq': ["male", "female"]},
+    # Values must be 1, 2 or 3 and column must be of int type
+    "pclass": {'dtype': 'int', 'in_range': (0, 3)},
+    # age_group column could have the values in the list. It is stored as str in CSV files and as
+    # category in columnar files
+    "age_group": {'dtype': 'str', 'isin': AGE_GROUPS, 'nullable': True},
+    # sibsp column could have the values in range(0,8) but not equals to 6 or 7
+    "sibsp": {'dtype': 'int', 'notin': [6, 7], 'in_range': (0, 8)},
+    # alone column could have the values in the list
+    "alone": {'dtype': 'str', 'isin': ["yes", "no"]},
+    # parch column must be int within the range(0,6)
+    "parch": {'dtype': 'int', 'in_range': (0, 6)},
+    # fare must be in range(0.0, 60000.0)
+    "fare": {'dtype': 'float', 'less_than': 60000.0, 'greater_than_or_equal_to': 0.0},
+    # embarked
+    "embarked": {'dtype': 'str', 'isin': ['S', 'C', 'Q'], 'nullable': True},
+    #
+    "hours_traveling": {'dtype': 'float', 'in_range': (80.0, 110.0), 'nullable': True},
+}
 
-@data_args
-def validate_features(data: pandas.DataFrame) -> pandas.DataFrame:
-    """"
-    Method to validate the features
+# Feature Group column naming requirements
+COLUMN_NAME = re.compile(r'[^. ]{0,62}')
+
+# Number of failing values shown per check in the report
+N_FAILURE_CASES = 5
+
+# Sampled validation: probability of detecting a fraction of at least `DEFAULT_TOLERANCE` invalid rows
+DEFAULT_CONFIDENCE = 0.99
+DEFAULT_TOLERANCE = 0.001
+
+# Codes and categories of a column of strings, see `ColumnValidator._encode`
+Encoded = tuple[NDArray[numpy.intp], pandas.Index]
+
+DTYPE_CHECKS: dict[str, Callable[[Any], bool]] = {
+    'int': pandas.api.types.is_integer_dtype,
+    'float': pandas.api.types.is_float_dtype,
+    'str': lambda dtype: pandas.api.types.is_object_dtype(dtype) or pandas.api.types.is_string_dtype(dtype) or
+    isinstance(dtype, pandas.CategoricalDtype),
+}
+
+
+class FeatureValidationError(Exception):
+    """Error raised when the features don't fulfill the rules, with the report of the failures"""
+
+    def __init__(self, report: pandas.DataFrame):
+        super().__init__(f'Features validation failed:\n{report.to_string(index=False)}')
+        self.report = report
+
+
+class ColumnValidator:
+    """
+    Validation of a column compiled from its rules
+
+    Params:
+        - name (str): Name of the column
+        - rules (dict): The rules of the column, see `FEATURE_RULES`
+    """
+
+    def __init__(self, name: str, rules: dict[str, Any]):
+        self.name = name
+        self.dtype: str | None = rules.get('dtype')
+        self.nullable: bool = rules.get('nullable', False)
+        self.unique_values: frozenset[Any] | None = None
+        if 'unique_values_eq' in rules:
+            self.unique_values = frozenset(rules['unique_values_eq'])
+        self.isin: NDArray[Any] | None = None if 'isin' not in rules else numpy.array(rules['isin'], dtype=object)
+        self.notin: NDArray[Any] | None = None if 'notin' not in rules else numpy.array(rules['notin'])
+
+        self.lower: float = -numpy.inf
+        self.upper: float = numpy.inf
+        self.lower_inclusive, self.upper_inclusive = True, True
+        if 'in_range' in rules:
+            self.lower, self.upper = rules['in_range']
+        if 'greater_than_or_equal_to' in rules:
+            self.lower = rules['greater_than_or_equal_to']
+        if 'less_than' in rules:
+            self.upper, self.upper_inclusive = rules['less_than'], False
+
+        self.has_range = bool(numpy.isfinite(self.lower) or numpy.isfinite(self.upper))
+
+        self.range_check = f'in_range({self.lower}, {self.upper})'
+        self.notin_check = None if self.notin is None else f'notin({self.notin.tolist()})'
+        self.isin_check = None if self.isin is None else f'isin({self.isin.tolist()})'
+        self.unique_check = None if self.unique_values is None else f'unique_values_eq({sorted(self.unique_values)})'
+        # Columns whose checks only depend on the set of values, see `ColumnStats`
+        self.counts_values = any(rule is not None for rule in [self.unique_values, self.isin, self.notin])
+
+    def _range_mask(self, values: NDArray[numpy.float64]) -> NDArray[numpy.bool_]:
+        lower = values < self.lower if self.lower_inclusive else values <= self.lower
+        upper = values > self.upper if self.upper_inclusive else values >= self.upper
+        return lower | upper
+
+    @staticmethod
+    def _encode(series: pandas.Series) -> Encoded:
+        """
+        Codes and categories of a column of strings, in a single hash pass shared by the null, `isin` and unique
+        values checks. Nulls have code -1.
+        """
+        if isinstance(series.dtype, pandas.CategoricalDtype):
+            return series.cat.codes.to_numpy(), series.cat.categories
+        codes, uniques = pandas.factorize(series)
+        return codes, pandas.Index(uniques)
+
+    def _isin_mask(self, series: pandas.Series, encoded: Encoded | None) -> NDArray[numpy.bool_]:
+        if encoded is None:
+            found: NDArray[numpy.bool_] = series.isin(self.isin).to_numpy(dtype=bool)
+            return ~found
+        # Only the categories are compared, then looked up by code. Nulls, code -1, take the extra last item
+        codes, categories = encoded
+        valid: NDArray[numpy.bool_] = numpy.append(categories.isin(self.isin), True)
+        return ~valid[codes]
+
+    @staticmethod
+    def _values(series: pandas.Series) -> NDArray[numpy.float64]:
+        values: NDArray[numpy.float64] = series.to_numpy(dtype='float64', na_value=numpy.nan)
+        return values
+
+    def _masks(self, series: pandas.Series, encoded: Encoded | None) -> list[tuple[str, NDArray[numpy.bool_]]]:
+        """Mask of the values failing every check of the column, nulls included"""
+        masks = []
+        values = self._values(series) if self.has_range or self.notin is not None else None
+
+        if values is not None and self.has_range:
+            masks.append((self.range_check, self._range_mask(values)))
+        if values is not None and self.notin is not None and self.notin_check is not None:
+            masks.append((self.notin_check, numpy.isin(values, self.notin)))
+        if self.isin is not None and self.isin_check is not None:
+            masks.append((self.isin_check, self._isin_mask(series, encoded)))
+
+        return masks
+
+    def invalid_mask(self,
+                     series: pandas.Series,
+                     nulls: NDArray[numpy.bool_],
+                     encoded: Encoded | None) -> NDArray[numpy.bool_]:
+        """Boolean mask of the values failing any of the range, `isin` and `notin` checks, nulls excluded"""
+        invalid = numpy.zeros(len(series), dtype=bool)
+        for _, mask in self._masks(series, encoded):
+            invalid |= mask
+
+        return invalid & ~nulls
+
+    def _failed_checks(self,
+                       series: pandas.Series,
+                       nulls: NDArray[numpy.bool_],
+                       encoded: Encoded | None) -> list[tuple[str, pandas.Series]]:
+        """Evaluate the checks one by one, only done for the columns that failed"""
+        failed = [(check, mask & ~nulls) for check, mask in self._masks(series, encoded)]
+        return [(check, series[mask]) for check, mask in failed if mask.any()]
+
+    def _unique_values(self,
+                       series: pandas.Series,
+                       nulls: NDArray[numpy.bool_],
+                       encoded: Encoded | None) -> set[Any]:
+        if encoded is None:
+            return set(series[~nulls].unique())
+        codes, categories = encoded
+        present = numpy.bincount(codes[~nulls], minlength=len(categories)) > 0
+        return set(categories[present])
+
+    def validate(self, data: pandas.DataFrame) -> list[dict[str, Any]]:
+        """
+        Validate the column
+
+        Params:
+            - data (pandas.DataFrame): The features
+
+        Return:
+            - list[dict]: A report line per failed check, empty if the column is valid
+        """
+        if self.name not in data.columns:
+            return [_failure(self.name, 'column_in_dataframe', 1, [])]
+
+        series = data[self.name]
+
+        if self.dtype is not None and not DTYPE_CHECKS[self.dtype](series.dtype):
+            return [_failure(self.name, f'dtype({self.dtype})', len(series), [str(series.dtype)])]
+
+        failures = []
+
+        if self.dtype == 'str':
+            encoded = self._encode(series)
+            nulls = encoded[0] == -1
+        else:
+            encoded = None
+            nulls = series.isna().to_numpy()
+
+        if not self.nullable and nulls.any():
+            failures.append(_failure(self.name, 'not_nullable', int(nulls.sum()), [None]))
+
+        if self.invalid_mask(series, nulls, encoded).any():
+            for check, failure_cases in self._failed_checks(series, nulls, encoded):
+                failures.append(_failure(self.name, check, len(failure_cases), failure_cases.unique()))
+
+        if self.unique_values is not None and self.unique_check is not None:
+            unique_values = self._unique_values(series, nulls, encoded)
+            if unique_values != self.unique_values:
+                failures.append(_failure(self.name, self.unique_check, 1,
+                                         sorted(unique_values ^ self.unique_values, key=str)))
+
+        return failures
+
+    def summarize(self, data: pandas.DataFrame) -> 'ColumnStats':
+        """
+        Summarize a chunk of the column into mergeable statistics, see `validate_stats`
+
+        Params:
+            - data (pandas.DataFrame): A chunk of the features
+
+        Return:
+            - ColumnStats: The statistics of the chunk
+        """
+        stats = ColumnStats()
+
+        if self.name not in data.columns:
+            stats.missing = True
+            return stats
+
+        series = data[self.name]
+        stats.n_rows = len(series)
+
+        if self.dtype is not None and not DTYPE_CHECKS[self.dtype](series.dtype):
+            stats.dtypes.add(str(series.dtype))
+            return stats
+
+        encoded = self._encode(series) if self.dtype == 'str' else None
+        nulls = encoded[0] == -1 if encoded is not None else series.isna().to_numpy()
+        stats.n_nulls = int(nulls.sum())
+
+        if self.counts_values:
+            if encoded is None:
+                stats.counts.update(series.value_counts(dropna=True).to_dict())
+            else:
+                codes, categories = encoded
+                counts = numpy.bincount(codes[~nulls], minlength=len(categories))
+                stats.counts.update({categories[i]: int(counts[i]) for i in numpy.flatnonzero(counts)})
+
+        if self.has_range:
+            values = self._values(series)[~nulls]
+            if len(values):
+                stats.minimum, stats.maximum = float(values.min()), float(values.max())
+                stats.n_out_of_range = int(self._range_mask(values).sum())
+
+        return stats
+
+    def validate_stats(self, stats: 'ColumnStats') -> list[dict[str, Any]]:
+        """
+        Validate the column from the statistics merged across all its chunks, same report as `validate`
+
+        Params:
+            - stats (ColumnStats): The merged statistics
+
+        Return:
+            - list[dict]: A report line per failed check, empty if the column is valid
+        """
+        if stats.missing:
+            return [_failure(self.name, 'column_in_dataframe', 1, [])]
+
+        if stats.dtypes:
+            return [_failure(self.name, f'dtype({self.dtype})', stats.n_rows, sorted(stats.dtypes))]
+
+        failures = []
+
+        if not self.nullable and stats.n_nulls:
+            failures.append(_failure(self.name, 'not_nullable', stats.n_nulls, [None]))
+
+        if stats.n_out_of_range:
+            failure_cases = [value for value in [stats.minimum, stats.maximum]
+                             if self._range_mask(numpy.array([value]))[0]]
+            failures.append(_failure(self.name, self.range_check, stats.n_out_of_range, failure_cases))
+
+        return failures + self._counts_failures(stats.counts)
+
+    def _counts_failures(self, counts: collections.Counter[Any]) -> list[dict[str, Any]]:
+        """Failures of the checks on the set of values, from the count of every value"""
+        failures = []
+
+        for check, values, expected in [(self.notin_check, self.notin, False), (self.isin_check, self.isin, True)]:
+            if check is None or values is None:
+                continue
+            allowed = set(values.tolist())
+            failure_cases = [value for value in counts if (value in allowed) != expected]
+            if failure_cases:
+                failures.append(_failure(self.name, check, sum(counts[value] for value in failure_cases),
+                                         failure_cases))
+
+        if self.unique_values is not None and self.unique_check is not None and set(counts) != self.unique_values:
+            failures.append(_failure(self.name, self.unique_check, 1,
+                                     sorted(set(counts) ^ self.unique_values, key=str)))
+
+        return failures
+
+
+class ColumnStats:
+    """
+    Statistics of a column that can be merged chunk by chunk: the count of every value for the checks on the set of
+    values, the minimum and maximum for the range checks and the number of nulls
+    """
+
+    def __init__(self) -> None:
+        self.missing = False
+        self.dtypes: set[str] = set()
+        self.n_rows = 0
+        self.n_nulls = 0
+        self.n_out_of_range = 0
+        self.minimum = numpy.inf
+        self.maximum = -numpy.inf
+        self.counts: collections.Counter[Any] = collections.Counter()
+
+    def merge(self, other: 'ColumnStats') -> 'ColumnStats':
+        """Add the statistics of another chunk"""
+        self.missing |= other.missing
+        self.dtypes |= other.dtypes
+        self.n_rows += other.n_rows
+        self.n_nulls += other.n_nulls
+        self.n_out_of_range += other.n_out_of_range
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.counts.update(other.counts)
+        return self
+
+
+def _failure(column: str, check: str, n_failures: int, failure_cases: Sequence[Any]) -> dict[str, Any]:
+    return {'column': column,
+            'check': check,
+            'n_failures': n_failures,
+            'failure_cases': list(failure_cases[:N_FAILURE_CASES])}
+
+
+def _report(failures: list[dict[str, Any]]) -> pandas.DataFrame:
+    return pandas.DataFrame(failures, columns=['column', 'check', 'n_failures', 'failure_cases'])
+
+
+class CompiledSchema:
+    """
+    Validation engine compiled once from the rules of every column
+
+    Params:
+        - rules (dict): Rules per column, see `FEATURE_RULES`
+    """
+
+    def __init__(self, rules: dict[str, dict[str, Any]]):
+        self.validators = [ColumnValidator(name, column_rules) for name, column_rules in rules.items()]
+
+    def validate(self, data: pandas.DataFrame, fail_fast: bool = True) -> pandas.DataFrame:
+        """
+        Validate the features
+
+        Params:
+            - data (pandas.DataFrame): The features
+            - fail_fast (bool): Stop at the first column failing its checks
+
+        Return:
+            - pandas.DataFrame: Report with a row per failed check, empty if the features are valid
+        """
+        failures = [_failure('<dataframe>', 'Feature Group column naming requirements', 1, [col])
+                    for col in data.columns if not COLUMN_NAME.fullmatch(str(col))]
+
+        for validator in self.validators:
+            if failures and fail_fast:
+                break
+            failures.extend(validator.validate(data))
+
+        return _report(failures)
+
+
+SCHEMA = CompiledSchema(FEATURE_RULES)
+
+
+class ValidationStats:
+    """
+    Streaming validation: the chunks are summarized one by one into `ColumnStats` merged incrementally, so the
+    whole input is validated exactly while only one chunk is kept in memory
+
+    Params:
+        - schema (CompiledSchema): The compiled rules
+    """
+
+    def __init__(self, schema: CompiledSchema = SCHEMA):
+        self.schema = schema
+        self.columns: dict[str, ColumnStats] = {validator.name: ColumnStats() for validator in schema.validators}
+        self.invalid_names: set[str] = set()
+        self.n_rows = 0
+
+    def update(self, data: pandas.DataFrame) -> 'ValidationStats':
+        """Add a chunk of the features"""
+        self.n_rows += len(data)
+        self.invalid_names.update(str(col) for col in data.columns if not COLUMN_NAME.fullmatch(str(col)))
+
+        for validator in self.schema.validators:
+            self.columns[validator.name].merge(validator.summarize(data))
+
+        return self
+
+    def merge(self, other: 'ValidationStats') -> 'ValidationStats':
+        """Add the statistics of other chunks, e.g. summarized in another process"""
+        self.n_rows += other.n_rows
+        self.invalid_names |= other.invalid_names
+
+        for name, stats in other.columns.items():
+            self.columns[name].merge(stats)
+
+        return self
+
+    def report(self, fail_fast: bool = True) -> pandas.DataFrame:
+        """
+        Validate the features from the merged statistics
+
+        Params:
+            - fail_fast (bool): Stop at the first column failing its checks
+
+        Return:
+            - pandas.DataFrame: Report with a row per failed check, same as `CompiledSchema.validate`
+        """
+        failures = [_failure('<dataframe>', 'Feature Group column naming requirements', 1, [col])
+                    for col in sorted(self.invalid_names)]
+
+        for validator in self.schema.validators:
+            if failures and fail_fast:
+                break
+            failures.extend(validator.validate_stats(self.columns[validator.name]))
+
+        return _report(failures)
+
+
+def sample_size(confidence: float = DEFAULT_CONFIDENCE, tolerance: float = DEFAULT_TOLERANCE) -> int:
+    """
+    Get the number of rows to sample so that, if at least a fraction `tolerance` of the rows is invalid, at least one
+    invalid row is sampled with probability `confidence`: 1 - (1 - tolerance) ** n >= confidence
+
+    Params:
+        - confidence (float): Probability of detecting the invalid rows, in (0, 1)
+        - tolerance (float): Fraction of invalid rows that must be detected, in (0, 1)
+
+    Return:
+        - int: The sample size
+    """
+    if not 0 < confidence < 1 or not 0 < tolerance < 1:
+        raise ValueError(f'Confidence {confidence} and tolerance {tolerance} must be in (0, 1)')
+
+    return math.ceil(math.log1p(-confidence) / math.log1p(-tolerance))
+
+
+def stratified_sample(data: pandas.DataFrame,
+                      n_rows: int,
+                      strata: Sequence[str] = (),
+                      seed: int | None = None) -> pandas.DataFrame:
+    """
+    Uniform sample completed with a row of every combination of values of the `strata` columns missing from it.
+    Every value of the strata columns appears in the sample, so the checks on their set of values, like
+    `unique_values_eq`, are exact on it.
+
+    Params:
+        - data (pandas.DataFrame): The features
+        - n_rows (int): Number of rows of the uniform sample, a few more when there are rare combinations
+        - strata (Sequence[str]): Columns to stratify by, a uniform sample when empty
+        - seed (int): Seed of the random generator
+
+    Return:
+        - pandas.DataFrame: The sample, in the order of the data
+    """
+    if n_rows >= len(data):
+        return data
+
+    rng = numpy.random.default_rng(seed)
+    rows = rng.choice(len(data), size=n_rows, replace=False)
+
+    strata = [col for col in strata if col in data.columns]
+    if strata:
+        # Code of the combination of values of every row, nulls are a value of their own
+        encoded = [pandas.factorize(data[col], use_na_sentinel=False) for col in strata]
+        shape = [len(uniques) for _, uniques in encoded]
+        codes = numpy.ravel_multi_index([codes for codes, _ in encoded], shape)
+
+        n_codes = math.prod(shape)
+        missing = numpy.flatnonzero((numpy.bincount(codes, minlength=n_codes) > 0) &
+                                    (numpy.bincount(codes[rows], minlength=n_codes) == 0))
+        rows = numpy.concatenate([rows] + [[rng.choice(numpy.flatnonzero(codes == code))] for code in missing])
+
+    return data.iloc[numpy.sort(rows)]
+
+
+def reservoir_sample(chunks: Iterable[pandas.DataFrame], n_rows: int, seed: int | None = None) -> pandas.DataFrame:
+    """
+    Uniform sample of a stream of chunks in a single pass, keeping at most `n_rows` rows plus a chunk in memory. Every
+    row gets a random key and the rows with the smallest keys are kept.
+
+    Params:
+        - chunks (Iterable[pandas.DataFrame]): The chunks of the features
+        - n_rows (int): Number of rows of the sample
+        - seed (int): Seed of the random generator
+
+    Return:
+        - pandas.DataFrame: The sample
+    """
+    rng = numpy.random.default_rng(seed)
+    sample, keys = None, numpy.empty(0)
+
+    for chunk in chunks:
+        sample = chunk if sample is None else pandas.concat([sample, chunk])
+        keys = numpy.concatenate([keys, rng.random(len(chunk))])
+
+        if len(sample) > n_rows:
+            kept = numpy.sort(numpy.argpartition(keys, n_rows)[:n_rows])
+            sample, keys = sample.iloc[kept], keys[kept]
+
+    if sample is None:
+        raise Exception('Input Dataframe is empty.')
+
+    return sample
+
+
+def sampled_validate(data: pandas.DataFrame,
+                     confidence: float = DEFAULT_CONFIDENCE,
+                     tolerance: float = DEFAULT_TOLERANCE,
+                     fail_fast: bool = True) -> pandas.DataFrame:
     """
+    Validate a sample stratified by the columns with `unique_values_eq` checks. The whole data is only validated
+    when the sample finds a problem, so the report never contains false alarms.
 
-    schema = pandera.DataFrameSchema(
+    Params:
+        - data (pandas.DataFrame): The features
+        - confidence (float): Probability of detecting a fraction `tolerance` of invalid rows
+        - tolerance (float): Fraction of invalid rows that must be detected
+        - fail_fast (bool): Stop at the first column failing its checks in the full validation
+
+    Return:
+        - pandas.DataFrame: Report with a row per failed check, empty if the sample is valid
+    """
+    strata = [validator.name for validator in SCHEMA.validators if validator.unique_values is not None]
+    sample = stratified_sample(data, n_rows=sample_size(confidence, tolerance), strata=strata)
+
+    if SCHEMA.validate(sample, fail_fast=True).empty:
+        print(f"Validated a sample of {len(sample)} rows out of {len(data)}")
+        return _report([])
+
+    print(f"The sample of {len(sample)} rows failed, validating all the rows")
+    return SCHEMA.validate(data, fail_fast=fail_fast)
+
+
+@functools.lru_cache(maxsize=None)
+def pandera_schema() -> pandera.DataFrameSchema:
+    """Reference pandera schema with the same rules as `SCHEMA`, built once"""
+    dtypes = {'int': 'int64', 'float': 'float64', 'str': None}
+    checks = {
+        'unique_values_eq': Check.unique_values_eq,
+        'isin': Check.isin,
+        'notin': Check.notin,
+        'in_range': lambda bounds: Check.in_range(*bounds),
+        'less_than': Check.less_than,
+        'greater_than_or_equal_to': Check.greater_than_or_equal_to,
+    }
+
+    return pandera.DataFrameSchema(
         # Checks per column
-        columns={
-            # Values defined in the list must appear in the column `survived`
-            "survived": Column("int64", [
-                Check.unique_values_eq([0, 1])
-            ]),
-            # Values defined in the list must appear in the column `sex`
-            "sex": Column("str", [
-                Check.unique_values_eq(["male", "female"])
-            ]),
-            # Values must be 1, 2 or 3 and column must be of int type
-            "pclass": Column("int64", [
-                Check.in_range(0, 3)
-            ]),
-            # age_group column could have the values in the list
-            "age_group": Column(dtype="str",
-                                checks=[
-                                    Check.isin(['baby', 'child', 'teenager', 'young adult', 'adult',
-                                                'mature adult', 'senior'
-                                                ])],
-                                nullable=True),
-            # sibsp column could have the values in range(0,8) but not equals to 6 or 7
-            "sibsp": Column("int64", [
-                Check.notin([6, 7]),
-                Check.in_range(0, 8)
-            ]),
-            # alone column could have the values in the list
-            "alone": Column("str", [
-                Check.isin(["yes", "no"])
-            ]),
-            # parch column must be int within the range(0,6)
-            "parch": Column("int64", [
-                Check.in_range(0, 6)
-            ]),
-            # fare must be in range(0.0, 60000.0)
-            "fare": Column("float64", [
-                Check.less_than(60000.0),
-                Check.greater_than_or_equal_to(0.0)
-            ]),
-            # embarked
-            "embarked": Column(dtype="str",
-                               checks=[Check.isin(['S', 'C', 'Q'])],
-                               nullable=True
-                               ),
-            #
-            "hours_traveling": Column(dtype="float64",
-                                      checks=[Check.in_range(80.0, 110.0)],
-                                      nullable=True
-                                      )
-
-        },
+        columns={name: Column(dtypes[rules['dtype']],
+                              [checks[check](value) for check, value in rules.items() if check in checks],
+                              nullable=rules.get('nullable', False))
+                 for name, rules in FEATURE_RULES.items()},
         # Global checks for the entire dataframe
         checks=[Check(
-            lambda dataframe: all('.' not in c and ' ' not in c and len(c) <= 62 for c in dataframe.columns),
+            lambda dataframe: all(COLUMN_NAME.fullmatch(str(c)) for c in dataframe.columns),
             name='Feature Group column naming requirements',
             error='Column name does not fit feature group naming requirements'
         )]
     )
 
+
+def add_validation_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """Add the arguments of the features validation to the steps parser"""
+    parser.add_argument("--validation-mode",
+                        dest="validation_mode",
+                        type=str,
+                        choices=["fail-fast", "collect", "sampled"],
+                        default="fail-fast",
+                        help="Stop at the first failure, report all the failures or validate a sample first")
+
+    parser.add_argument("--validation-confidence",
+                        dest="validation_confidence",
+                        type=float,
+                        default=DEFAULT_CONFIDENCE,
+                        help="Sampled mode: probability of detecting a fraction --validation-tolerance of invalid rows")
+
+    parser.add_argument("--validation-tolerance",
+                        dest="validation_tolerance",
+                        type=float,
+                        default=DEFAULT_TOLERANCE,
+                        help="Sampled mode: smallest fraction of invalid rows to detect")
+
+    return parser
+
+
+@data_args
+def validate_features(data: pandas.DataFrame, args: argparse.Namespace | None = None) -> pandas.DataFrame:
+    """"
+    Method to validate the features
+    """
+    mode = getattr(args, 'validation_mode', 'fail-fast')
+
     # Executing feature validation
-    schema(dataframe=data)
+    if mode == 'sampled':
+        report = sampled_validate(data,
+                                  confidence=getattr(args, 'validation_confidence', DEFAULT_CONFIDENCE),
+                                  tolerance=getattr(args, 'validation_tolerance', DEFAULT_TOLERANCE))
+    else:
+        report = SCHEMA.validate(data, fail_fast=mode == 'fail-fast')
+
+    if not report.empty:
+        raise FeatureValidationError(report)
+
     return data
 
 
+def validate_file(args: argparse.Namespace) -> None:
+    """
+    Validate the input file chunk by chunk of `--chunk-size` rows, without loading it in memory
+
+    Params:
+        - args (argparse.Namespace): Step arguments
+    """
+    def chunks() -> Iterable[pandas.DataFrame]:
+        yield from iter_data(path=f"{args.data_path}/{args.input_file}",
+                             file_format=getattr(args, 'file_format', None),
+                             columns=getattr(args, 'columns', None),
+                             chunk_size=args.chunk_size)
+
+    mode = getattr(args, 'validation_mode', 'fail-fast')
+
+    if mode == 'sampled':
+        n_rows = sample_size(getattr(args, 'validation_confidence', DEFAULT_CONFIDENCE),
+                             getattr(args, 'validation_tolerance', DEFAULT_TOLERANCE))
+        if SCHEMA.validate(reservoir_sample(chunks(), n_rows=n_rows), fail_fast=True).empty:
+            print(f"Validated a sample of {n_rows} rows")
+            return
+        print(f"The sample of {n_rows} rows failed, validating all the rows")
+
+    stats = ValidationStats()
+    for chunk in chunks():
+        stats.update(chunk)
+
+    report = stats.report(fail_fast=mode == 'fail-fast')
+
+    if not report.empty:
+        raise FeatureValidationError(report)
+
+    print(f"Validated {stats.n_rows} rows")
+
+
 if __name__ == '__main__':
     # If you want to run it locally in your IDE, create the folder bin and use the following parameters:
     #   --data-path="../bin" --step-name="Features Validation" --input-file="processed_features.csv"
-    args = parse_args()
-    validate_features(args=args)
+    args = add_validation_args(parse_args(return_parser=True)).parse_known_args()[0]
+    print(f"Received arguments:\n{args}.\n")
+    if args.chunk_size:
+        validate_file(args=args)
+    else:
+        validate_features(args=args)
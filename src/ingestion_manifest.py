@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Ingestion Manifest
+==================
+
+Local SQLite manifest with a content hash per record already ingested into a Feature Group, keyed by the record
+identifier. It allows an incremental ingestion: only the records inserted or modified since the last run are sent to
+the Feature Group, and the records that disappeared from the input are reported.
+"""
+import sqlite3
+
+from typing import Sequence
+
+import numpy
+import pandas
+
+from numpy.typing import NDArray
+
+
+def record_hashes(data: pandas.DataFrame, exclude: Sequence[str] = ()) -> pandas.Series:
+    """
+    Hash the content of every record
+
+    Params:
+        - data (pandas.DataFrame): The records
+        - exclude (Sequence[str]): Columns not part of the content, like the event time
+
+    Return:
+        - pandas.Series: A signed 64 bits hash per record, with the same index as the data
+    """
+    columns = sorted(col for col in data.columns if col not in exclude)
+    hashes = pandas.util.hash_pandas_object(data[columns], index=False)
+    # SQLite integers are signed
+    return hashes.astype(numpy.uint64).view(numpy.int64)
+
+
+class IngestionManifest:
+    """
+    Manifest of the records ingested into a Feature Group
+
+    Params:
+        - path (str): Path of the SQLite database, created if it doesn't exist
+    """
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS records '
+                                    '(record_id TEXT PRIMARY KEY, content_hash INTEGER NOT NULL)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT)')
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> 'IngestionManifest':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _columns(self) -> str | None:
+        row = self.connection.execute("SELECT value FROM metadata WHERE key = 'columns'").fetchone()
+        return None if row is None else row[0]
+
+    def changes(self,
+                record_ids: pandas.Series,
+                hashes: pandas.Series,
+                columns: Sequence[str]) -> tuple[NDArray[numpy.bool_], list[str]]:
+        """
+        Compare the records with the ones of the last ingestion
+
+        Params:
+            - record_ids (pandas.Series): Identifier of every record
+            - hashes (pandas.Series): Content hash of every record, see `record_hashes`
+            - columns (Sequence[str]): Columns of the records. If they changed all the records are modified
+
+        Return:
+            - numpy.ndarray: Boolean mask of the records inserted or modified
+            - list[str]: Identifiers of the records deleted
+        """
+        stored = pandas.read_sql('SELECT record_id, content_hash FROM records', self.connection,
+                                 index_col='record_id')['content_hash']
+
+        ids = record_ids.astype(str).to_numpy()
+
+        if stored.empty or self._columns() != ','.join(sorted(columns)):
+            changed = numpy.ones(len(ids), dtype=bool)
+        else:
+            # Positions instead of a reindex, the missing values would cast the hashes to float
+            positions = stored.index.get_indexer(ids)
+            previous = stored.to_numpy()[positions]
+            changed = (positions < 0) | (previous != hashes.to_numpy())
+
+        deleted = stored.index[~stored.index.isin(ids)].tolist()
+
+        return changed, deleted
+
+    def record(self,
+               record_ids: pandas.Series,
+               hashes: pandas.Series,
+               columns: Sequence[str],
+               deleted: Sequence[str] = ()) -> None:
+        """
+        Store the records ingested, once the ingestion succeeded
+
+        Params:
+            - record_ids (pandas.Series): Identifier of every record ingested
+            - hashes (pandas.Series): Content hash of every record ingested
+            - columns (Sequence[str]): Columns of the records
+            - deleted (Sequence[str]): Identifiers of the records deleted from the input
+        """
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO records (record_id, content_hash) VALUES (?, ?)',
+                                        zip(record_ids.astype(str).tolist(), hashes.astype(int).tolist()))
+            self.connection.executemany('DELETE FROM records WHERE record_id = ?', ((id_,) for id_ in deleted))
+            self.connection.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('columns', ?)",
+                                    (','.join(sorted(columns)),))
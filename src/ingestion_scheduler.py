@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Ingestion Scheduler
+===================
+
+Sizing of the processes and threads used to ingest records into a Feature Group.
+
+Every PutRecord call spends most of its time waiting for the network, so a process needs several threads to keep its
+CPU busy: as many as the ratio between the wall time and the CPU time of a record (Little's law). The number of
+processes is bounded by the CPUs available to the container, not the CPUs of the host.
+
+The scheduler starts from the latency measured on a small probe batch, then ingests the data in balanced rounds and
+adapts the number of threads to the observed throughput: it keeps increasing it while the throughput improves and
+backs off when it drops, e.g. because of throttling.
+"""
+import math
+
+from typing import Iterator
+
+import numpy
+import pandas
+
+from parallel import available_cpus
+
+PROBE_ROWS = 100
+MIN_ROWS_PER_PROCESS = 2_000
+MIN_ROWS_PER_WORKER = 50
+MAX_WORKERS_PER_PROCESS = 64
+N_ROUNDS = 8
+
+
+def plan_concurrency(n_rows: int,
+                     record_latency: float,
+                     record_cpu_time: float,
+                     n_cpus: int | None = None,
+                     max_workers: int | None = None,
+                     max_processes: int | None = None) -> tuple[int, int]:
+    """
+    Get the number of processes and threads per process to ingest a number of rows
+
+    Params:
+        - n_rows (int): Number of rows to ingest
+        - record_latency (float): Wall time in seconds to ingest a record on a single thread
+        - record_cpu_time (float): CPU time in seconds to ingest a record
+        - n_cpus (int): CPUs available, see `parallel.available_cpus`
+        - max_workers (int): Maximum number of threads per process
+        - max_processes (int): Maximum number of processes
+
+    Return:
+        - tuple[int, int]: The number of processes and the number of threads per process, at least 1
+    """
+    n_cpus = n_cpus or available_cpus()
+
+    n_processes = min(n_cpus, max(1, n_rows // MIN_ROWS_PER_PROCESS))
+    if max_processes:
+        n_processes = min(n_processes, max_processes)
+
+    # Threads needed to keep a CPU busy while the records are waiting for the network
+    n_workers = math.ceil(record_latency / max(record_cpu_time, 1e-6))
+    n_workers = min(n_workers, MAX_WORKERS_PER_PROCESS, max(1, n_rows // (n_processes * MIN_ROWS_PER_WORKER)))
+    if max_workers:
+        n_workers = min(n_workers, max_workers)
+
+    return n_processes, max(1, n_workers)
+
+
+def balanced_batches(data: pandas.DataFrame, n_batches: int) -> list[pandas.DataFrame]:
+    """Split the data in `n_batches` contiguous batches whose sizes differ at most by one row"""
+    n_batches = max(1, min(n_batches, len(data)))
+    bounds = numpy.linspace(0, len(data), n_batches + 1, dtype=int)
+    return [data.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+class IngestionScheduler:
+    """
+    Adaptive sizing of the ingestion concurrency
+
+    Params:
+        - n_rows (int): Number of rows to ingest
+        - max_workers (int): Maximum number of threads per process, overrides the adaptive sizing
+        - max_processes (int): Maximum number of processes, overrides the adaptive sizing
+        - n_cpus (int): CPUs available, see `parallel.available_cpus`
+    """
+
+    def __init__(self,
+                 n_rows: int,
+                 max_workers: int | None = None,
+                 max_processes: int | None = None,
+                 n_cpus: int | None = None):
+        self.n_rows = n_rows
+        self.max_workers = max_workers
+        self.max_processes = max_processes
+        self.n_cpus = n_cpus or available_cpus()
+        self.n_processes = 1
+        self.n_workers = 1
+        self._last_throughput = 0.0
+        self._step = 1
+
+    def calibrate(self, n_rows: int, wall_time: float, cpu_time: float) -> tuple[int, int]:
+        """
+        Size the concurrency from the ingestion of a probe batch on a single thread
+
+        Params:
+            - n_rows (int): Rows of the probe batch
+            - wall_time (float): Wall time spent ingesting the probe batch
+            - cpu_time (float): CPU time spent ingesting the probe batch
+
+        Return:
+            - tuple[int, int]: The number of processes and threads per process
+        """
+        self.n_processes, self.n_workers = plan_concurrency(n_rows=self.n_rows,
+                                                            record_latency=wall_time / max(1, n_rows),
+                                                            record_cpu_time=cpu_time / max(1, n_rows),
+                                                            n_cpus=self.n_cpus,
+                                                            max_workers=self.max_workers,
+                                                            max_processes=self.max_processes)
+        self._step = max(1, self.n_workers // 4)
+        return self.n_processes, self.n_workers
+
+    def observe(self, n_rows: int, wall_time: float) -> tuple[int, int]:
+        """
+        Adapt the number of threads per process to the throughput of the last round
+
+        Params:
+            - n_rows (int): Rows ingested in the round
+            - wall_time (float): Wall time spent in the round
+
+        Return:
+            - tuple[int, int]: The number of processes and threads per process for the next round
+        """
+        throughput = n_rows / max(wall_time, 1e-9)
+        limit = min(filter(None, [self.max_workers, MAX_WORKERS_PER_PROCESS]))
+
+        if throughput >= self._last_throughput:
+            # Additive increase while the concurrency pays off
+            self.n_workers = min(limit, self.n_workers + self._step)
+        else:
+            # Multiplicative decrease when the throughput drops, e.g. throttling
+            self.n_workers = max(1, self.n_workers // 2)
+
+        self._last_throughput = throughput
+
+        return self.n_processes, self.n_workers
+
+    def rounds(self, data: pandas.DataFrame) -> Iterator[pandas.DataFrame]:
+        """Split the data in `N_ROUNDS` balanced rounds, the concurrency can be adapted between them"""
+        if data.empty:
+            return
+
+        n_rounds = min(N_ROUNDS, max(1, len(data) // (self.n_processes * self.n_workers * MIN_ROWS_PER_WORKER)))
+        yield from balanced_batches(data, n_rounds)
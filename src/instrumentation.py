@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Instrumentation
+===============
+
+Metrics of the execution of the pipeline steps, collected by `data_args`:
+
+- the wall time of every phase of a step: read, transform, compact, write and summary. Nested phases are exclusive,
+  e.g. the read and transform of the chunks pulled by the writer of a streamed step are not counted as write time
+- the resident memory of the process at the start of the step and its peak during the step. On Linux the peak of the
+  process is reset at the start of every step. Elsewhere the peak is the one of the whole process, so it is only
+  reported when the step raised it
+- the peak of the memory allocated by Python during the step with `--trace-memory`, which slows the step down
+
+The metrics of every step are appended to `--metrics-file`: a JSON line per step, or a Prometheus textfile when the
+file extension is `.prom`, for the node exporter textfile collector.
+
+A step can also be profiled with `--profile cprofile` or `--profile pyinstrument` (if installed), the profile is
+written to `--profile-dir`.
+"""
+import argparse
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import resource
+import sys
+import tracemalloc
+
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Iterable, Iterator, TypeVar
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+PHASES = ['read', 'transform', 'compact', 'write', 'summary']
+
+# Number of functions printed from the cProfile stats
+N_PROFILE_LINES = 25
+
+T = TypeVar('T')
+
+
+def add_instrumentation_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """Add the instrumentation arguments to the steps parser"""
+    parser.add_argument("--metrics-file",
+                        dest="metrics_file",
+                        type=str,
+                        default=None,
+                        help="File to append the metrics of every step to, JSON lines or a Prometheus textfile (.prom)")
+
+    parser.add_argument("--profile",
+                        dest="profile",
+                        type=str,
+                        choices=["cprofile", "pyinstrument"],
+                        default=None,
+                        help="Profile the steps with cProfile or pyinstrument")
+
+    parser.add_argument("--profile-dir",
+                        dest="profile_dir",
+                        type=str,
+                        default=None,
+                        help="Directory to write the profiles to, --data-path when not given")
+
+    parser.add_argument("--trace-memory",
+                        dest="trace_memory",
+                        action="store_true",
+                        help="Trace the peak memory allocated by Python in every step, slows the steps down")
+
+    return parser
+
+
+def current_rss() -> int | None:
+    """Resident memory of the process in bytes, None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def reset_peak_rss() -> bool:
+    """Reset the peak resident memory of the process to its current value, False where it can't be reset"""
+    try:
+        # Linux 4.0+: writing 5 to clear_refs resets VmHWM, read by `peak_rss`
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss() -> int:
+    """Peak resident memory of the process in bytes since it started or since the last `reset_peak_rss`"""
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _mb(n_bytes: int | None) -> float | None:
+    return None if n_bytes is None else round(n_bytes / 2 ** 20, 1)
+
+
+class StepMetrics:
+    """
+    Metrics of the execution of a step, used as a context manager around the whole step
+
+    Params:
+        - step_name (str): Name of the step
+        - trace_memory (bool): Trace the peak memory allocated by Python with tracemalloc
+    """
+
+    def __init__(self, step_name: str = 'generic', trace_memory: bool = False):
+        self.step_name = step_name
+        self.trace_memory = trace_memory
+        self.phases = {phase: 0.0 for phase in PHASES}
+        self.n_rows = 0
+        self.seconds = 0.0
+        self.rss_start: int | None = None
+        self.rss_peak: int | None = None
+        self.traced_peak: int | None = None
+        self._stack: list[tuple[str, float, list[float]]] = []
+        self._starting_time = 0.0
+        self._started_tracing = False
+        self._peak_reset = False
+        self._peak_baseline = 0
+
+    def __enter__(self) -> 'StepMetrics':
+        self.rss_start = current_rss()
+        self._peak_reset = reset_peak_rss()
+        self._peak_baseline = peak_rss()
+        if self.trace_memory:
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self._starting_time = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.seconds = perf_counter() - self._starting_time
+        peak = peak_rss()
+        # Without a reset, a peak not above the one at the start of the step is the peak of a previous step
+        self.rss_peak = peak if self._peak_reset or peak > self._peak_baseline else None
+        if self.trace_memory:
+            self.traced_peak = tracemalloc.get_traced_memory()[1]
+            if self._started_tracing:
+                tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a phase of the step, the time of the phases nested in it is not counted"""
+        # (name, starting time, [time of the nested phases])
+        frame = (name, perf_counter(), [0.0])
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = perf_counter() - frame[1]
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed - frame[2][0]
+            if self._stack:
+                self._stack[-1][2][0] += elapsed
+
+    def timed(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Iterate counting the time spent getting every item as the phase `name`, e.g. reading chunks"""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def as_dict(self) -> dict[str, Any]:
+        metrics: dict[str, Any] = {'date': datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S"),
+                                   'step': self.step_name,
+                                   'rows': self.n_rows,
+                                   'seconds': round(self.seconds, 4),
+                                   'phases': {phase: round(seconds, 4) for phase, seconds in self.phases.items()},
+                                   'rss_start_mb': _mb(self.rss_start),
+                                   'rss_peak_mb': _mb(self.rss_peak)}
+
+        if self.traced_peak is not None:
+            metrics['traced_peak_mb'] = _mb(self.traced_peak)
+
+        return metrics
+
+
+def _prometheus_lines(metrics: dict[str, Any]) -> list[str]:
+    step = metrics['step'].replace('\\', '\\\\').replace('"', '\\"')
+    lines = [f'pipeline_step_seconds{{step="{step}"}} {metrics["seconds"]}',
+             f'pipeline_step_rows{{step="{step}"}} {metrics["rows"]}']
+    lines += [f'pipeline_step_phase_seconds{{step="{step}",phase="{phase}"}} {seconds}'
+              for phase, seconds in metrics['phases'].items()]
+    for key in ['rss_start_mb', 'rss_peak_mb', 'traced_peak_mb']:
+        if metrics.get(key) is not None:
+            lines.append(f'pipeline_step_{key}{{step="{step}"}} {metrics[key]}')
+    return lines
+
+
+def write_metrics(metrics: dict[str, Any], path: str) -> None:
+    """
+    Write the metrics of a step
+
+    Params:
+        - metrics (dict): The metrics, see `StepMetrics.as_dict`
+        - path (str): JSON lines file the metrics are appended to, or Prometheus textfile (.prom) where the metrics
+            of the step replace its previous ones
+    """
+    if not path.endswith('.prom'):
+        with open(path, 'a') as file:
+            file.write(json.dumps(metrics) + '\n')
+        return
+
+    step_label = re.compile(r'step="{}"'.format(re.escape(metrics['step'].replace('"', '\\"'))))
+    lines = []
+    if os.path.exists(path):
+        with open(path) as file:
+            lines = [line.rstrip('\n') for line in file if line.strip() and not step_label.search(line)]
+
+    # Written to a temporary file and renamed, the collector never reads a partial file
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as file:
+        file.write('\n'.join(lines + _prometheus_lines(metrics)) + '\n')
+    os.replace(tmp_path, path)
+
+
+def _profile_path(args: argparse.Namespace, extension: str) -> str:
+    directory = getattr(args, 'profile_dir', None) or args.data_path or '.'
+    os.makedirs(directory, exist_ok=True)
+    name = re.sub(r'\W+', '_', args.step_name).strip('_').lower()
+    return os.path.join(directory, f'{name}.{extension}')
+
+
+@contextlib.contextmanager
+def profiled(args: argparse.Namespace) -> Iterator[None]:
+    """Profile the code run in the context with the profiler of `--profile`, if any"""
+    profiler = getattr(args, 'profile', None)
+
+    if profiler == 'pyinstrument' and pyinstrument is None:
+        print("pyinstrument is not installed, profiling with cProfile.")
+        profiler = 'cprofile'
+
+    if profiler is None:
+        yield
+        return
+
+    if profiler == 'pyinstrument':
+        profile = pyinstrument.Profiler()
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            with open(_profile_path(args, 'html'), 'w') as file:
+                file.write(profile.output_html())
+        return
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(_profile_path(args, 'prof'))
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(N_PROFILE_LINES)
+        print(stream.getvalue())
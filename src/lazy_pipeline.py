@@ -0,0 +1,633 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Lazy Pipeline
+=============
+
+Lazy mode of the wrangle -> process_features -> validate_features chain: the steps are recorded in a `LazyFrame`
+instead of being run one after the other over the whole dataset, and compiled into a single plan when collected.
+Every column of the `LazyFrame` is an expression of the columns of the input file, e.g. `hours_traveling` is the
+mapping of `Embarked`, so the plan is optimised as a whole:
+
+- projection pushdown: only the input columns used by the output columns and the filters are read, `Cabin`, `Ticket`
+  and `Name` are never read and `Age` is read to compute `age_group` but never materialised
+- predicate pushdown: the filters on the input columns are given to the Parquet and Feather readers, which skip the
+  rows, and the others are evaluated before the output columns, which are only computed for the rows kept
+- common subexpression elimination: the expressions are compared by structure and every distinct one is computed
+  once per batch, e.g. a feature used by a filter and by the output
+- the batches of the input are read and computed by a pool of threads, and validated with `ValidationStats`, merged
+  across the batches
+
+The eager pandas steps remain the reference implementation, the lazy plan gives the same dataset.
+
+    python lazy_pipeline.py --data-path="../bin" --input-file="titanic.parquet" --output-file="features.parquet" \\
+        --where "pclass == 1" --where "embarked in S,C" --explain
+"""
+import argparse
+import collections
+import operator
+import re
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterator, Sequence
+
+import numpy
+import pandas
+import pyarrow
+import pyarrow.compute
+import pyarrow.dataset
+
+from numpy.typing import NDArray
+from data_io import DEFAULT_CHUNK_SIZE, INDEX_COL, SCHEMA_READERS, TEXT_FORMATS, iter_data, resolve_format
+from data_wrangling import DROP_COLUMNS, NULL_TOKENS
+from feature_processing import PLAN
+from feature_registry import FeaturePlan, Spec
+from feature_validation import SCHEMA, CompiledSchema, FeatureValidationError, ValidationStats, add_validation_args
+from parallel import available_cpus
+from utils import parse_args, write_output
+
+COMPARISONS: dict[str, Callable[[Any, Any], Any]] = {
+    '==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge
+}
+
+# Formats read with a pyarrow dataset, which pushes the filters down into the reader
+DATASET_FORMATS = {'parquet': 'parquet', 'feather': 'ipc'}
+
+# Key of an expression and values of the expressions evaluated on a batch, by key
+Key = tuple[Any, ...]
+Cache = dict[Key, Any]
+Mask = NDArray[numpy.bool_]
+
+
+class Expr:
+    """
+    Expression of the columns of the input file. Expressions with the same `key` compute the same values, they are
+    evaluated once per batch, see `evaluate`
+    """
+    key: Key
+    columns: frozenset[str]
+
+    def evaluate(self, frame: pandas.DataFrame, cache: Cache) -> Any:
+        """Values of the expression for the rows of a batch, kept in the cache by key"""
+        if self.key not in cache:
+            cache[self.key] = self._evaluate(frame, cache)
+        return cache[self.key]
+
+    def _evaluate(self, frame: pandas.DataFrame, cache: Cache) -> Any:
+        raise NotImplementedError
+
+    def to_arrow(self) -> pyarrow.compute.Expression | None:
+        """
+        Filter of the pyarrow readers keeping at least the rows the expression keeps, None if it can't be pushed down.
+        The null tokens are only parsed after reading, the filter is evaluated again on the rows read
+        """
+        return None
+
+    def __eq__(self, other: Any) -> 'Expr':  # type: ignore[override]
+        return Compare('==', self, _expr(other))
+
+    def __ne__(self, other: Any) -> 'Expr':  # type: ignore[override]
+        return Compare('!=', self, _expr(other))
+
+    def __lt__(self, other: Any) -> 'Expr':
+        return Compare('<', self, _expr(other))
+
+    def __le__(self, other: Any) -> 'Expr':
+        return Compare('<=', self, _expr(other))
+
+    def __gt__(self, other: Any) -> 'Expr':
+        return Compare('>', self, _expr(other))
+
+    def __ge__(self, other: Any) -> 'Expr':
+        return Compare('>=', self, _expr(other))
+
+    def __and__(self, other: 'Expr') -> 'Expr':
+        return Logical('&', self, other)
+
+    def __or__(self, other: 'Expr') -> 'Expr':
+        return Logical('|', self, other)
+
+    def __invert__(self) -> 'Expr':
+        return Not(self)
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def isin(self, values: Sequence[Any]) -> 'Expr':
+        return IsIn(self, values)
+
+    def is_null(self) -> 'Expr':
+        return IsNull(self)
+
+
+def _expr(value: Any) -> Expr:
+    return value if isinstance(value, Expr) else Lit(value)
+
+
+def _series(values: Any, index: pandas.Index) -> pandas.Series:
+    return values if isinstance(values, pandas.Series) else pandas.Series(values, index=index)
+
+
+class Col(Expr):
+    """Column of the input file"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.key = ('col', name)
+        self.columns = frozenset([name])
+
+    def _evaluate(self, frame: pandas.DataFrame, cache: Cache) -> pandas.Series:
+        return frame[self.name]
+
+    def to_arrow(self) -> pyarrow.compute.Expression:
+        return pyarrow.compute.field(self.name)
+
+    def __repr__(self) -> str:
+        return f'col({self.name})'
+
+
+class Lit(Expr):
+    """Literal value"""
+
+    def __init__(self, value: Any):
+        self.value = value
+        self.key = ('lit', repr(value))
+        self.columns = frozenset[str]()
+
+    def _evaluate(self, frame: pandas.DataFrame, cache: Cache) -> Any:
+        return self.value
+
+    def to_arrow(self) -> Any:
+        return self.value
+
+    def __repr__(self) -> str:
+        return repr(self.value)
+
+
+class Compare(Expr):
+    """Comparison of two expressions, false when any of them is null"""
+
+    def __init__(self, op: str, left: Expr, right: Expr):
+        self.op, self.left, self.right = op, left, right
+        self.key = ('compare', op, left.key, right.key)
+        self.columns = left.columns | right.columns
+
+    def _evaluate(self, frame: pandas.DataFrame, cache: Cache) -> Mask:
+        left, right = self.left.evaluate(frame, cache), self.right.evaluate(frame, cache)
+        result: Mask = numpy.asarray(COMPARISONS[self.op](left, right), dtype=bool)
+        for values in [left, right]:
+            if isinstance(values, pandas.Series):
+                result &= values.notna().to_numpy()
+        return result
+
+    def to_arrow(self) -> pyarrow.compute.Expression | None:
+        left, right = self.left.to_arrow(), self.right.to_arrow()
+        if left is None or right is None:
+            return None
+        result = COMPARISONS[self.op](left, right)
+        return result if isinstance(result, pyarrow.compute.Expression) else None
+
+    def __repr__(self) -> str:
+        return f'({self.left!r} {self.op} {self.right!r})'
+
+
+class Logical(Expr):
+    """Conjunction or disjunction of two boolean expressions"""
+
+    def __init__(self, op: str, left: Expr, right: Expr):
+        self.op, self.left, self.right = op, left, right
+        self.key = ('logical', op, left.key, right.key)
+        self.columns = left.columns | right.columns
+
+    def _evaluate(self, frame: pandas.DataFrame, cache: Cache) -> Mask:
+        function = operator.and_ if self.op == '&' else operator.or_
+        result: Mask = function(self.left.evaluate(frame, cache), self.right.evaluate(frame, cache))
+        return result
+
+    def to_arrow(self) -> pyarrow.compute.Expression | None:
+        left, right = self.left.to_arrow(), self.right.to_arrow()
+        if self.op == '&':
+            # A conjunction is pushed down if any of its terms is, the filter only needs to keep more rows
+            return left if right is None else right if left is None else left & right
+        return None if left is None or right is None else left | right
+
+    def __repr__(self) -> str:
+        return f'({self.left!r} {self.op} {self.right!r})'
+
+
+class Not(Expr):
+    """Negation of a boolean expression, never pushed down: the null tokens of the file would be negated too"""
+
+    def __init__(self, expr: Expr):
+        self.expr = expr
+        self.key = ('not', expr.key)
+        self.columns = expr.columns
+
+    def _evaluate(self, frame: pandas.DataFrame, cache: Cache) -> Mask:
+        result: Mask = ~self.expr.evaluate(frame, cache)
+        return result
+
+    def __repr__(self) -> str:
+        return f'~{self.expr!r}'
+
+
+class IsIn(Expr):
+    """Whether the values of an expression are in a set of values"""
+
+    def __init__(self, expr: Expr, values: Sequence[Any]):
+        self.expr = expr
+        self.values = list(values)
+        self.key = ('isin', expr.key, tuple(sorted(map(repr, self.values))))
+        self.columns = expr.columns
+
+    def _evaluate(self, frame: pandas.DataFrame, cache: Cache) -> Mask:
+        result: Mask = _series(self.expr.evaluate(frame, cache), frame.index).isin(self.values).to_numpy()
+        return result
+
+    def to_arrow(self) -> pyarrow.compute.Expression | None:
+        expr = self.expr.to_arrow()
+        return None if expr is None else expr.isin(self.values)
+
+    def __repr__(self) -> str:
+        return f'{self.expr!r}.isin({self.values})'
+
+
+class IsNull(Expr):
+    """Whether the values of an expression are null, never pushed down: the null tokens are parsed after reading"""
+
+    def __init__(self, expr: Expr):
+        self.expr = expr
+        self.key = ('is_null', expr.key)
+        self.columns = expr.columns
+
+    def _evaluate(self, frame: pandas.DataFrame, cache: Cache) -> Mask:
+        result: Mask = _series(self.expr.evaluate(frame, cache), frame.index).isna().to_numpy()
+        return result
+
+    def __repr__(self) -> str:
+        return f'{self.expr!r}.is_null()'
+
+
+class Feature(Expr):
+    """Feature of the registry computed from the expressions of its inputs, see `feature_registry.Spec`"""
+
+    def __init__(self, name: str, spec: Spec, inputs: dict[str, Expr]):
+        self.name, self.spec, self.inputs = name, spec, inputs
+        self.key = ('feature', id(spec), tuple(expr.key for expr in inputs.values()))
+        self.columns = frozenset[str]().union(*(expr.columns for expr in inputs.values()))
+
+    def _evaluate(self, frame: pandas.DataFrame, cache: Cache) -> pandas.Series:
+        columns = {col: _series(expr.evaluate(frame, cache), frame.index) for col, expr in self.inputs.items()}
+        return _series(self.spec.compute(columns), frame.index)
+
+    def __repr__(self) -> str:
+        return f'{type(self.spec).__name__.lower()}({", ".join(map(repr, self.inputs.values()))})'
+
+
+class LazyFrame:
+    """
+    Dataset whose columns are expressions of the columns of an input file, computed when collected. Every method
+    returns a new `LazyFrame`
+
+    Params:
+        - path (str): Path of the input file, indexed by `PassengerId`
+        - file_format (str): Format of the file, inferred from the extension when not given
+        - columns (dict): Expression of every column
+        - filters (list[Expr]): The rows kept are the ones where all the filters are true
+        - na_values (Sequence[str]): Tokens of the string columns parsed as nulls
+        - schema (CompiledSchema): Rules the collected dataset is validated with, not validated when not given
+    """
+
+    def __init__(self,
+                 path: str,
+                 file_format: str | None = None,
+                 columns: dict[str, Expr] | None = None,
+                 filters: Sequence[Expr] = (),
+                 na_values: Sequence[str] = (),
+                 schema: CompiledSchema | None = None):
+        self.path = path
+        self.file_format = resolve_format(path, file_format)
+        if columns is None:
+            if self.file_format not in SCHEMA_READERS:
+                raise ValueError(f'The columns of the format {self.file_format} can not be read lazily')
+            columns = {col: Col(col) for col in SCHEMA_READERS[self.file_format](path) if col != INDEX_COL}
+        self.columns = dict(columns)
+        self.filters = list(filters)
+        self.na_values = list(na_values)
+        self.schema = schema
+
+    @classmethod
+    def scan(cls, path: str, file_format: str | None = None) -> 'LazyFrame':
+        """All the columns of an input file"""
+        return cls(path, file_format=file_format)
+
+    def _replace(self, **changes: Any) -> 'LazyFrame':
+        state = dict(path=self.path, file_format=self.file_format, columns=self.columns, filters=self.filters,
+                     na_values=self.na_values, schema=self.schema)
+        state.update(changes)
+        return LazyFrame(**state)
+
+    def __getitem__(self, name: str) -> Expr:
+        if name not in self.columns:
+            raise KeyError(f'Column {name} is not in the lazy frame: {list(self.columns)}')
+        return self.columns[name]
+
+    def rename(self, function: Callable[[str], str]) -> 'LazyFrame':
+        return self._replace(columns={function(name): expr for name, expr in self.columns.items()})
+
+    def drop(self, columns: Sequence[str]) -> 'LazyFrame':
+        """Drop the columns, the ones not in the frame are ignored"""
+        return self._replace(columns={name: expr for name, expr in self.columns.items() if name not in columns})
+
+    def null_tokens(self, tokens: Sequence[str]) -> 'LazyFrame':
+        """Parse the tokens of the string columns as nulls, when reading"""
+        return self._replace(na_values=list(dict.fromkeys([*self.na_values, *tokens])))
+
+    def with_columns(self, columns: dict[str, Expr]) -> 'LazyFrame':
+        """Add or replace columns, the existing ones keep their position"""
+        return self._replace(columns={**self.columns, **columns})
+
+    def with_features(self, plan: FeaturePlan) -> 'LazyFrame':
+        """Add the features of a plan, as `FeaturePlan.transform` does"""
+        features: dict[str, Expr] = {name: Feature(name, spec, {col: self[col] for col in spec.inputs})
+                                     for name, spec in plan.specs.items()}
+        return self.with_columns(features).drop(plan.drop)
+
+    def filter(self, predicate: Expr) -> 'LazyFrame':
+        """Keep the rows where the predicate is true, the predicate is made of the expressions of the frame"""
+        return self._replace(filters=[*self.filters, predicate])
+
+    def validate(self, schema: CompiledSchema = SCHEMA) -> 'LazyFrame':
+        return self._replace(schema=schema)
+
+    def optimize(self) -> 'PhysicalPlan':
+        """Compile the frame into the plan executed by `collect`"""
+        return PhysicalPlan(self)
+
+    def explain(self) -> str:
+        """Description of the optimised plan"""
+        return self.optimize().explain()
+
+    def collect(self,
+                workers: int | None = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE,
+                fail_fast: bool = True) -> pandas.DataFrame:
+        """
+        Compute the dataset
+
+        Params:
+            - workers (int): Number of threads computing the batches, the available CPUs when not given
+            - chunk_size (int): Maximum number of rows of a batch
+            - fail_fast (bool): Report only the first column failing the validation
+
+        Return:
+            - pandas.DataFrame: The dataset, indexed by `PassengerId`
+        """
+        return self.optimize().execute(workers=workers, chunk_size=chunk_size, fail_fast=fail_fast)
+
+
+def _conjuncts(expr: Expr) -> list[Expr]:
+    if isinstance(expr, Logical) and expr.op == '&':
+        return _conjuncts(expr.left) + _conjuncts(expr.right)
+    return [expr]
+
+
+def _subexpressions(expr: Expr) -> Iterator[Expr]:
+    yield expr
+    for child in [getattr(expr, attribute, None) for attribute in ['left', 'right', 'expr']]:
+        if child is not None:
+            yield from _subexpressions(child)
+    if isinstance(expr, Feature):
+        for child in expr.inputs.values():
+            yield from _subexpressions(child)
+
+
+class PhysicalPlan:
+    """
+    Optimised plan of a `LazyFrame`
+
+    Params:
+        - frame (LazyFrame): The frame
+    """
+
+    def __init__(self, frame: LazyFrame):
+        self.frame = frame
+        filters = [conjunct for predicate in frame.filters for conjunct in _conjuncts(predicate)]
+        # Every filter once, `Expr.__eq__` builds a comparison so the filters are compared by key
+        self.filters = list({predicate.key: predicate for predicate in filters}.values())
+
+        # Projection: the columns of the file used by the output and the filters
+        used = frozenset[str]().union(*(expr.columns for expr in [*frame.columns.values(), *self.filters]))
+        self.read_columns = [col for col in SCHEMA_READERS[frame.file_format](frame.path) if col in used]
+
+        # Predicates: the filters the pyarrow readers can apply, all of them are evaluated again after reading
+        self.pushed = None
+        if frame.file_format in DATASET_FORMATS:
+            for predicate in self.filters:
+                pushed = predicate.to_arrow()
+                if pushed is not None:
+                    self.pushed = pushed if self.pushed is None else self.pushed & pushed
+
+        counts = collections.Counter(sub.key for expr in [*self.filters, *frame.columns.values()]
+                                     for sub in _subexpressions(expr) if not isinstance(sub, Lit))
+        self.shared = sorted(key for key, count in counts.items() if count > 1 and key[0] != 'col')
+
+    def explain(self) -> str:
+        lines = [f'SCAN {self.frame.path} [{self.frame.file_format}] columns={self.read_columns}']
+        if self.pushed is not None:
+            lines.append(f'  PUSHED FILTER {self.pushed}')
+        if self.frame.na_values:
+            lines.append(f'  NULL TOKENS {self.frame.na_values}')
+        lines.extend(f'FILTER {predicate!r}' for predicate in self.filters)
+        lines.append('PROJECT ' + ', '.join(f'{name}={expr!r}' for name, expr in self.frame.columns.items()))
+        lines.append(f'SHARED SUBEXPRESSIONS {len(self.shared)}')
+        if self.frame.schema is not None:
+            lines.append('VALIDATE')
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _to_pandas(table: pyarrow.Table) -> pandas.DataFrame:
+        data = table.to_pandas()
+        return data.set_index(INDEX_COL) if INDEX_COL in data.columns else data
+
+    def batches(self, chunk_size: int) -> Iterator[pandas.DataFrame]:
+        """The batches of the columns read, with the pushed filter applied"""
+        frame = self.frame
+
+        if frame.file_format in DATASET_FORMATS:
+            dataset = pyarrow.dataset.dataset(frame.path, format=DATASET_FORMATS[frame.file_format])
+            columns = [col for col in [INDEX_COL, *self.read_columns] if col in dataset.schema.names]
+            scanner = dataset.scanner(columns=columns, filter=self.pushed, batch_size=chunk_size)
+            n_batches = 0
+            for batch in scanner.to_batches():
+                n_batches += 1
+                yield self._to_pandas(pyarrow.Table.from_batches([batch]))
+            if not n_batches:
+                # All the rows are filtered, the columns of the empty dataset are still computed
+                yield self._to_pandas(scanner.projected_schema.empty_table())
+        else:
+            options = {'na_values': frame.na_values} if frame.na_values and frame.file_format in TEXT_FORMATS else {}
+            yield from iter_data(frame.path, file_format=frame.file_format, columns=self.read_columns,
+                                 chunk_size=chunk_size, **options)
+
+    def compute(self, batch: pandas.DataFrame) -> tuple[pandas.DataFrame, ValidationStats | None]:
+        """The output columns of the rows of a batch kept by the filters, with their validation statistics"""
+        # Null tokens, as `wrangle` parses them. A column of a batch with only nulls keeps its type, the whole column
+        # doesn't have only nulls
+        if self.frame.na_values:
+            for col in batch.columns[(batch.dtypes == object) | (batch.dtypes == 'string')]:
+                nulls = batch[col].isin(self.frame.na_values + [None])
+                if nulls.any():
+                    batch[col] = batch[col].mask(nulls) if nulls.all() else batch[col].mask(nulls).infer_objects()
+
+        cache: Cache = {}
+        if self.filters:
+            keep = numpy.logical_and.reduce([predicate.evaluate(batch, cache) for predicate in self.filters])
+            if not keep.all():
+                # The values already computed are kept for the rows kept, the filters are not needed anymore
+                batch = batch[keep]
+                cache = {key: values[keep] for key, values in cache.items()
+                         if isinstance(values, (pandas.Series, numpy.ndarray)) and len(values) == len(keep)}
+
+        result = pandas.DataFrame({name: _series(expr.evaluate(batch, cache), batch.index)
+                                   for name, expr in self.frame.columns.items()}, index=batch.index)
+        schema = self.frame.schema
+        return result, None if schema is None else ValidationStats(schema).update(result)
+
+    def execute(self,
+                workers: int | None = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE,
+                fail_fast: bool = True) -> pandas.DataFrame:
+        """Compute and validate the batches on a pool of threads, see `LazyFrame.collect`"""
+        workers = workers or available_cpus()
+
+        results = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # At most two batches per thread are read ahead
+            pending: collections.deque[Future[tuple[pandas.DataFrame, ValidationStats | None]]] = collections.deque()
+            for batch in self.batches(chunk_size):
+                pending.append(executor.submit(self.compute, batch))
+                if len(pending) >= 2 * workers:
+                    results.append(pending.popleft().result())
+            results.extend(future.result() for future in pending)
+
+        if self.frame.schema is not None:
+            stats = ValidationStats(self.frame.schema)
+            for _, batch_stats in results:
+                stats.merge(batch_stats)
+            report = stats.report(fail_fast=fail_fast)
+            if not report.empty:
+                raise FeatureValidationError(report)
+
+        return pandas.concat([data for data, _ in results])
+
+
+def feature_pipeline(path: str,
+                     file_format: str | None = None,
+                     where: Sequence[Expr | str] = (),
+                     validate: bool = True) -> LazyFrame:
+    """
+    The wrangle -> process_features -> validate_features chain as a `LazyFrame`
+
+    Params:
+        - path (str): Path of the raw dataset
+        - file_format (str): Format of the file, inferred from the extension when not given
+        - where (Sequence): Filters of the processed features, expressions or strings, see `parse_predicate`
+        - validate (bool): Validate the features with `feature_validation.SCHEMA`
+
+    Return:
+        - LazyFrame: The processed features
+    """
+    frame = (LazyFrame.scan(path, file_format=file_format)
+             .rename(lambda col: col.lower().strip())
+             .drop(DROP_COLUMNS)
+             .null_tokens(NULL_TOKENS)
+             .with_features(PLAN))
+
+    for predicate in where:
+        frame = frame.filter(parse_predicate(predicate, frame) if isinstance(predicate, str) else predicate)
+
+    return frame.validate(SCHEMA) if validate else frame
+
+
+PREDICATE = re.compile(r'^\s*(\w+)\s*(==|!=|<=|>=|<|>|\s+in\s+)\s*(.+?)\s*$')
+
+
+def _literal(value: str) -> Any:
+    value = value.strip().strip('\'"')
+    for parse in [int, float]:
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_predicate(predicate: str, frame: LazyFrame) -> Expr:
+    """
+    Predicate of the columns of a frame from a string `<column> <op> <value>`, with op one of ==, !=, <, <=, >, >=
+    or `in` followed by comma separated values, e.g. "pclass == 1" or "embarked in S,C"
+    """
+    match = PREDICATE.match(predicate)
+    if match is None:
+        raise ValueError(f'Invalid predicate "{predicate}", expected "<column> <op> <value>"')
+
+    column, op, value = match.group(1), match.group(2).strip(), match.group(3)
+    if op == 'in':
+        return frame[column].isin([_literal(item) for item in value.split(',')])
+    return Compare(op, frame[column], Lit(_literal(value)))
+
+
+def add_lazy_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """Add the arguments of the lazy pipeline to the steps parser"""
+    parser.add_argument("--where",
+                        dest="where",
+                        action="append",
+                        default=[],
+                        help="Filter of the processed features, e.g. \"pclass == 1\", can be repeated")
+
+    parser.add_argument("--explain",
+                        dest="explain",
+                        action="store_true",
+                        help="Print the optimised plan")
+
+    return parser
+
+
+def run_lazy(args: argparse.Namespace) -> pandas.DataFrame:
+    """
+    Run the wrangle -> process_features -> validate_features chain lazily
+
+    Params:
+        - args (argparse.Namespace): Pipeline arguments, with `--where`, `--workers` and `--chunk-size`
+
+    Return:
+        - pandas.DataFrame: The validated features
+    """
+    mode = getattr(args, 'validation_mode', 'fail-fast')
+    frame = feature_pipeline(f"{args.data_path}/{args.input_file}",
+                             file_format=getattr(args, 'file_format', None),
+                             where=getattr(args, 'where', None) or ())
+
+    if getattr(args, 'explain', False):
+        print(frame.explain())
+
+    return frame.collect(workers=getattr(args, 'workers', None),
+                         chunk_size=getattr(args, 'chunk_size', None) or DEFAULT_CHUNK_SIZE,
+                         fail_fast=mode != 'collect')
+
+
+if __name__ == '__main__':
+    # If you want to run it locally in your IDE, create the folder bin and use the following parameters:
+    #   --data-path="../bin" --step-name="Lazy Pipeline" --input-file="titanic.csv" --output-file="features.parquet"
+    args = add_lazy_args(add_validation_args(parse_args(return_parser=True))).parse_known_args()[0]
+    print(f"Received arguments:\n{args}.\n")
+
+    data = run_lazy(args)
+    if args.output_file is not None:
+        write_output(data=data, args=args)
@@ -0,0 +1,481 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Local Feature Store
+===================
+
+Local stand-in of the SageMaker Feature Store, to measure the ingestion throughput and tune its concurrency without
+spending real capacity:
+
+- `LocalFeatureStore`: the feature groups and their online records, in memory or in a SQLite database, with a
+  configurable latency per call and throttling above a number of calls per second
+- `FeatureStoreServer`: localhost HTTP server with DescribeFeatureGroup and CreateFeatureGroup of the SageMaker API
+  and PutRecord, GetRecord and DeleteRecord of the feature store runtime API. The boto3 clients, and so
+  `FeatureGroup.ingest` and `async_ingest`, work against it given its endpoint, see `--endpoint-url` of the ingestion
+- `load_test`: runs the `ingest` step against a local server and reports the records per second and the latency
+  percentiles of the PutRecord calls
+
+    python local_feature_store.py --data-path="../bin" --input-file="processed_features.parquet" \\
+        --featuregroup-name="titanic" --latency-ms=20 --max-rps=2000 --ingest-mode=async --concurrency=128
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep, time
+from typing import Any, Sequence
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy
+import pandas
+
+from feature_group_ingestion import add_ingestion_args, ingest
+from utils import parse_args, read_input
+
+Record = list[dict[str, str]]
+
+DEFAULT_REGION = 'eu-west-1'
+LATENCY_PERCENTILES = [50, 95, 99]
+
+
+class StoreError(Exception):
+    """Error of the local feature store, with the `response` of a botocore ClientError"""
+
+    def __init__(self, code: str, message: str, status: int = 400):
+        super().__init__(f'{code}: {message}')
+        self.code = code
+        self.status = status
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing `rate` calls per second on average and bursts of `burst` calls
+
+    Params:
+        - rate (float): Calls per second
+        - burst (int): Maximum calls at once, one second of calls when not given
+    """
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = perf_counter()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        """Take a token, False when there is none left"""
+        with self.lock:
+            now = perf_counter()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class MemoryBackend:
+    """Online records kept in a dict"""
+
+    def __init__(self):
+        self.records: dict[tuple[str, str], tuple[str, Record]] = {}
+        self.lock = threading.Lock()
+
+    def put(self, feature_group: str, record_id: str, event_time: str, record: Record) -> None:
+        with self.lock:
+            stored = self.records.get((feature_group, record_id))
+            if stored is None or event_time >= stored[0]:
+                self.records[(feature_group, record_id)] = (event_time, record)
+
+    def get(self, feature_group: str, record_id: str) -> Record | None:
+        stored = self.records.get((feature_group, record_id))
+        return None if stored is None else stored[1]
+
+    def delete(self, feature_group: str, record_id: str) -> None:
+        with self.lock:
+            self.records.pop((feature_group, record_id), None)
+
+    def count(self, feature_group: str) -> int:
+        return sum(1 for name, _ in list(self.records) if name == feature_group)
+
+
+class SQLiteBackend:
+    """
+    Online records stored in a SQLite database, shared by the threads of the server
+
+    Params:
+        - path (str): Path of the database, created if it doesn't exist
+    """
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS records (feature_group TEXT, record_id TEXT, '
+                                    'event_time TEXT, record TEXT, PRIMARY KEY (feature_group, record_id))')
+
+    def put(self, feature_group: str, record_id: str, event_time: str, record: Record) -> None:
+        with self.lock, self.connection:
+            self.connection.execute('INSERT INTO records VALUES (?, ?, ?, ?) '
+                                    'ON CONFLICT (feature_group, record_id) DO UPDATE SET '
+                                    'event_time = excluded.event_time, record = excluded.record '
+                                    'WHERE excluded.event_time >= records.event_time',
+                                    (feature_group, record_id, event_time, json.dumps(record)))
+
+    def get(self, feature_group: str, record_id: str) -> Record | None:
+        with self.lock:
+            row = self.connection.execute('SELECT record FROM records WHERE feature_group = ? AND record_id = ?',
+                                          (feature_group, record_id)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def delete(self, feature_group: str, record_id: str) -> None:
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM records WHERE feature_group = ? AND record_id = ?',
+                                    (feature_group, record_id))
+
+    def count(self, feature_group: str) -> int:
+        with self.lock:
+            return int(self.connection.execute('SELECT COUNT(*) FROM records WHERE feature_group = ?',
+                                               (feature_group,)).fetchone()[0])
+
+
+def feature_definitions(data: pandas.DataFrame) -> list[dict[str, str]]:
+    """Feature definitions of the columns of a dataset, as inferred by `FeatureGroup.load_feature_definitions`"""
+    def feature_type(dtype: Any) -> str:
+        if pandas.api.types.is_integer_dtype(dtype):
+            return 'Integral'
+        if pandas.api.types.is_float_dtype(dtype):
+            return 'Fractional'
+        return 'String'
+
+    return [{'FeatureName': col, 'FeatureType': feature_type(dtype)} for col, dtype in data.dtypes.items()]
+
+
+class LocalFeatureStore:
+    """
+    Feature groups and their online records. The methods have the names and arguments of the boto3 `sagemaker` and
+    `sagemaker-featurestore-runtime` clients, and raise a `StoreError` where the clients raise a ClientError.
+
+    Params:
+        - backend: `MemoryBackend` or `SQLiteBackend`, in memory when not given
+        - latency (float): Seconds every call waits before being served
+        - jitter (float): Maximum random seconds added to the latency
+        - max_rps (float): Calls per second above which the calls are throttled, unlimited when not given
+    """
+
+    def __init__(self,
+                 backend: MemoryBackend | SQLiteBackend | None = None,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 max_rps: float | None = None):
+        self.backend = backend or MemoryBackend()
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = None if max_rps is None else TokenBucket(max_rps)
+        self.feature_groups: dict[str, dict[str, Any]] = {}
+        # Seconds spent serving every PutRecord call, appended by the server threads
+        self.put_latencies: list[float] = []
+        self.n_throttled = 0
+
+    def _call(self) -> None:
+        if self.throttle is not None and not self.throttle.acquire():
+            self.n_throttled += 1
+            raise StoreError('ThrottlingException', 'Rate exceeded')
+        if self.latency or self.jitter:
+            sleep(self.latency + random.uniform(0, self.jitter))
+
+    def _feature_group(self, name: str) -> dict[str, Any]:
+        if name not in self.feature_groups:
+            raise StoreError('ResourceNotFound', f'Resource Not Found: FeatureGroup {name} does not exist.', 404)
+        return self.feature_groups[name]
+
+    def create_feature_group(self,
+                             FeatureGroupName: str,
+                             RecordIdentifierFeatureName: str,
+                             EventTimeFeatureName: str,
+                             FeatureDefinitions: Sequence[dict[str, str]],
+                             **config: Any) -> dict[str, Any]:
+        if FeatureGroupName in self.feature_groups:
+            raise StoreError('ResourceInUse', f'FeatureGroup {FeatureGroupName} already exists')
+
+        names = {definition['FeatureName'] for definition in FeatureDefinitions}
+        for feature in [RecordIdentifierFeatureName, EventTimeFeatureName]:
+            if feature not in names:
+                raise StoreError('ValidationException', f'Feature {feature} is not in the feature definitions')
+
+        arn = f'arn:aws:sagemaker:{DEFAULT_REGION}:000000000000:feature-group/{FeatureGroupName.lower()}'
+        self.feature_groups[FeatureGroupName] = {
+            'FeatureGroupArn': arn,
+            'FeatureGroupName': FeatureGroupName,
+            'RecordIdentifierFeatureName': RecordIdentifierFeatureName,
+            'EventTimeFeatureName': EventTimeFeatureName,
+            'FeatureDefinitions': list(FeatureDefinitions),
+            'CreationTime': time(),
+            'OnlineStoreConfig': config.get('OnlineStoreConfig', {'EnableOnlineStore': True}),
+            'FeatureGroupStatus': 'Created',
+        }
+        return {'FeatureGroupArn': arn}
+
+    def describe_feature_group(self, FeatureGroupName: str, **_: Any) -> dict[str, Any]:
+        self._call()
+        return self._feature_group(FeatureGroupName)
+
+    def put_record(self, FeatureGroupName: str, Record: Record, **_: Any) -> dict[str, Any]:
+        starting_time = perf_counter()
+        try:
+            self._call()
+            description = self._feature_group(FeatureGroupName)
+            values = {feature['FeatureName']: feature['ValueAsString'] for feature in Record}
+
+            for feature in [description['RecordIdentifierFeatureName'], description['EventTimeFeatureName']]:
+                if feature not in values:
+                    raise StoreError('ValidationError', f'Record is missing the feature {feature}')
+
+            self.backend.put(FeatureGroupName, values[description['RecordIdentifierFeatureName']],
+                             values[description['EventTimeFeatureName']], Record)
+            return {}
+        finally:
+            self.put_latencies.append(perf_counter() - starting_time)
+
+    def get_record(self,
+                   FeatureGroupName: str,
+                   RecordIdentifierValueAsString: str,
+                   FeatureNames: Sequence[str] | None = None,
+                   **_: Any) -> dict[str, Any]:
+        self._call()
+        self._feature_group(FeatureGroupName)
+
+        record = self.backend.get(FeatureGroupName, RecordIdentifierValueAsString)
+        if record is None:
+            return {}
+        if FeatureNames:
+            record = [feature for feature in record if feature['FeatureName'] in FeatureNames]
+        return {'Record': record}
+
+    def delete_record(self, FeatureGroupName: str, RecordIdentifierValueAsString: str, **_: Any) -> dict[str, Any]:
+        self._call()
+        self._feature_group(FeatureGroupName)
+        self.backend.delete(FeatureGroupName, RecordIdentifierValueAsString)
+        return {}
+
+    def count(self, feature_group_name: str) -> int:
+        """Number of records stored in a feature group"""
+        return self.backend.count(feature_group_name)
+
+    def latency_report(self) -> dict[str, float]:
+        """Calls, throttled calls and percentiles in milliseconds of the time spent serving the PutRecord calls"""
+        latencies = numpy.array(self.put_latencies) * 1000
+        report: dict[str, float] = {'put_calls': len(latencies), 'throttled': self.n_throttled}
+        if len(latencies):
+            report.update({f'p{q}_ms': round(float(value), 2)
+                           for q, value in zip(LATENCY_PERCENTILES, numpy.percentile(latencies, LATENCY_PERCENTILES))})
+            report['max_ms'] = round(float(latencies.max()), 2)
+        return report
+
+
+# Operations of the SageMaker API, a JSON 1.1 protocol selected by the X-Amz-Target header
+CONTROL_OPERATIONS = {'SageMaker.DescribeFeatureGroup': 'describe_feature_group',
+                      'SageMaker.CreateFeatureGroup': 'create_feature_group'}
+
+
+class _StoreServer(ThreadingHTTPServer):
+    """HTTP server holding the feature store its handlers serve"""
+
+    def __init__(self, address: tuple[str, int], store: LocalFeatureStore):
+        super().__init__(address, _Handler)
+        self.daemon_threads = True
+        self.store = store
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _StoreServer
+
+    # Keep-alive connections, the clients reuse them between calls
+    protocol_version = 'HTTP/1.1'
+    # The response is written in a single send, without waiting for the delayed ACK of the headers
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    @property
+    def store(self) -> LocalFeatureStore:
+        return self.server.store
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, status: int, body: dict[str, Any], headers: dict[str, str] | None = None) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self) -> dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        body: dict[str, Any] = json.loads(self.rfile.read(length)) if length else {}
+        return body
+
+    def _runtime(self, operation: str) -> None:
+        """Feature store runtime operations, a REST JSON protocol on /FeatureGroup/{FeatureGroupName}"""
+        url = urlparse(self.path)
+        body = self._body()
+        if not url.path.startswith('/FeatureGroup/'):
+            self._send(404, {'message': f'Unknown path {url.path}'}, {'x-amzn-ErrorType': 'UnknownOperation'})
+            return
+
+        query = parse_qs(url.query)
+        kwargs: dict[str, Any] = {'FeatureGroupName': unquote(url.path[len('/FeatureGroup/'):])}
+        kwargs.update({name: values[0] for name, values in query.items() if name != 'FeatureName'})
+        if 'FeatureName' in query:
+            kwargs['FeatureNames'] = query['FeatureName']
+
+        try:
+            self._send(200, getattr(self.store, operation)(**kwargs, **body))
+        except StoreError as exc:
+            self._send(exc.status, {'message': str(exc)}, {'x-amzn-ErrorType': exc.code})
+
+    def do_PUT(self) -> None:
+        self._runtime('put_record')
+
+    def do_GET(self) -> None:
+        self._runtime('get_record')
+
+    def do_DELETE(self) -> None:
+        self._runtime('delete_record')
+
+    def do_POST(self) -> None:
+        operation = CONTROL_OPERATIONS.get(self.headers.get('X-Amz-Target', ''))
+        body = self._body()
+        if operation is None:
+            self._send(400, {'__type': 'UnknownOperationException', 'message': self.headers.get('X-Amz-Target')})
+            return
+
+        try:
+            self._send(200, getattr(self.store, operation)(**body))
+        except StoreError as exc:
+            self._send(exc.status, {'__type': exc.code, 'message': str(exc)})
+
+
+class FeatureStoreServer:
+    """
+    HTTP server of a local feature store, run on a background thread while used as a context manager
+
+    Params:
+        - store (LocalFeatureStore): The feature store served
+        - host (str): Address to listen on
+        - port (int): Port to listen on, any free port when 0
+    """
+
+    def __init__(self, store: LocalFeatureStore, host: str = '127.0.0.1', port: int = 0):
+        self.server = _StoreServer((host, port), store)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint_url(self) -> str:
+        host, port = self.server.socket.getsockname()[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self) -> 'FeatureStoreServer':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def add_local_store_args(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    """Add the arguments of the local feature store to the ingestion parser"""
+    parser.add_argument("--latency-ms",
+                        dest="latency_ms",
+                        type=float,
+                        default=0.0,
+                        help="Milliseconds every call to the local feature store waits")
+
+    parser.add_argument("--jitter-ms",
+                        dest="jitter_ms",
+                        type=float,
+                        default=0.0,
+                        help="Maximum random milliseconds added to the latency")
+
+    parser.add_argument("--max-rps",
+                        dest="max_rps",
+                        type=float,
+                        default=None,
+                        help="Calls per second above which the local feature store throttles the calls")
+
+    parser.add_argument("--store-db",
+                        dest="store_db",
+                        type=str,
+                        default=None,
+                        help="SQLite database of the local feature store records, kept in memory when not given")
+
+    return parser
+
+
+def load_test(args: argparse.Namespace) -> dict[str, float]:
+    """
+    Ingest the input file into a feature group of a local feature store served on localhost
+
+    Params:
+        - args (argparse.Namespace): Ingestion arguments, see `add_ingestion_args` and `add_local_store_args`
+
+    Return:
+        - dict: The records ingested and per second, and the latencies of the PutRecord calls
+    """
+    data = read_input(args)
+    record_identifier_name, event_time_feature_name = data.index.name or 'PassengerId', 'EventTime'
+
+    store = LocalFeatureStore(backend=None if args.store_db is None else SQLiteBackend(args.store_db),
+                              latency=args.latency_ms / 1000,
+                              jitter=args.jitter_ms / 1000,
+                              max_rps=args.max_rps)
+    definitions = feature_definitions(data.reset_index())
+    store.create_feature_group(FeatureGroupName=args.fg_name,
+                               RecordIdentifierFeatureName=record_identifier_name,
+                               EventTimeFeatureName=event_time_feature_name,
+                               FeatureDefinitions=definitions + [{'FeatureName': event_time_feature_name,
+                                                                  'FeatureType': 'String'}])
+
+    # The local store doesn't check the signature of the calls, but the clients need credentials to sign them
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+
+    with FeatureStoreServer(store) as server:
+        args.endpoint_url = server.endpoint_url
+        starting_time = perf_counter()
+        ingest(args=args, data=data)
+        seconds = perf_counter() - starting_time
+
+    n_records = store.count(args.fg_name)
+    return {'records': n_records,
+            'seconds': round(seconds, 3),
+            'records_per_second': round(n_records / seconds, 1),
+            **store.latency_report()}
+
+
+if __name__ == '__main__':
+    # If you want to run it locally in your IDE, create the folder bin and use the following parameters:
+    #   --data-path="../bin" --step-name="Load Test" --input-file="processed_features.parquet"
+    #   --featuregroup-name="titanic" --latency-ms=20 --max-rps=2000
+    parser = add_local_store_args(add_ingestion_args(parse_args(return_parser=True)))
+    args, _ = parser.parse_known_args()
+    args.region = args.region or DEFAULT_REGION
+    print(f"Received arguments:\n{args}.\n")
+
+    print(f"Load test: {json.dumps(load_test(args), indent=4)}")
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Offline Store
+=============
+
+Bulk ingestion of a pandas.DataFrame directly into the offline store of a Feature Group, for backfills, instead of a
+PutRecord call per record. The records are written as Parquet files in the layout of the offline store:
+
+    <offline store uri>/year=YYYY/month=MM/day=DD/hour=HH/<write time>_<random id>.parquet
+
+partitioned by the UTC event time of every record, with the `write_time`, `api_invocation_time` and `is_deleted`
+columns the Feature Store adds to every record. The files of every partition are limited to `rows_per_file` rows and
+written in parallel by a pool of threads, pyarrow releases the GIL while encoding and writing them.
+
+The offline store uri is a local directory or any uri supported by `pyarrow.fs`, e.g. `s3://bucket/prefix` if pyarrow
+is built with S3 support. For a Feature Group it is the `ResolvedOutputS3Uri` of its offline store configuration.
+The records are not added to the online store.
+"""
+import os
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any
+
+import numpy
+import pandas
+import pyarrow
+import pyarrow.fs
+import pyarrow.parquet
+
+from numpy.typing import NDArray
+from parallel import available_cpus
+
+ROWS_PER_FILE = 500_000
+NANOSECONDS_PER_HOUR = 3600 * 10 ** 9
+
+
+def resolved_output_uri(description: dict[str, Any]) -> str | None:
+    """Uri of the offline store of a Feature Group from its description, None if it has no offline store"""
+    s3_config = description.get('OfflineStoreConfig', {}).get('S3StorageConfig', {})
+    uri = s3_config.get('ResolvedOutputS3Uri')
+    return None if uri is None else str(uri)
+
+
+def parse_event_times(event_times: pandas.Series) -> NDArray[numpy.datetime64]:
+    """
+    UTC event times as `datetime64[ns]`, from ISO 8601 strings or seconds since the epoch
+
+    The strings are parsed once per distinct value, the event times of a backfill have few of them.
+    """
+    if pandas.api.types.is_numeric_dtype(event_times.dtype):
+        seconds: NDArray[numpy.float64] = event_times.to_numpy(dtype=numpy.float64)
+        return (seconds * 10 ** 9).astype('datetime64[ns]')
+
+    codes, uniques = pandas.factorize(event_times)
+    if (codes < 0).any():
+        raise ValueError(f'Column {event_times.name} has null event times')
+
+    times = pandas.to_datetime(pandas.Series(uniques), utc=True).dt.tz_localize(None)
+    parsed: NDArray[numpy.datetime64] = times.to_numpy()[codes]
+    return parsed
+
+
+def event_hours(event_times: pandas.Series) -> NDArray[numpy.int64]:
+    """Hours since the epoch of the event times, see `parse_event_times`"""
+    return parse_event_times(event_times).astype(numpy.int64) // NANOSECONDS_PER_HOUR
+
+
+def partition_path(hour: int) -> str:
+    """Partition of the offline store of the records of an hour since the epoch"""
+    time = datetime.fromtimestamp(int(hour) * 3600, tz=timezone.utc)
+    return f'year={time:%Y}/month={time:%m}/day={time:%d}/hour={time:%H}'
+
+
+def open_filesystem(uri: str) -> tuple[pyarrow.fs.FileSystem, str]:
+    """Filesystem and path of a local directory or a `pyarrow.fs` uri"""
+    if '://' in uri:
+        filesystem, path = pyarrow.fs.FileSystem.from_uri(uri)
+        return filesystem, str(path)
+    return pyarrow.fs.LocalFileSystem(), os.path.abspath(uri)
+
+
+def _write_file(table: pyarrow.Table, filesystem: pyarrow.fs.FileSystem, path: str) -> int:
+    filesystem.create_dir(os.path.dirname(path), recursive=True)
+    pyarrow.parquet.write_table(table, path, filesystem=filesystem)
+    return int(table.num_rows)
+
+
+def bulk_write(data: pandas.DataFrame,
+               output_uri: str,
+               event_time_feature_name: str,
+               rows_per_file: int = ROWS_PER_FILE,
+               max_workers: int | None = None) -> dict[str, Any]:
+    """
+    Write the records to the offline store of a Feature Group
+
+    Params:
+        - data (pandas.DataFrame): The features, prepared with `check_fg_prep`
+        - output_uri (str): Uri of the offline store of the Feature Group, a local directory or a `pyarrow.fs` uri
+        - event_time_feature_name (str): Column with the event time of every record
+        - rows_per_file (int): Maximum number of rows of a file
+        - max_workers (int): Number of files written at once, the available CPUs when not given
+
+    Return:
+        - dict: Report with the rows, partitions and files written and the throughput
+    """
+    starting_time = perf_counter()
+    filesystem, root = open_filesystem(output_uri)
+
+    now = pandas.Timestamp.now(tz='UTC').floor('ms')
+    table = pyarrow.Table.from_pandas(data, preserve_index=False)
+    table = table.append_column('write_time', pyarrow.array(numpy.full(len(data), now.to_datetime64()),
+                                                            pyarrow.timestamp('ms', tz='UTC')))
+    table = table.append_column('api_invocation_time', table['write_time'])
+    table = table.append_column('is_deleted', pyarrow.array(numpy.zeros(len(data), dtype=bool)))
+
+    # Rows sorted by partition, every partition is a contiguous slice of the table
+    hours = event_hours(data[event_time_feature_name])
+    order = numpy.argsort(hours, kind='stable')
+    if (numpy.diff(hours) < 0).any():
+        table = table.take(order)
+    partitions, starts, counts = numpy.unique(hours[order], return_index=True, return_counts=True)
+
+    files = []
+    for hour, start, count in zip(partitions, starts, counts):
+        directory = f'{root.rstrip("/")}/{partition_path(hour)}'
+        for offset in range(0, int(count), rows_per_file):
+            name = f'{now:%Y%m%dT%H%M%SZ}_{uuid.uuid4().hex[:16]}.parquet'
+            files.append((table.slice(int(start) + offset, min(rows_per_file, int(count) - offset)),
+                          f'{directory}/{name}'))
+
+    with ThreadPoolExecutor(max_workers=max_workers or available_cpus()) as executor:
+        n_rows = sum(executor.map(lambda file: _write_file(file[0], filesystem, file[1]), files))
+
+    seconds = perf_counter() - starting_time
+    return {'rows': n_rows,
+            'partitions': len(partitions),
+            'files': len(files),
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(n_rows / seconds, 1) if seconds else None}
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Parallel
+========
+
+Partitioned execution of row-local steps on a pool of processes. The input is split in contiguous partitions of
+rows, every partition is processed by a worker and the results are concatenated back in the original order.
+
+Only steps declared `row_local` with `data_args` can be partitioned: any other step would give a different result
+when it only sees part of the rows.
+"""
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from importlib import import_module
+from typing import Any, Callable
+
+import numpy
+import pandas
+
+# Below this number of rows per partition the cost of the pool outweighs the gain
+MIN_PARTITION_ROWS = 10_000
+
+
+def available_cpus() -> int:
+    """
+    Number of CPUs the process can use, taking into account the CPU affinity and the cgroup CPU quota of the
+    container, not only the CPUs of the host as `multiprocessing.cpu_count`.
+
+    Return:
+        - int: The number of usable CPUs, at least 1
+    """
+    n_cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as file:
+            max_quota, period = file.read().split()
+        if max_quota != 'max':
+            quota = int(max_quota) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: quota is -1 when there is no limit
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as file:
+                cfs_quota = int(file.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as file:
+                cfs_period = int(file.read())
+            if cfs_quota > 0:
+                quota = cfs_quota / cfs_period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        n_cpus = min(n_cpus, max(1, int(quota)))
+
+    return max(1, n_cpus)
+
+
+def _resolve_step(module_name: str, step_name: str) -> Callable[..., pandas.DataFrame]:
+    """Get the undecorated step from its module, functions decorated by `data_args` are not picklable"""
+    step = getattr(import_module(module_name), step_name)
+    undecorated: Callable[..., pandas.DataFrame] = getattr(step, 'step', step)
+    return undecorated
+
+
+def _run_partition(module_name: str,
+                   step_name: str,
+                   partition: pandas.DataFrame,
+                   step_kwargs: dict[str, Any]) -> pandas.DataFrame:
+    return _resolve_step(module_name, step_name)(data=partition, **step_kwargs)
+
+
+def run_partitioned(data_step: Callable[..., pandas.DataFrame],
+                    data: pandas.DataFrame,
+                    n_workers: int | None = None,
+                    min_partition_rows: int = MIN_PARTITION_ROWS,
+                    **step_kwargs) -> pandas.DataFrame:
+    """
+    Run a row-local step over partitions of the data on a pool of processes
+
+    Params:
+        - data_step (Callable): The step, decorated with `data_args(row_local=True)` or its undecorated function
+        - data (pandas.DataFrame): The input dataset
+        - n_workers (int): Number of processes, the available CPUs when not given or lower than 1
+        - min_partition_rows (int): Minimum number of rows per partition
+        - step_kwargs: Extra arguments given to the step, they must be picklable
+
+    Return:
+        - pandas.DataFrame: The concatenation of the processed partitions, in the order of the input
+    """
+    step = getattr(data_step, 'step', data_step)
+
+    if not getattr(data_step, 'row_local', False):
+        raise ValueError(f'Step {step.__name__} is not declared row-local, it can not be partitioned.')
+
+    if n_workers is None or n_workers < 1:
+        n_workers = available_cpus()
+
+    n_partitions = min(n_workers, len(data) // max(1, min_partition_rows))
+
+    if n_partitions < 2:
+        return step(data=data, **step_kwargs)
+
+    bounds = numpy.linspace(0, len(data), n_partitions + 1, dtype=int)
+    partitions = [data.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    print(f"Running step {step.__name__} on {n_partitions} partitions of {bounds[1]} rows")
+
+    with ProcessPoolExecutor(max_workers=n_partitions) as executor:
+        results = list(executor.map(_run_partition,
+                                    [step.__module__] * n_partitions,
+                                    [step.__name__] * n_partitions,
+                                    partitions,
+                                    [step_kwargs] * n_partitions))
+
+    return pandas.concat(results, axis=0, copy=False)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Pipeline Runner
+===============
+
+Run the pipeline steps locally in a single process:
+
+    wrangle -> process_features -> validate_features -> ingest
+
+The input file is read once and the pandas.DataFrame is passed in memory from one step to the next. Intermediate
+results are only written to `--data-path` when `--spill` is set. The ingestion is skipped when no
+`--featuregroup-name` is given.
+
+With `--chunk-size` the row-local steps stream their input in chunks, their result is never in memory: it is written
+to a temporary file of `--data-path`, or to the `--spill` file, that the next step reads. The validation streams that
+file too, see `feature_validation.validate_file`, and `--output-file` is copied from it chunk by chunk, so the memory
+of the pipeline is bounded by the chunk size. The ingestion isn't streamed: with `--featuregroup-name` the processed
+features are loaded in memory once, validated and ingested.
+
+With `--lazy` the wrangling, processing and validation of the input file are compiled into a single plan, see
+`lazy_pipeline`, and `--where` filters the processed features.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from time import perf_counter
+
+import pandas
+
+from data_io import iter_data, write_chunks
+from data_wrangling import wrangle
+from feature_processing import process_features
+from feature_validation import add_validation_args, validate_features, validate_file
+from feature_group_ingestion import add_ingestion_args, ingest
+from lazy_pipeline import add_lazy_args, run_lazy
+from utils import parse_args, write_output
+
+# (step name, step, intermediate output file name)
+STEPS = [
+    ("Data Wrangling", wrangle, "wrangled_data"),
+    ("Features Processing", process_features, "processed_features"),
+    ("Features Validation", validate_features, None),
+    ("Feature Group Ingestion", ingest, None),
+]
+
+
+def run_pipeline(args: argparse.Namespace, data: pandas.DataFrame | None = None) -> pandas.DataFrame | None:
+    """
+    Run all the pipeline steps in the current process
+
+    Params:
+        - args (argparse.Namespace): Pipeline arguments, see `parse_pipeline_args`
+        - data (pandas.DataFrame): The raw dataset. It is read from `--data-path` and `--input-file` if not given
+
+    Return:
+        - pandas.DataFrame: The validated features, None when they were streamed and not ingested
+    """
+    starting_time = perf_counter()
+    extension = args.file_format or 'parquet'
+
+    steps = STEPS
+    if getattr(args, 'lazy', False) and data is None:
+        data = run_lazy(args)
+        steps = [step for step in STEPS if step[1] is ingest]
+
+    input_file = args.input_file
+    with tempfile.TemporaryDirectory(dir=args.data_path) as tmp_dir:
+        for step_name, step, spill_file in steps:
+            if step is ingest and args.fg_name is None:
+                print(f"Skipping step {step_name}, no feature group name was given.\n")
+                continue
+
+            step_args = argparse.Namespace(**vars(args))
+            step_args.step_name = step_name
+            step_args.input_file = input_file
+            step_args.output_file = f"{spill_file}.{extension}" if args.spill and spill_file else None
+
+            chunked = data is None and bool(getattr(args, 'chunk_size', None))
+            if chunked and step is validate_features and args.fg_name is None:
+                # Nothing needs the features in memory, they are validated chunk by chunk
+                validate_file(args=step_args)
+                continue
+
+            # A streamed step writes its result chunk by chunk, the next step reads it from the file
+            streamed = chunked and step.row_local
+            if streamed and step_args.output_file is None:
+                step_args.output_file = os.path.relpath(os.path.join(tmp_dir, f"{spill_file}.{extension}"),
+                                                        args.data_path)
+
+            result = step(args=step_args, data=data)
+
+            if streamed:
+                input_file = step_args.output_file
+            elif result is not None:
+                data = result
+
+        if args.output_file is not None and data is None:
+            # The streamed result of the last step is stored once all the steps succeeded, chunk by chunk
+            write_chunks(chunks=iter_data(path=f"{args.data_path}/{input_file}", chunk_size=args.chunk_size),
+                         path=f"{args.data_path}/{args.output_file}",
+                         file_format=args.file_format)
+        elif args.output_file is not None:
+            # The output of the last step producing data is stored once all the steps succeeded
+            write_output(data=data, args=args)
+
+    print(f"Finished pipeline after {perf_counter() - starting_time:.4f} seconds.")
+
+    return data
+
+
+def parse_pipeline_args() -> argparse.Namespace:
+    """
+    Parse the arguments of the local pipeline: the arguments of every step, the validation mode plus
+        --spill
+        --featuregroup-name
+        --region
+    """
+    parser: argparse.ArgumentParser = parse_args(message="Run the feature pipeline locally", return_parser=True)
+    parser = add_lazy_args(add_validation_args(add_ingestion_args(parser)))
+
+    parser.add_argument("--spill",
+                        dest="spill",
+                        action="store_true",
+                        help="Store the result of every intermediate step in --data-path")
+
+    parser.add_argument("--lazy",
+                        dest="lazy",
+                        action="store_true",
+                        help="Run the wrangling, processing and validation as a single optimised plan")
+
+    args, _ = parser.parse_known_args()
+
+    if args.data_path is None or args.input_file is None:
+        parser.print_help()
+        sys.exit(2)
+
+    print(f"Received arguments:\n{args}.\n")
+
+    return args
+
+
+if __name__ == '__main__':
+    # To run it locally, with the data downloaded in the folder bin:
+    #   --data-path="../bin" --input-file="titanic.csv" --output-file="features.parquet" [--spill]
+    run_pipeline(args=parse_pipeline_args())
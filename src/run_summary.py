@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Run Summary
+===========
+
+Summary of the data resulting of a step, printed by `data_args` after every step. It is computed column by column
+in a single pass, without building full-size null masks of the frame:
+
+- the null count of every column: none for integer and boolean columns, the code -1 of categoricals and the non-null
+  count of the rest
+- the proportion of every value of the target column, `--target-column`, skipped when the data has no target
+- the minimum, maximum and mean of the numeric columns
+
+The summary is updated chunk by chunk, so streamed steps summarize their output without keeping it in memory, and
+summaries of different chunks can be merged. With `--summary-sketches` it also estimates the number of distinct
+values of every column with a HyperLogLog and the quantiles of the numeric columns with a t-digest, see `sketches`.
+"""
+import argparse
+import json
+
+from datetime import datetime
+from typing import Any
+
+import numpy
+import pandas
+
+from sketches import HyperLogLog, TDigest
+
+TARGET_COLUMN = 'survived'
+QUANTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+
+def _is_numeric(series: pandas.Series) -> bool:
+    return pandas.api.types.is_numeric_dtype(series.dtype) and not pandas.api.types.is_bool_dtype(series.dtype)
+
+
+def _count_nulls(series: pandas.Series) -> int:
+    """Null count of a column, without a null mask for the dtypes that can't hold nulls"""
+    dtype = series.dtype
+    if isinstance(dtype, pandas.CategoricalDtype):
+        return int(numpy.count_nonzero(series.cat.codes.to_numpy() == -1))
+    if isinstance(dtype, numpy.dtype) and dtype.kind in 'iub':
+        return 0
+    return len(series) - int(series.count())
+
+
+class ColumnSummary:
+    """
+    Statistics of a column, aggregated chunk by chunk
+
+    Params:
+        - sketches (bool): Estimate the distinct values and quantiles of the column
+    """
+
+    def __init__(self, sketches: bool = False):
+        self.n_nulls = 0
+        self.n_values = 0
+        self.total = 0.0
+        self.minimum: float | None = None
+        self.maximum: float | None = None
+        self.distinct = HyperLogLog() if sketches else None
+        self.quantiles = TDigest() if sketches else None
+
+    def update(self, series: pandas.Series) -> 'ColumnSummary':
+        n_nulls = _count_nulls(series)
+        self.n_nulls += n_nulls
+
+        if self.distinct is not None:
+            self.distinct.update(series)
+
+        if not _is_numeric(series) or n_nulls == len(series):
+            return self
+
+        values = series.to_numpy(dtype=numpy.float64, na_value=numpy.nan)
+        if n_nulls:
+            values = values[~numpy.isnan(values)]
+
+        self.n_values += len(values)
+        self.total += float(values.sum())
+        self.minimum = values.min() if self.minimum is None else min(self.minimum, values.min())
+        self.maximum = values.max() if self.maximum is None else max(self.maximum, values.max())
+
+        if self.quantiles is not None:
+            self.quantiles.update(values)
+
+        return self
+
+    def merge(self, other: 'ColumnSummary') -> 'ColumnSummary':
+        self.n_nulls += other.n_nulls
+        self.n_values += other.n_values
+        self.total += other.total
+        for attr, function in [('minimum', min), ('maximum', max)]:
+            values = [value for value in [getattr(self, attr), getattr(other, attr)] if value is not None]
+            setattr(self, attr, function(values) if values else None)
+
+        if self.distinct is not None and other.distinct is not None:
+            self.distinct.merge(other.distinct)
+        if self.quantiles is not None and other.quantiles is not None:
+            self.quantiles.merge(other.quantiles)
+
+        return self
+
+    def as_dict(self) -> dict[str, float]:
+        stats: dict[str, float] = {'nulls': self.n_nulls}
+
+        if self.minimum is not None and self.maximum is not None:
+            stats.update({'min': float(self.minimum),
+                          'max': float(self.maximum),
+                          'mean': round(self.total / self.n_values, 4)})
+            if self.quantiles is not None:
+                stats.update({name: round(self.quantiles.quantile(q), 4) for name, q in QUANTILES.items()})
+
+        if self.distinct is not None:
+            stats['distinct'] = self.distinct.count()
+
+        return stats
+
+
+class RunSummary:
+    """
+    Summary of the data resulting of a step, aggregated chunk by chunk
+
+    Params:
+        - target_column (str): Column whose value proportions are reported, skipped when not in the data
+        - sketches (bool): Estimate the distinct values and quantiles of every column, see `sketches`
+    """
+
+    def __init__(self, target_column: str | None = TARGET_COLUMN, sketches: bool = False):
+        self.target_column = target_column
+        self.sketches = sketches
+        self.n_samples = 0
+        self.target_counts = pandas.Series(dtype='float64')
+        self.columns: dict[str, ColumnSummary] = {}
+        self.features: list[str] = []
+        self.cache: dict[str, int] | None = None
+        self.phases: dict[str, float] | None = None
+
+    @classmethod
+    def from_args(cls, args: argparse.Namespace) -> 'RunSummary':
+        """Summary configured with the `--target-column` and `--summary-sketches` step arguments"""
+        return cls(target_column=getattr(args, 'target_column', TARGET_COLUMN),
+                   sketches=getattr(args, 'summary_sketches', False))
+
+    @property
+    def n_nan_values(self) -> int:
+        return sum(column.n_nulls for column in self.columns.values())
+
+    def update(self, data: pandas.DataFrame) -> 'RunSummary':
+        """Add a chunk of data to the summary"""
+        self.n_samples += data.shape[0]
+
+        for col in data.columns:
+            if col not in self.columns:
+                self.columns[col] = ColumnSummary(sketches=self.sketches)
+            self.columns[col].update(data[col])
+
+        if self.target_column in data.columns:
+            self.target_counts = self.target_counts.add(data[self.target_column].value_counts(dropna=False),
+                                                        fill_value=0)
+
+        self.features = data.columns.tolist()
+        return self
+
+    def merge(self, other: 'RunSummary') -> 'RunSummary':
+        """Add the summary of other chunks of the same data"""
+        self.n_samples += other.n_samples
+        self.target_counts = self.target_counts.add(other.target_counts, fill_value=0)
+
+        for col, column in other.columns.items():
+            if col in self.columns:
+                self.columns[col].merge(column)
+            else:
+                self.columns[col] = column
+
+        self.features = self.features or other.features
+        return self
+
+    def as_dict(self, total_time: float) -> dict[str, Any]:
+        n_values = self.n_samples * len(self.features)
+        summary = {'date': datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S"),
+                   'n_samples': self.n_samples,
+                   'n_features': len(self.features),
+                   '%nan_values': round((self.n_nan_values / n_values) * 100, 2) if n_values else 0.0,
+                   'prop_target': dict(round(self.target_counts / self.n_samples, 3)) if self.n_samples else {},
+                   'time': total_time,
+                   'features': self.features,
+                   'columns': {col: self.columns[col].as_dict() for col in self.features}
+                   }
+
+        if self.cache is not None:
+            summary['cache'] = self.cache
+
+        if self.phases is not None:
+            summary['phases'] = self.phases
+
+        return summary
+
+
+def print_summary(summary: RunSummary, total_time: float) -> None:
+    """Print the summary of the data resulting of a step"""
+    print(f'{"_" * 20} Summary {"_" * 20}\n\n{json.dumps(summary.as_dict(total_time), indent=4, default=str)}')
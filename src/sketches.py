@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Sketches
+========
+
+Approximate statistics of a column in bounded memory, updated chunk by chunk with vectorised NumPy operations and
+mergeable across chunks or processes:
+
+- HyperLogLog: number of distinct values, with a relative error of about 1.04 / sqrt(2 ** precision)
+- TDigest: quantiles, more accurate in the tails than in the median
+"""
+import math
+
+from typing import Any
+
+import numpy
+import pandas
+
+from numpy.typing import NDArray
+
+HLL_PRECISION = 14
+TDIGEST_COMPRESSION = 200
+
+
+class HyperLogLog:
+    """
+    Approximate count of distinct values
+
+    Params:
+        - precision (int): Number of bits of the hash used to select the register, 2 ** precision registers
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        if not 4 <= precision <= 16:
+            raise ValueError(f'Precision {precision} must be between 4 and 16')
+        self.precision = precision
+        self.registers = numpy.zeros(2 ** precision, dtype=numpy.uint8)
+
+    def update(self, values: pandas.Series | NDArray[Any]) -> 'HyperLogLog':
+        """Add the non-null values of a chunk"""
+        values = pandas.Series(values)
+        values = values[values.notna()]
+        if values.empty:
+            return self
+
+        hashes = pandas.util.hash_array(values.to_numpy())
+        registers = (hashes >> numpy.uint64(64 - self.precision)).astype(numpy.int64)
+        # Position of the first 1 bit of the rest of the hash. It has less than 53 bits, so its float exponent is
+        # exactly its bit length
+        rest = hashes & numpy.uint64((1 << (64 - self.precision)) - 1)
+        _, bit_length = numpy.frexp(rest.astype(numpy.float64))
+        ranks = 64 - self.precision + 1 - bit_length.astype(numpy.int64)
+
+        # Maximum rank of every register: the ranks seen per register are flagged, then the highest flag is taken
+        n_ranks = 64 - self.precision + 2
+        seen = numpy.bincount(registers * n_ranks + ranks, minlength=len(self.registers) * n_ranks) > 0
+        seen = seen.reshape(len(self.registers), n_ranks)
+        highest = n_ranks - 1 - numpy.argmax(seen[:, ::-1], axis=1)
+
+        numpy.maximum(self.registers, numpy.where(seen.any(axis=1), highest, 0).astype(numpy.uint8),
+                      out=self.registers)
+        return self
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        numpy.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        """Estimated number of distinct values"""
+        n_registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / n_registers)
+        estimate = alpha * n_registers ** 2 / numpy.sum(numpy.ldexp(1.0, -self.registers.astype(numpy.int64)))
+
+        n_empty = int(numpy.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * n_registers and n_empty:
+            # Linear counting for small cardinalities
+            estimate = n_registers * math.log(n_registers / n_empty)
+
+        return int(round(estimate))
+
+
+class TDigest:
+    """
+    Approximate quantiles. Values are clustered into centroids whose size shrinks towards the tails, following the
+    scale function k(q) = compression / (2 pi) * asin(2q - 1)
+
+    Params:
+        - compression (int): About the maximum number of centroids kept
+    """
+
+    def __init__(self, compression: int = TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means: NDArray[numpy.float64] = numpy.empty(0)
+        self.weights: NDArray[numpy.float64] = numpy.empty(0)
+        self.minimum = numpy.inf
+        self.maximum = -numpy.inf
+
+    def _compress(self, means: NDArray[numpy.float64], weights: NDArray[numpy.float64]) -> None:
+        """Cluster centroids sorted by mean, see the scale function"""
+        total = weights.sum()
+        quantiles = (numpy.cumsum(weights) - weights / 2) / total
+        scale = self.compression / (2 * math.pi) * numpy.arcsin(2 * quantiles - 1)
+        clusters = numpy.floor(scale - scale[0]).astype(numpy.int64)
+
+        # Weighted counts are float64, `astype` only tells it to the type checker and doesn't copy them
+        cluster_weights = numpy.bincount(clusters, weights=weights).astype(numpy.float64, copy=False)
+        kept = cluster_weights > 0
+        self.means = (numpy.bincount(clusters, weights=means * weights)[kept] / cluster_weights[kept])
+        self.weights = cluster_weights[kept]
+
+    def _add(self, means: NDArray[numpy.float64], weights: NDArray[numpy.float64]) -> None:
+        # The few existing centroids are inserted in the sorted new ones instead of sorting them all together
+        positions = numpy.searchsorted(means, self.means)
+        self._compress(numpy.insert(means, positions, self.means), numpy.insert(weights, positions, self.weights))
+
+    def update(self, values: pandas.Series | NDArray[Any]) -> 'TDigest':
+        """Add the non-null values of a chunk"""
+        values = numpy.asarray(values, dtype=numpy.float64)
+        values = numpy.sort(values[~numpy.isnan(values)])
+        if not len(values):
+            return self
+
+        self.minimum = min(self.minimum, values[0])
+        self.maximum = max(self.maximum, values[-1])
+        self._add(values, numpy.ones(len(values)))
+        return self
+
+    def merge(self, other: 'TDigest') -> 'TDigest':
+        if len(other.means):
+            self.minimum = min(self.minimum, other.minimum)
+            self.maximum = max(self.maximum, other.maximum)
+            self._add(other.means, other.weights)
+        return self
+
+    def quantile(self, q: float) -> float:
+        """Estimated quantile q in [0, 1], NaN when no value was added"""
+        if not len(self.means):
+            return numpy.nan
+
+        # Centroids are placed at the middle of their cumulative weight, interpolated between the extremes
+        total = self.weights.sum()
+        positions = numpy.concatenate([[0], (numpy.cumsum(self.weights) - self.weights / 2) / total, [1]])
+        values = numpy.concatenate([[self.minimum], self.means, [self.maximum]])
+
+        return float(numpy.interp(q, positions, values))
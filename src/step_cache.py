@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Date: 01/2023
+Version: 1.0
+Author: (C) Capgemini Engineering - Antonio Galan, Jose Pena
+Website: www.capgemini.com
+
+
+Step Cache
+==========
+
+Content-addressed cache of the results of the pipeline steps. The result of a step is stored as a Parquet file
+named after a hash of:
+
+- the input data, values and index
+- the source code of the module defining the step and of the modules of its directory it imports, directly or not,
+  so changes in helper functions or in the feature registry invalidate it too
+- the step arguments that can change its result
+
+so a step is only executed again when one of them changes. The cache directory is bounded in size, the least
+recently used entries are evicted first.
+"""
+import argparse
+import ast
+import functools
+import hashlib
+import inspect
+import os
+import sys
+
+from types import ModuleType
+from typing import Any, Callable
+
+import pandas
+
+# Arguments that don't change the result of a step
+NEUTRAL_ARGS = {'step_name', 'data_path', 'input_file', 'output_file', 'file_format', 'chunk_size', 'workers',
+                'cache_dir', 'cache_max_mb', 'spill', 'metrics_file', 'profile', 'profile_dir', 'trace_memory',
+                'target_column', 'summary_sketches'}
+
+DEFAULT_MAX_MB = 1024
+
+
+def _imported_names(module: ModuleType) -> list[str]:
+    """Names of the modules imported by absolute imports anywhere in the source of a module"""
+    names: list[str] = []
+    for node in ast.walk(ast.parse(inspect.getsource(module))):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module is not None and not node.level:
+            names.append(node.module)
+    return names
+
+
+@functools.lru_cache(maxsize=None)
+def source_modules(module: ModuleType) -> tuple[ModuleType, ...]:
+    """
+    Get the modules whose source can change the result of the steps of a module
+
+    Params:
+        - module (ModuleType): The module defining the step
+
+    Return:
+        - tuple[ModuleType]: The module and the modules of its directory it imports, directly or not, sorted by name
+    """
+    directory = os.path.dirname(os.path.abspath(inspect.getfile(module)))
+    found = {module.__name__: module}
+    pending = [module]
+
+    while pending:
+        for name in _imported_names(pending.pop()):
+            imported = sys.modules.get(name)
+            path = getattr(imported, '__file__', None)
+            if imported is None or name in found or path is None or os.path.dirname(os.path.abspath(path)) != directory:
+                continue
+            found[name] = imported
+            pending.append(imported)
+
+    return tuple(found[name] for name in sorted(found))
+
+
+class StepCache:
+    """
+    Local cache of step results
+
+    Params:
+        - cache_dir (str): Directory to store the results in, created if it doesn't exist
+        - max_bytes (int): Maximum size of the directory
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_MB * 2 ** 20):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(data_step: Callable[..., Any], data: pandas.DataFrame, step_args: dict[str, Any]) -> str:
+        """
+        Get the key of the result of a step
+
+        Params:
+            - data_step (Callable): The undecorated step
+            - data (pandas.DataFrame): The input of the step
+            - step_args (dict): Arguments of the step, the ones in `NEUTRAL_ARGS` are ignored
+
+        Return:
+            - str: The hexadecimal key
+        """
+        digest = hashlib.sha256()
+
+        digest.update(pandas.util.hash_pandas_object(data, index=True).values.tobytes())
+        digest.update(repr([(col, str(dtype)) for col, dtype in data.dtypes.items()]).encode())
+        digest.update(repr(data.index.name).encode())
+
+        module = inspect.getmodule(data_step)
+        if module is None:
+            digest.update(inspect.getsource(data_step).encode())
+        else:
+            for source_module in source_modules(module):
+                digest.update(source_module.__name__.encode())
+                digest.update(inspect.getsource(source_module).encode())
+        digest.update(data_step.__qualname__.encode())
+
+        digest.update(repr(sorted((name, repr(value)) for name, value in step_args.items()
+                                  if name not in NEUTRAL_ARGS)).encode())
+
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.parquet')
+
+    def get(self, key: str) -> pandas.DataFrame | None:
+        """Get a stored result, None if there is no result for the key"""
+        path = self._path(key)
+
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        # The modification time is the last use of the entry for the LRU eviction
+        os.utime(path)
+        return pandas.read_parquet(path)
+
+    def put(self, key: str, data: pandas.DataFrame) -> None:
+        """Store a result and evict the least recently used entries if the cache is full"""
+        tmp_path = f'{self._path(key)}.tmp'
+        data.to_parquet(tmp_path, index=True)
+        os.replace(tmp_path, self._path(key))
+
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache fits in its maximum size"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.parquet'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(path)
+            total_bytes -= size
+
+    def stats(self) -> dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+def open_cache(args: argparse.Namespace) -> StepCache | None:
+    """Get the cache configured by `--cache-dir` and `--cache-max-mb`, None if there is no cache directory"""
+    cache_dir = getattr(args, 'cache_dir', None)
+
+    if cache_dir is None:
+        return None
+
+    max_mb = getattr(args, 'cache_max_mb', None) or DEFAULT_MAX_MB
+
+    return StepCache(cache_dir=cache_dir, max_bytes=int(max_mb * 2 ** 20))
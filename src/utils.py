@@ -12,13 +12,19 @@ Script to ...
 
 """
 import argparse
-import json
-
-from datetime import datetime
-from time import perf_counter
+import functools
+import inspect
+from typing import Any, Callable, Iterator, Sequence
 
 import pandas
 
+from compact_dtypes import compact_dtypes
+from data_io import iter_data, read_data, write_chunks, write_data
+from instrumentation import StepMetrics, add_instrumentation_args, profiled, write_metrics
+from parallel import run_partitioned
+from run_summary import TARGET_COLUMN, RunSummary, print_summary
+from step_cache import StepCache, open_cache
+
 
 def parse_args(message: str = "",
                return_parser: bool = False) -> argparse.Namespace | argparse.ArgumentParser:
@@ -31,6 +37,19 @@ def parse_args(message: str = "",
             --data-path
             --input-file
             --output-file
+            --format
+            --columns
+            --chunk-size
+            --workers
+            --cache-dir
+            --cache-max-mb
+            --compact-dtypes
+            --target-column
+            --summary-sketches
+            --metrics-file
+            --profile
+            --profile-dir
+            --trace-memory
     """
     parser = argparse.ArgumentParser(message)
 
@@ -55,6 +74,63 @@ def parse_args(message: str = "",
                         type=str,
                         help="Filename to store the output data")
 
+    parser.add_argument("--format",
+                        dest="file_format",
+                        type=str,
+                        choices=["csv", "parquet", "feather", "mmap"],
+                        default=None,
+                        help="Storage format of the input and output files. Inferred from the extension if not set")
+
+    parser.add_argument("--columns",
+                        dest="columns",
+                        type=lambda value: [col.strip() for col in value.split(',') if col.strip()],
+                        default=None,
+                        help="Comma separated list of columns to read from the input file")
+
+    parser.add_argument("--chunk-size",
+                        dest="chunk_size",
+                        type=int,
+                        default=None,
+                        help="Process row-local steps in chunks of this number of rows to bound the memory used")
+
+    parser.add_argument("--workers",
+                        dest="workers",
+                        type=int,
+                        default=None,
+                        help="Run row-local steps on this number of processes. 0 to use all the available CPUs")
+
+    parser.add_argument("--cache-dir",
+                        dest="cache_dir",
+                        type=str,
+                        default=None,
+                        help="Directory to cache the step results in, steps with unchanged input, code and "
+                             "arguments are not executed again")
+
+    parser.add_argument("--cache-max-mb",
+                        dest="cache_max_mb",
+                        type=float,
+                        default=None,
+                        help="Maximum size of the cache directory in MB, the least recently used results are evicted")
+
+    parser.add_argument("--compact-dtypes",
+                        dest="compact_dtypes",
+                        action="store_true",
+                        help="Store the step results with compact dtypes: categoricals, booleans and downcast numbers. "
+                             "Not applied to the chunks of streamed steps")
+
+    parser.add_argument("--target-column",
+                        dest="target_column",
+                        type=str,
+                        default=TARGET_COLUMN,
+                        help="Column whose value proportions are reported in the step summary")
+
+    parser.add_argument("--summary-sketches",
+                        dest="summary_sketches",
+                        action="store_true",
+                        help="Estimate the distinct values and quantiles of every column in the step summary")
+
+    add_instrumentation_args(parser)
+
     if return_parser:
         return parser
 
@@ -65,49 +141,310 @@ def parse_args(message: str = "",
     return args
 
 
-def data_args(data_step):
-    """Decorator with the parser arguments need to the feature processing pipeline"""
+def read_input(args: argparse.Namespace,
+               columns: Sequence[str] | None = None,
+               read_options: dict[str, Any] | None = None) -> pandas.DataFrame:
+    """
+    Read the input dataset of a step
 
-    def execute(args: argparse.Namespace) -> pandas.DataFrame | None:
-        print(f"Starting step {args.step_name}")
-        starting_time = perf_counter()
+    Params:
+        - args (argparse.Namespace): Step arguments, `--columns` takes precedence over `columns`
+        - columns (Sequence[str]): Columns used by the step, all of them when not given
+        - read_options (dict): Wrangling pushed down into the reader, `drop` and `na_values`, see `data_io.read_data`
+
+    Return:
+        - pandas.DataFrame: The input dataset indexed by `PassengerId`
+    """
+    columns = getattr(args, 'columns', None) or columns
+
+    data = read_data(path=f"{args.data_path}/{args.input_file}",
+                     file_format=getattr(args, 'file_format', None),
+                     columns=columns,
+                     **(read_options or {}))
+
+    if data.empty:
+        raise Exception('Input Dataframe is empty.')
+
+    return data
+
+
+def write_output(data: pandas.DataFrame, args: argparse.Namespace) -> None:
+    """
+    Write the output dataset of a step, if an output file was requested
+
+    Params:
+        - data (pandas.DataFrame): The step result
+        - args (argparse.Namespace): Step arguments
+    """
+    if args.output_file is None:
+        return
+
+    if data.empty:
+        raise Exception('Dataframe as result is empty.')
+
+    write_data(data=data,
+               path=f"{args.data_path}/{args.output_file}",
+               file_format=getattr(args, 'file_format', None))
+
+
+def compact_output(data: pandas.DataFrame, args: argparse.Namespace) -> pandas.DataFrame:
+    """Convert the result of a step to compact dtypes when `--compact-dtypes` is given, see `compact_dtypes`"""
+    if not getattr(args, 'compact_dtypes', False):
+        return data
+
+    return compact_dtypes(data)
+
+
+def is_streaming(args: argparse.Namespace, row_local: bool) -> bool:
+    """Whether the input of a step must be processed in chunks of `--chunk-size` rows"""
+    if not getattr(args, 'chunk_size', None):
+        return False
+
+    if not row_local:
+        print(f"Step {args.step_name} is not row-local, the whole input is read at once.")
+        return False
+
+    return True
+
+
+def apply_step(data_step: Callable[..., pandas.DataFrame],
+               data: pandas.DataFrame,
+               args: argparse.Namespace,
+               step_kwargs: dict[str, Any] | None = None) -> pandas.DataFrame | None:
+    """
+    Run a step over the data, on partitions processed in parallel when `--workers` is given and the step is
+    row-local
+
+    Params:
+        - data_step (Callable): The undecorated step
+        - data (pandas.DataFrame): The input dataset
+        - args (argparse.Namespace): Step arguments
+        - step_kwargs (dict): Extra arguments given to the step
+
+    Return:
+        - pandas.DataFrame: The step result
+    """
+    step_kwargs = step_kwargs or {}
+    n_workers = getattr(args, 'workers', None)
+
+    if n_workers is None:
+        return data_step(data=data, **step_kwargs)
+
+    if not getattr(data_step, 'row_local', False):
+        print(f"Step {args.step_name} is not row-local, it runs on a single process.")
+        return data_step(data=data, **step_kwargs)
+
+    return run_partitioned(data_step, data=data, n_workers=n_workers, **step_kwargs)
 
-        # CSV file read
-        data = pandas.read_csv(filepath_or_buffer=f"{args.data_path}/{args.input_file}",
-                               index_col='PassengerId',
-                               low_memory=False,
-                               sep=','
-                               )
 
-        if data.empty:
-            raise Exception('Input Dataframe is empty.')
+def cached_step(data_step: Callable[..., pandas.DataFrame],
+                data: pandas.DataFrame,
+                args: argparse.Namespace,
+                cache: StepCache,
+                step_kwargs: dict[str, Any] | None = None) -> pandas.DataFrame | None:
+    """
+    Run a step over the data, reusing its stored result if the step already ran with the same input, code and
+    arguments
+
+    Params:
+        - data_step (Callable): The undecorated step
+        - data (pandas.DataFrame): The input dataset
+        - args (argparse.Namespace): Step arguments
+        - cache (StepCache): The cache of step results
+        - step_kwargs (dict): Extra arguments given to the step
+
+    Return:
+        - pandas.DataFrame: The step result
+    """
+    # The key is computed before running the step, as steps can modify their input
+    key = cache.key(data_step=data_step, data=data, step_args=vars(args))
+    result = cache.get(key)
+
+    if result is not None:
+        print(f"Reusing cached result {key} of step {args.step_name}")
+        return result
+
+    result = apply_step(data_step, data=data, args=args, step_kwargs=step_kwargs)
 
-        data = data_step(data=data)
-        total_time = perf_counter() - starting_time
+    # Steps without result, like the ingestion, are run every time
+    if isinstance(result, pandas.DataFrame):
+        cache.put(key, result)
 
-        if args.output_file is not None:
-            if data.empty:
-                raise Exception('Dataframe as result is empty.')
+    return result
+
+
+def stream_step(data_step: Callable[..., pandas.DataFrame],
+                args: argparse.Namespace,
+                columns: Sequence[str] | None = None,
+                step_kwargs: dict[str, Any] | None = None,
+                read_options: dict[str, Any] | None = None,
+                metrics: StepMetrics | None = None) -> RunSummary:
+    """
+    Run a row-local step over the input in chunks of `--chunk-size` rows, appending every processed chunk to the
+    output. Only one chunk is kept in memory at a time.
+
+    Params:
+        - data_step (Callable): The undecorated step
+        - args (argparse.Namespace): Step arguments
+        - columns (Sequence[str]): Columns used by the step, all of them when not given
+        - step_kwargs (dict): Extra arguments given to the step
+        - read_options (dict): Wrangling pushed down into the reader, see `read_input`
+        - metrics (StepMetrics): Metrics the time of every phase is added to
+
+    Return:
+        - RunSummary: The summary aggregated across all chunks
+    """
+    summary = RunSummary.from_args(args)
+    metrics = metrics or StepMetrics(step_name=args.step_name)
+    file_format = getattr(args, 'file_format', None)
+
+    with metrics.phase('read'):
+        chunks = iter_data(path=f"{args.data_path}/{args.input_file}",
+                           file_format=file_format,
+                           columns=getattr(args, 'columns', None) or columns,
+                           chunk_size=args.chunk_size,
+                           **(read_options or {}))
+
+    def process_chunks() -> Iterator[pandas.DataFrame]:
+        for chunk in metrics.timed('read', chunks):
+            with metrics.phase('transform'):
+                result = apply_step(data_step, data=chunk, args=args, step_kwargs=step_kwargs)
+            with metrics.phase('summary'):
+                summary.update(result)
+            yield result
+
+    if args.output_file is None:
+        for _ in process_chunks():
+            pass
+    else:
+        # The chunks are read and processed while the writer pulls them, that time is not counted as write time
+        with metrics.phase('write'):
+            write_chunks(chunks=process_chunks(),
+                         path=f"{args.data_path}/{args.output_file}",
+                         file_format=file_format)
+
+    if summary.n_samples == 0:
+        raise Exception('Input Dataframe is empty.')
+
+    return summary
+
+
+def run_step(data_step: Callable[..., pandas.DataFrame],
+             data: pandas.DataFrame | None,
+             args: argparse.Namespace,
+             columns: Sequence[str] | None = None,
+             step_kwargs: dict[str, Any] | None = None,
+             read_options: dict[str, Any] | None = None,
+             metrics: StepMetrics | None = None) -> tuple[pandas.DataFrame | None, RunSummary | None]:
+    """
+    Run a step over the whole input in memory: read, transform, compact, write and summarize its result
+
+    Params:
+        - data_step (Callable): The undecorated step
+        - data (pandas.DataFrame): The input dataset, read from `--data-path` and `--input-file` if not given
+        - args (argparse.Namespace): Step arguments
+        - columns (Sequence[str]): Columns used by the step, all of them when not given
+        - step_kwargs (dict): Extra arguments given to the step
+        - read_options (dict): Wrangling pushed down into the reader, see `read_input`
+        - metrics (StepMetrics): Metrics the time of every phase is added to
+
+    Return:
+        - pandas.DataFrame: The step result
+        - RunSummary: The summary of the result, None for steps without result
+    """
+    metrics = metrics or StepMetrics(step_name=args.step_name)
 
-            data.to_csv(path_or_buf=f"{args.data_path}/{args.output_file}",
-                        sep=',',
-                        index=True)
+    if data is None:
+        with metrics.phase('read'):
+            data = read_input(args=args, columns=columns, read_options=read_options)
+
+    cache = open_cache(args)
+
+    with metrics.phase('transform'):
+        if cache is None:
+            data = apply_step(data_step, data=data, args=args, step_kwargs=step_kwargs)
+        else:
+            data = cached_step(data_step, data=data, args=args, cache=cache, step_kwargs=step_kwargs)
+
+    if not isinstance(data, pandas.DataFrame):
+        return data, None
+
+    with metrics.phase('compact'):
+        data = compact_output(data=data, args=args)
+
+    with metrics.phase('write'):
+        write_output(data=data, args=args)
+
+    with metrics.phase('summary'):
+        summary = RunSummary.from_args(args).update(data)
+        summary.cache = None if cache is None else cache.stats()
+
+    return data, summary
+
+
+def report_step(args: argparse.Namespace, summary: RunSummary | None, metrics: StepMetrics) -> None:
+    """Print the summary of a step and write its metrics to `--metrics-file`, if given"""
+    if summary is not None:
+        metrics.n_rows = summary.n_samples
+        summary.phases = metrics.as_dict()['phases']
+        print_summary(summary=summary, total_time=metrics.seconds)
+
+    metrics_file = getattr(args, 'metrics_file', None)
+    if metrics_file is not None:
+        write_metrics(metrics.as_dict(), metrics_file)
+
+    print(f"Finished {args.step_name} Step after {metrics.seconds:.4f} seconds.\n\n")
+
+
+def data_args(data_step=None,
+              *,
+              columns: Sequence[str] | None = None,
+              row_local: bool = False,
+              read_options: dict[str, Any] | None = None):
+    """
+    Decorator with the parser arguments need to the feature processing pipeline
+
+    It can be used bare, `@data_args`, or with the columns the step works with, `@data_args(columns=[...])`,
+    so only those columns are read from columnar formats. `read_options` pushes part of the step down into the
+    reader, `@data_args(read_options={'drop': [...], 'na_values': [...]})`, see `data_io.read_data`.
+
+    The decorated step is called with the parsed arguments, `step(args=args)`, and reads its input from
+    `--data-path` and `--input-file`. The input can also be given in memory, `step(args=args, data=data)`, to chain
+    steps without intermediate files. Steps declaring an `args` parameter receive the arguments too. The columns of an
+    input read with `--format mmap` are read-only, the steps replace the columns instead of modifying them in place,
+    see `data_io`.
+
+    Steps declared `row_local`, where every output row only depends on the same input row, are streamed in chunks
+    when `--chunk-size` is given and processed on several processes when `--workers` is given.
+
+    Every phase of the step is timed and reported, see `instrumentation`.
+    """
+    if data_step is None:
+        return functools.partial(data_args, columns=columns, row_local=row_local, read_options=read_options)
+
+    pass_args = 'args' in inspect.signature(data_step).parameters
+
+    def execute(args: argparse.Namespace, data: pandas.DataFrame | None = None) -> pandas.DataFrame | None:
+        print(f"Starting step {args.step_name}")
+        step_kwargs = {'args': args} if pass_args else {}
+        metrics = StepMetrics(step_name=args.step_name, trace_memory=getattr(args, 'trace_memory', False))
 
-        if isinstance(data, pandas.DataFrame):
-            dw_summary = {'date': datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S"),
-                          'n_samples': data.shape[0],
-                          'n_features': data.shape[1],
-                          '%nan_values': round((data.isna().sum().sum() / (data.shape[0] * data.shape[1])) * 100, 2),
-                          'prop_target': dict(
-                              round(data['survived'].value_counts(normalize=True, dropna=False), 3)),
-                          'time': total_time,
-                          'features': data.columns.tolist()
-                          }
+        with metrics, profiled(args):
+            if data is None and is_streaming(args=args, row_local=row_local):
+                # The result is written chunk by chunk, nothing is kept in memory
+                summary = stream_step(data_step, args=args, columns=columns, step_kwargs=step_kwargs,
+                                      read_options=read_options, metrics=metrics)
+            else:
+                data, summary = run_step(data_step, data=data, args=args, columns=columns, step_kwargs=step_kwargs,
+                                         read_options=read_options, metrics=metrics)
 
-            print(f'{"_" * 20} Summary {"_" * 20}\n\n{json.dumps(dw_summary, indent=4)}')
+        report_step(args=args, summary=summary, metrics=metrics)
 
-        print(f"Finished {args.step_name} Step after {total_time:.4f} seconds.\n\n")
+        return data
 
-        return data_step
+    # Steps are resolved by name in the worker processes, see `parallel.run_partitioned`
+    data_step.row_local = row_local
+    execute.step = data_step  # type: ignore[attr-defined]
+    execute.row_local = row_local  # type: ignore[attr-defined]
 
     return execute
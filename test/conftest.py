@@ -1,3 +1,4 @@
 import sys
 sys.path.append('src')
-sys.path.append('code')
\ No newline at end of file
+sys.path.append('code')
+sys.path.append('pipeline')
\ No newline at end of file
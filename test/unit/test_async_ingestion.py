@@ -0,0 +1,99 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import pandas
+
+import async_ingestion
+
+from async_ingestion import async_ingest, replay_dead_letters, to_records
+
+
+class StubError(Exception):
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}}
+
+
+class StubFeatureStoreRuntime:
+    """ Feature store runtime throttling the first call of every record and rejecting the ones in `invalid` """
+
+    def __init__(self, invalid=()):
+        self.records = {}
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.invalid = set(invalid)
+
+    async def put_record(self, FeatureGroupName, Record):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0)
+            record_id = Record[0]['ValueAsString']
+            if record_id in self.invalid:
+                raise StubError('ValidationError')
+            if record_id not in self.records:
+                self.records[record_id] = None
+                raise StubError('ThrottlingException')
+            self.records[record_id] = Record
+            return {}
+        finally:
+            self.in_flight -= 1
+
+
+class TestAsyncIngestion(unittest.TestCase):
+
+    def setUp(self):
+        self.backoff_base = async_ingestion.BACKOFF_BASE
+        async_ingestion.BACKOFF_BASE = 0.001
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dead_letter_file = os.path.join(self.tmp_dir.name, 'dead_letters.jsonl')
+        self.data = pandas.DataFrame({
+            'PassengerId': ['1', '2', '3', '4'],
+            'fare': [7.25, None, 7.92, 53.1]
+        })
+
+    def tearDown(self):
+        async_ingestion.BACKOFF_BASE = self.backoff_base
+        self.tmp_dir.cleanup()
+
+    def test_to_records(self):
+        """ Test null values are left out of the records """
+        self.assertEqual(list(to_records(self.data))[1], [{'FeatureName': 'PassengerId', 'ValueAsString': '2'}])
+
+    def test_to_records_batches(self):
+        """ Test the records are the same when the rows are converted in batches """
+        self.assertEqual(list(to_records(self.data, batch_size=3)), list(to_records(self.data)))
+
+    def test_retries_and_concurrency(self):
+        """ Test throttled records are retried and the calls in flight are bounded """
+        client = StubFeatureStoreRuntime()
+        report = async_ingest(self.data, feature_group_name='titanic', client=client, concurrency=2)
+
+        self.assertEqual(report['ingested'], 4)
+        self.assertEqual(report['retries'], 4)
+        self.assertLessEqual(client.max_in_flight, 2)
+
+    def test_dead_letters(self):
+        """ Test failed records are written to the dead letters and can be replayed """
+        report = async_ingest(self.data, feature_group_name='titanic', client=StubFeatureStoreRuntime(invalid={'3'}),
+                              dead_letter_file=self.dead_letter_file)
+
+        self.assertEqual(report['failed'], 1)
+        with open(self.dead_letter_file) as file:
+            self.assertEqual(json.loads(file.readline())['Record'][0]['ValueAsString'], '3')
+
+        client = StubFeatureStoreRuntime()
+        replay = replay_dead_letters(self.dead_letter_file, client=client)
+
+        self.assertEqual(replay['titanic']['ingested'], 1)
+        self.assertEqual(list(client.records), ['3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
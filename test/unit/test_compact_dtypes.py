@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+import numpy
+import pandas
+
+from compact_dtypes import compact_dtypes, feature_group_dtypes, memory_per_row
+from data_io import read_data, write_data
+
+
+class TestCompactDtypes(unittest.TestCase):
+
+    def setUp(self):
+        n_rows = 1_000
+        self.data = pandas.DataFrame({
+            'survived': numpy.arange(n_rows) % 2,
+            'sex': numpy.where(numpy.arange(n_rows) % 3 == 0, 'female', 'male').astype(object),
+            'embarked': numpy.array(['S', 'C', None, 'Q'] * (n_rows // 4), dtype=object),
+            'hours_traveling': numpy.tile([108.0, 102.0, numpy.nan, 85.0], n_rows // 4),
+            'fare': numpy.linspace(0.1, 512.3292, n_rows),
+            'name': [f'passenger {i}' for i in range(n_rows)],
+            'flag': numpy.array([True, False] * (n_rows // 2), dtype=object),
+        }, index=pandas.RangeIndex(1, n_rows + 1, name='PassengerId'))
+
+        self.compact = compact_dtypes(self.data.copy())
+
+    def test_dtypes(self):
+        """ Test low-cardinality columns are categorical and numbers are downcast only without loss """
+        dtypes = self.compact.dtypes
+
+        self.assertEqual(dtypes['survived'], numpy.int8)
+        self.assertIsInstance(dtypes['sex'], pandas.CategoricalDtype)
+        self.assertIsInstance(dtypes['embarked'], pandas.CategoricalDtype)
+        self.assertEqual(dtypes['hours_traveling'], numpy.float32)
+        self.assertEqual(dtypes['fare'], numpy.float64, 'Lossy float downcast')
+        self.assertEqual(dtypes['name'], object, 'High-cardinality column stored as categorical')
+        self.assertEqual(dtypes['flag'], bool)
+
+    def test_memory(self):
+        """ Test the memory per row drops several-fold without the high-cardinality column """
+        columns = ['survived', 'sex', 'embarked', 'hours_traveling', 'flag']
+        self.assertLess(memory_per_row(self.compact[columns]) * 4, memory_per_row(self.data[columns]))
+
+    def test_feature_group_dtypes(self):
+        """ Test the compact dtypes are converted back to the same values and Feature Group types """
+        restored = feature_group_dtypes(self.compact.copy())
+        expected = self.data.assign(flag=self.data['flag'].astype(numpy.int64))
+
+        pandas.testing.assert_frame_equal(restored, expected)
+
+    def test_stored_between_steps(self):
+        """ Test the compact dtypes are kept by the columnar files written between steps """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for extension in ['parquet', 'feather']:
+                path = os.path.join(tmp_dir, f'features.{extension}')
+                write_data(self.compact, path)
+                pandas.testing.assert_series_equal(read_data(path).dtypes, self.compact.dtypes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy
+import pandas
+
+from data_io import iter_data, read_data, resolve_format, write_chunks, write_data
+
+
+class TestDataIO(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data = pandas.DataFrame({
+            'PassengerId': [3, 1, 2],
+            'fare': [7.25, 71.28, 8.05],
+            'sex': pandas.array(['male', None, 'female'], dtype='string'),
+            'age_group': pandas.Categorical(['adult', 'child', None],
+                                            categories=['baby', 'child', 'adult'])
+        }).set_index('PassengerId')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resolve_format(self):
+        """ Test format is inferred from the extension unless forced """
+        self.assertEqual(resolve_format('data.parquet'), 'parquet')
+        self.assertEqual(resolve_format('data.FEATHER'), 'feather')
+        self.assertEqual(resolve_format('data.txt', 'csv'), 'csv')
+        self.assertRaises(ValueError, resolve_format, 'data.txt')
+
+    def test_columnar_round_trip(self):
+        """ Test columnar formats keep dtypes and the PassengerId index """
+        for extension in ['parquet', 'feather']:
+            path = os.path.join(self.tmp_dir.name, f'data.{extension}')
+            write_data(self.data, path)
+            result = read_data(path)
+
+            pandas.testing.assert_frame_equal(result, self.data, f'{extension} round trip modified the data')
+
+    def test_projection(self):
+        """ Test only the requested columns are read, keeping the index """
+        for extension in ['csv', 'parquet', 'feather', 'mmap']:
+            path = os.path.join(self.tmp_dir.name, f'data.{extension}')
+            write_data(self.data, path)
+            result = read_data(path, columns=['fare'])
+
+            self.assertEqual(result.columns.tolist(), ['fare'], f'{extension} projection not applied')
+            self.assertEqual(result.index.name, 'PassengerId', f'{extension} projection lost the index')
+
+    def test_pushdown(self):
+        """ Test dropped columns are not read, whatever their case, and null tokens are parsed as nulls """
+        data = self.data.rename(columns={'sex': ' Sex '})
+
+        for extension in ['csv', 'parquet', 'feather', 'mmap']:
+            path = os.path.join(self.tmp_dir.name, f'data.{extension}')
+            write_data(data, path)
+            result = read_data(path, drop=['sex'])
+
+            self.assertEqual(result.columns.tolist(), ['fare', 'age_group'], f'{extension} drop not applied')
+            self.assertEqual(result.index.name, 'PassengerId', f'{extension} drop lost the index')
+
+        path = os.path.join(self.tmp_dir.name, 'tokens.csv')
+        with open(path, 'w') as file:
+            file.write('PassengerId,Age\n1,22\n2, \n3,nan\n')
+
+        self.assertEqual(read_data(path, na_values=[' '])['Age'].isna().sum(), 2)
+
+    def test_mmap(self):
+        """ Test the mmap datasets are read without copies, the strings backed by Arrow, in one piece or in chunks """
+        path = os.path.join(self.tmp_dir.name, 'data.mmap')
+        write_data(self.data, path)
+        result = read_data(path)
+
+        self.assertEqual(result['sex'].dtype, pandas.StringDtype('pyarrow'))
+        pandas.testing.assert_frame_equal(result, self.data.astype({'sex': 'string[pyarrow]'}))
+        self.assertFalse(result['fare'].to_numpy().flags.owndata)
+        self.assertFalse(result['fare'].to_numpy().flags.writeable)
+
+        write_chunks([self.data.iloc[:2], self.data.iloc[2:]], os.path.join(self.tmp_dir.name, 'chunks.mmap'))
+        pandas.testing.assert_frame_equal(read_data(os.path.join(self.tmp_dir.name, 'chunks.mmap')), result)
+
+    def test_mmap_empty(self):
+        """ Test the mmap datasets without rows are written in one piece or from no chunks, and read back """
+        path = os.path.join(self.tmp_dir.name, 'empty.mmap')
+        write_data(self.data.iloc[:0], path)
+        result = read_data(path)
+
+        self.assertEqual(len(result), 0)
+        self.assertEqual(result.columns.tolist(), self.data.columns.tolist())
+        self.assertEqual(result.index.name, 'PassengerId')
+
+        path = os.path.join(self.tmp_dir.name, 'no_chunks.mmap')
+        write_chunks(iter([]), path)
+        result = read_data(path)
+
+        self.assertEqual(len(result), 0)
+        self.assertEqual(result.index.name, 'PassengerId')
+        with open(os.path.join(path, 'manifest.json')) as file:
+            self.assertEqual(json.load(file)['num_rows'], 0)
+        self.assertEqual(list(iter_data(path, chunk_size=100)), [])
+
+    def test_mmap_read_only(self):
+        """ Test the mapped columns can't be modified in place but can be replaced """
+        path = os.path.join(self.tmp_dir.name, 'data.mmap')
+        write_data(self.data, path)
+        data = read_data(path)
+
+        with self.assertRaisesRegex(ValueError, 'read-only'):
+            data.iloc[0, data.columns.get_loc('fare')] = 0.0
+
+        data['fare'] = data['fare'].where(data['fare'] > 10, 0.0)
+        self.assertEqual(data['fare'].iloc[0], 0.0)
+        output_path = os.path.join(self.tmp_dir.name, 'output.mmap')
+        write_data(data, output_path)
+        pandas.testing.assert_frame_equal(read_data(output_path), data)
+
+    def test_mmap_sidecar(self):
+        """ Test only the columns added or replaced by a step are written, the others are linked """
+        write_data(self.data, os.path.join(self.tmp_dir.name, 'input.mmap'))
+        data = read_data(os.path.join(self.tmp_dir.name, 'input.mmap'))
+        data.columns = ['Fare', 'sex', 'age_group']
+        data['fare_log'] = numpy.log(data['Fare'])
+        data['age_group'] = data['age_group'].cat.remove_unused_categories()
+
+        path = os.path.join(self.tmp_dir.name, 'output.mmap')
+        write_data(data, path)
+        with open(os.path.join(path, 'manifest.json')) as file:
+            files = json.load(file)['files']
+
+        self.assertEqual([file['columns'] for file in files],
+                         [{'Fare': 'fare', 'sex': 'sex'}, {'age_group': 'age_group', 'fare_log': 'fare_log'}])
+        self.assertEqual(os.stat(os.path.join(path, files[0]['path'])).st_nlink, 2)
+        pandas.testing.assert_frame_equal(read_data(path), data)
+
+        # The rows changed, the whole dataset is written again
+        write_data(read_data(path).iloc[1:], path)
+        self.assertEqual(len(os.listdir(path)), 2)
+        pandas.testing.assert_frame_equal(read_data(path), data.iloc[1:])
+
+
+if __name__ == '__main__':
+    unittest.main()
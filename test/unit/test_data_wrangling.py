@@ -1,3 +1,6 @@
+import argparse
+import os
+import tempfile
 import unittest
 
 import pandas
@@ -33,5 +36,28 @@ class TestWrangle(unittest.TestCase):
         """ Test empty values are numpy.nan """
         self.assertEqual(self.result['age'].value_counts(dropna=False)[numpy.nan], 5, 'Not all empty values were caught')
 
+    def test_pushdown(self):
+        """ Test reading the input with the wrangling pushed down into the reader """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pandas.DataFrame({
+                'PassengerId': [1, 2, 3, 4],
+                'Survived': [0, 1, 1, 0],
+                'Name': ['John', 'Alice', 'Bob', 'Eve'],
+                ' AgE ': ['22', ' ', '', '35'],
+                'Embarked': ['S', 'nan', ' ', 'C'],
+            }).to_csv(os.path.join(tmp_dir, 'titanic.csv'), index=False)
+
+            args = argparse.Namespace(data_path=tmp_dir, input_file='titanic.csv', output_file=None, step_name='test')
+            result = wrangle(args=args)
+
+        expected = pandas.DataFrame({
+            'survived': [0, 1, 1, 0],
+            'age': [22.0, numpy.nan, numpy.nan, 35.0],
+            'embarked': ['S', numpy.nan, numpy.nan, 'C'],
+        }, index=pandas.Index([1, 2, 3, 4], name='PassengerId'))
+
+        pandas.testing.assert_frame_equal(result, expected)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
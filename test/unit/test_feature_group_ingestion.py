@@ -1,8 +1,15 @@
+import argparse
+import os
+import tempfile
 import unittest
 
+from unittest import mock
+
 import pandas
 
-from feature_group_ingestion import cast_object_to_string
+from feature_group_ingestion import (ENDPOINT_VARIABLE, cast_object_to_string, check_fg_prep, ingest_features,
+                                     open_sagemaker_session, runtime_endpoint, select_changed_records)
+from ingestion_manifest import IngestionManifest
 
 class TestCastObjectToString(unittest.TestCase):
 
@@ -20,5 +27,120 @@ class TestCastObjectToString(unittest.TestCase):
         self.assertEqual(self.result.dtypes['FloatCol'], float, 'Type float col was modified')
         self.assertEqual(self.result.dtypes['ObjectCol'], 'string', 'Type object col was not casted to string')
 
+    def test_nulls_kept(self):
+        """ Test null values are not converted to the string 'nan' """
+        result = cast_object_to_string(pandas.DataFrame({'ObjectCol': ['ABC', None]}))
+        self.assertTrue(result['ObjectCol'].isna().iloc[1], 'Null value was converted to string')
+
+
+class TestCheckFgPrep(unittest.TestCase):
+
+    def setUp(self):
+        self.data = pandas.DataFrame({
+            'PassengerId': [1, 2, 3, 2],
+            'sex': ['male', 'female', None, 'female']
+        })
+
+    def test_duplicated_identifiers(self):
+        """ Test the duplicated identifiers are reported """
+        with self.assertRaisesRegex(Exception, '1 duplicated values: 2'):
+            check_fg_prep(self.data, record_identifier_name='PassengerId')
+
+    def test_event_time(self):
+        """ Test the record identifier and event time are created """
+        result = check_fg_prep(self.data.iloc[:3].set_index('PassengerId'), record_identifier_name='PassengerId')
+
+        self.assertEqual(result['PassengerId'].tolist(), [1, 2, 3], 'Record identifier not created from the index')
+        self.assertEqual(result.dtypes['EventTime'], 'string', 'Event time is not a string')
+        self.assertEqual(result['EventTime'].nunique(), 1, 'Event time differs between records')
+
+
+class TestSelectChangedRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.manifest = IngestionManifest(os.path.join(self.tmp_dir.name, 'manifest.db'))
+        self.data = pandas.DataFrame({
+            'PassengerId': [1, 2, 3],
+            'fare': [7.25, 71.28, 7.92],
+            'EventTime': ['2023-01-01T00:00:00Z'] * 3
+        }).set_index('PassengerId')
+
+    def tearDown(self):
+        self.manifest.close()
+        self.tmp_dir.cleanup()
+
+    def select(self, data):
+        return select_changed_records(data=data.copy(), manifest=self.manifest,
+                                      record_identifier_name='PassengerId', event_time_feature_name='EventTime')
+
+    def test_first_ingestion(self):
+        """ Test all records are ingested when the manifest is empty """
+        result, commit = self.select(self.data)
+        commit()
+
+        self.assertEqual(len(result), 3, 'Not all records selected in the first ingestion')
+
+    def test_incremental_ingestion(self):
+        """ Test only new or modified records are ingested, whatever their event time """
+        self.select(self.data)[1]()
+
+        data = pandas.concat([self.data.iloc[1:], self.data.iloc[:1].rename(index={1: 4})])
+        data.loc[2, 'fare'] = 8.05
+        data['EventTime'] = '2023-01-02T00:00:00Z'
+        result, commit = self.select(data)
+        commit()
+
+        self.assertEqual(sorted(result.index), [2, 4], 'Wrong records selected')
+        self.assertTrue(self.select(data)[0].empty, 'Unchanged records selected')
+
+
+class TestRuntimeEndpoint(unittest.TestCase):
+
+    @mock.patch.dict(os.environ, {ENDPOINT_VARIABLE: 'http://previous'})
+    def test_restored(self):
+        """ Test the endpoint is only set in the context, even when the ingestion fails """
+        with self.assertRaises(ValueError):
+            with runtime_endpoint('http://localhost:8080'):
+                self.assertEqual(os.environ[ENDPOINT_VARIABLE], 'http://localhost:8080')
+                raise ValueError('Ingestion failed')
+
+        self.assertEqual(os.environ[ENDPOINT_VARIABLE], 'http://previous')
+
+    @mock.patch.dict(os.environ, {}, clear=True)
+    def test_session(self):
+        """ Test opening a session pointed to an endpoint leaves the environment unchanged """
+        with mock.patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'local', 'AWS_SECRET_ACCESS_KEY': 'local'}):
+            open_sagemaker_session(region='eu-west-1', endpoint_url='http://localhost:8080')
+            self.assertNotIn(ENDPOINT_VARIABLE, os.environ)
+
+        with runtime_endpoint('http://localhost:8080'):
+            pass
+        self.assertNotIn(ENDPOINT_VARIABLE, os.environ)
+
+
+class TestAsyncIngestion(unittest.TestCase):
+
+    def setUp(self):
+        self.data = pandas.DataFrame({'PassengerId': [1, 2], 'sex': ['male', 'female']}).set_index('PassengerId')
+        self.args = argparse.Namespace(fg_name='titanic', region='eu-west-1', ingest_mode='async', concurrency=4,
+                                       dead_letter_file=None)
+        feature_group = mock.patch('feature_group_ingestion.FeatureGroup').start()
+        feature_group.return_value.describe.return_value = {'RecordIdentifierFeatureName': 'PassengerId',
+                                                            'EventTimeFeatureName': 'EventTime'}
+        mock.patch('feature_group_ingestion.open_sagemaker_session').start()
+        mock.patch('feature_group_ingestion.async_ingest', return_value={'failed': 2}).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_failed_records(self):
+        """ Test the failure points to the dead letter file, or to the option to keep the failed records """
+        with self.assertRaisesRegex(Exception, '2 records failed to be ingested, pass --dead-letter-file'):
+            ingest_features(self.data, self.args)
+
+        self.args.dead_letter_file = 'failed.jsonl'
+        with self.assertRaisesRegex(Exception, '2 records failed to be ingested, see failed.jsonl'):
+            ingest_features(self.data, self.args)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,98 @@
+import unittest
+
+import numpy
+import pandas
+
+from feature_registry import AGE_BINS, AGE_GROUPS, REGISTRY, Binning, Mapping
+from feature_processing import process_features, process_record, process_records
+
+
+class TestFeatureRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.data = pandas.DataFrame({
+            'survived': [0, 1, 1, 0, 1, 0],
+            'sex': ['male', 'female', 'female', 'male', 'male', 'female'],
+            'age': [22.0, 0.0, 3.0, 100.0, None, 101.0],
+            'sibsp': [1, 0, 0, 0, 3, 0],
+            'parch': [0, 0, 2, 0, 1, 0],
+            'fare': [7.25, 71.2833, 7.925, 53.1, 8.05, 8.4583],
+            'embarked': ['S', 'C', 'S', None, 'Q', 'S'],
+        }, index=pandas.RangeIndex(1, 7, name='PassengerId'))
+
+    def test_same_as_pandas(self):
+        """ Test the features are the ones of the hard-coded pandas transforms """
+        expected = self.data.copy()
+        expected['hours_traveling'] = expected['embarked'].replace({'Q': 85, 'C': 102, 'S': 108}).astype(float)
+        expected['age_group'] = pandas.cut(expected['age'], AGE_BINS, labels=AGE_GROUPS)
+        expected = expected.drop(['age'], axis=1)
+        expected['alone'] = pandas.Categorical(
+            numpy.where((expected['sibsp'] == 0) & (expected['parch'] == 0), 'yes', 'no'), categories=['no', 'yes'])
+        expected['fare'] = expected['fare'] * 100
+
+        pandas.testing.assert_frame_equal(process_features.step(self.data.copy()), expected)
+
+    def test_categorical_input(self):
+        """ Test the mappings give the same result on categorical columns """
+        plan = REGISTRY.compile(['hours_traveling'])
+        categorical = self.data.astype({'embarked': 'category'})
+
+        numpy.testing.assert_array_equal(plan.compute(categorical)['hours_traveling'],
+                                         plan.compute(self.data)['hours_traveling'])
+
+    def test_requested_features(self):
+        """ Test only the requested features and their inputs are used """
+        plan = REGISTRY.compile(['alone'])
+
+        self.assertEqual(plan.inputs, ['sibsp', 'parch'])
+        self.assertEqual(list(plan.compute(self.data[['sibsp', 'parch']])), ['alone'])
+
+        with self.assertRaises(KeyError):
+            REGISTRY.compile(['unknown'])
+
+    def test_lazy(self):
+        """ Test lazy features are only computed when accessed """
+        features = REGISTRY.compile().lazy(self.data.drop(columns=['age']))
+
+        self.assertEqual(features['alone'].tolist(), ['no', 'yes', 'no', 'yes', 'no', 'yes'])
+        # age_group can't be computed without age, it is never accessed
+        self.assertEqual(list(features.to_frame(['hours_traveling', 'alone'])), ['hours_traveling', 'alone'])
+
+    def test_specs(self):
+        """ Test the specs defaults and their validation """
+        self.assertTrue(numpy.isnan(Mapping('embarked', {'S': 1}).compute({'embarked': pandas.Series(['X'])})[0]))
+
+        with self.assertRaises(ValueError):
+            Binning('age', bins=[0, 10], labels=['child', 'adult'])
+
+    def test_record_parity(self):
+        """ Test the records get the same features as the dataset, nulls as None """
+        expected = process_features.step(self.data.copy()).reset_index()
+        records = self.data.reset_index().to_dict('records')
+
+        result = pandas.DataFrame(process_records(records))
+
+        self.assertEqual(list(result.columns), list(expected.columns))
+        self.assertEqual(process_record(records[2]), {'PassengerId': 3, 'survived': 1, 'sex': 'female', 'sibsp': 0,
+                                                      'parch': 2, 'fare': 792.5, 'embarked': 'S',
+                                                      'hours_traveling': 108.0, 'age_group': 'baby', 'alone': 'no'})
+        for col in expected.columns:
+            self.assertEqual(result[col].astype(object).where(result[col].notna(), None).tolist(),
+                             expected[col].astype(object).where(expected[col].notna(), None).tolist(), col)
+
+    def test_record_tuples(self):
+        """ Test the tuples are transformed in the order of their fields """
+        fields = ['age', 'embarked', 'sibsp', 'parch', 'fare']
+        transform = REGISTRY.compile().records(fields=fields)
+
+        self.assertEqual(transform.output_fields, ['embarked', 'sibsp', 'parch', 'fare', 'hours_traveling',
+                                                   'age_group', 'alone'])
+        self.assertEqual(transform.transform_batch([(2.0, 'Q', 0, 0, 1.5), (numpy.nan, None, 1, 0, None)]),
+                         [('Q', 0, 0, 150.0, 85.0, 'baby', 'yes'), (None, 1, 0, None, None, None, 'no')])
+
+        with self.assertRaises(KeyError):
+            REGISTRY.compile().records(fields=['age'])
+
+
+if __name__ == '__main__':
+    unittest.main()
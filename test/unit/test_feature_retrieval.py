@@ -0,0 +1,89 @@
+import tempfile
+import unittest
+
+import numpy
+import pandas
+
+from feature_retrieval import partition_files, point_in_time_join, read_offline_store
+from offline_store import bulk_write
+
+
+class TestFeatureRetrieval(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.records = pandas.DataFrame({
+            'PassengerId': [1, 1, 1, 2, 2],
+            'fare': [10.0, 20.0, 30.0, 5.0, 6.0],
+            'EventTime': ['2023-01-01T00:00:00Z', '2023-01-02T00:00:00Z', '2023-01-03T00:00:00Z',
+                          '2023-01-01T12:00:00Z', '2023-01-02T12:00:00Z'],
+            'write_time': pandas.to_datetime(['2023-02-01'] * 5, utc=True),
+            'is_deleted': [False, False, False, False, True]
+        })
+        self.entities = pandas.DataFrame({
+            'PassengerId': [1, 2, 1, 3, 2, 1],
+            'timestamp': pandas.to_datetime(['2023-01-02T06:00:00', '2023-01-02T00:00:00', '2022-12-31T00:00:00',
+                                             '2023-01-05T00:00:00', '2023-01-03T00:00:00', '2023-01-03T00:00:00'])
+        })
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_point_in_time(self):
+        """ Test every entity gets the last record at or before its timestamp, never a later one """
+        result = point_in_time_join(self.entities, self.records)
+
+        numpy.testing.assert_array_equal(result['fare'].to_numpy(), [20.0, 5.0, numpy.nan, numpy.nan, numpy.nan, 30.0])
+        self.assertEqual(result['EventTime'][0], '2023-01-02T00:00:00Z')
+        self.assertNotIn('write_time', result.columns)
+        pandas.testing.assert_frame_equal(result[self.entities.columns], self.entities)
+
+    def test_merge_asof_parity(self):
+        """ Test the join is the backward merge_asof by record identifier """
+        rng = numpy.random.default_rng(0)
+        records = pandas.DataFrame({'PassengerId': rng.integers(0, 50, 500), 'fare': rng.random(500),
+                                    'EventTime': pandas.Timestamp('2023-01-01')
+                                    + pandas.to_timedelta(rng.integers(0, 1000, 500), unit='h')})
+        records['EventTime'] = records['EventTime'].dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+        records = records.drop_duplicates(['PassengerId', 'EventTime'])
+        entities = pandas.DataFrame({'PassengerId': rng.integers(0, 60, 300),
+                                     'timestamp': pandas.Timestamp('2023-01-01')
+                                     + pandas.to_timedelta(rng.integers(0, 1200, 300), unit='h')})
+
+        result = point_in_time_join(entities, records, max_age=pandas.Timedelta('10D'))
+
+        expected = pandas.merge_asof(
+            entities.reset_index().sort_values('timestamp'),
+            records.assign(timestamp=pandas.to_datetime(records['EventTime']).dt.tz_localize(None))
+                   .sort_values('timestamp'),
+            on='timestamp', by='PassengerId', tolerance=pandas.Timedelta('10D')).set_index('index').sort_index()
+        numpy.testing.assert_array_equal(result['fare'].to_numpy(), expected['fare'].to_numpy())
+
+    def test_last_write_and_deleted(self):
+        """ Test the last written record is joined and the deleted records give no features """
+        rewritten = self.records.iloc[[1]].assign(fare=25.0, write_time=pandas.Timestamp('2023-03-01', tz='UTC'))
+        records = pandas.concat([rewritten, self.records], ignore_index=True)
+
+        result = point_in_time_join(self.entities.set_index('PassengerId'), records)
+
+        self.assertEqual(result.index.name, 'PassengerId')
+        self.assertEqual(result['fare'].iloc[0], 25.0)
+        self.assertTrue(numpy.isnan(result['fare'].iloc[4]))
+
+    def test_offline_store(self):
+        """ Test the records written by bulk_write are read back, pruning the later partitions """
+        bulk_write(self.records.drop(columns=['write_time', 'is_deleted']), self.tmp_dir.name, 'EventTime')
+
+        _, files = partition_files(self.tmp_dir.name, until=pandas.Timestamp('2023-01-02T05:00:00Z'))
+        self.assertEqual(len(files), 3)
+
+        records = read_offline_store(self.tmp_dir.name, record_ids=[1], features=['fare'])
+        self.assertEqual(sorted(records['fare']), [10.0, 20.0, 30.0])
+        self.assertIn('write_time', records.columns)
+
+        result = point_in_time_join(self.entities, records)
+        self.assertEqual(result['fare'].tolist()[0], 20.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+
+import numpy
+import pandas
+
+from feature_serving import FeatureIndex, FeatureService, LRUCache, ServingClient, ServingServer
+from local_feature_store import LocalFeatureStore, feature_definitions
+
+
+class TestFeatureServing(unittest.TestCase):
+
+    def setUp(self):
+        self.data = pandas.DataFrame({
+            'pclass': [3, 1, 2],
+            'fare': [7.25, None, 7.92],
+            'sex': ['male', 'female', None],
+            'age_group': pandas.Categorical(['adult', 'child', 'adult'])
+        }, index=pandas.Index([1, 2, 3], name='PassengerId'))
+        self.index = FeatureIndex(self.data)
+
+    def test_index(self):
+        """ Test the single and batch lookups give the indexed features, and nulls for the unknown identifiers """
+        self.assertEqual(self.index.get(2), {'pclass': 1, 'fare': None, 'sex': 'female', 'age_group': 'child'})
+        self.assertEqual(self.index.get('3', features=['sex']), {'sex': None})
+        self.assertIsNone(self.index.get(4))
+
+        batch, found = self.index.get_batch(['3', 4, 1])
+        self.assertEqual(found.tolist(), [True, False, True])
+        self.assertEqual(batch['age_group'].tolist(), ['adult', None, 'adult'])
+        numpy.testing.assert_array_equal(batch['pclass'].to_numpy(), [2, numpy.nan, 3])
+
+    def test_service_batch(self):
+        """ Test the batch lookups of the service give the records of the single lookups """
+        service = FeatureService(self.index)
+        record_ids = ['3', 4, 1, 2]
+
+        self.assertEqual(service.get_batch(record_ids), [service.get(record_id) for record_id in record_ids])
+        self.assertIsInstance(service.get_batch([4, 1])[1]['pclass'], int)
+        self.assertEqual(service.get_batch([4, 5]), [None, None])
+
+    def test_invalid_ids(self):
+        """ Test the identifiers that aren't integers are not indexed instead of failing the whole batch """
+        service = FeatureService(self.index)
+        record_ids = ['1', 'abc', '1.5', '', 3]
+
+        records = service.get_batch(record_ids)
+        _, found = self.index.get_batch(record_ids)
+
+        self.assertEqual(records, [service.get(1), None, None, None, service.get(3)])
+        self.assertEqual(found.tolist(), [True, False, False, False, True])
+        self.assertIsNone(self.index.get('abc'))
+
+    def test_from_records(self):
+        """ Test the latest not deleted record of every identifier is indexed """
+        records = pandas.DataFrame({
+            'PassengerId': [1, 1, 2, 2, 1],
+            'fare': [1.0, 3.0, 5.0, 6.0, 2.0],
+            'EventTime': ['2023-01-01T00:00:00Z', '2023-01-03T00:00:00Z', '2023-01-01T00:00:00Z',
+                          '2023-01-02T00:00:00Z', '2023-01-02T00:00:00Z'],
+            'write_time': pandas.to_datetime(['2023-02-01'] * 5, utc=True),
+            'is_deleted': [False, False, False, True, False]
+        })
+
+        index = FeatureIndex.from_records(records)
+
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.get(1), {'fare': 3.0, 'EventTime': '2023-01-03T00:00:00Z'})
+
+    def test_lru_cache(self):
+        """ Test the least recently used and the expired entries are evicted """
+        now = [0.0]
+        cache = LRUCache(maxsize=2, ttl=10, clock=lambda: now[0])
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+
+        now[0] = 11
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual((cache.hits, cache.misses), (3, 2))
+
+    def test_fallback(self):
+        """ Test the records not indexed are read through the client once and then from the cache """
+        store = LocalFeatureStore()
+        records = pandas.DataFrame({'PassengerId': [4], 'fare': [9.5], 'EventTime': ['2023-01-01T00:00:00Z']})
+        store.create_feature_group(FeatureGroupName='titanic', RecordIdentifierFeatureName='PassengerId',
+                                   EventTimeFeatureName='EventTime', FeatureDefinitions=feature_definitions(records))
+        store.put_record(FeatureGroupName='titanic',
+                         Record=[{'FeatureName': name, 'ValueAsString': str(value)}
+                                 for name, value in records.iloc[0].items()])
+        service = FeatureService(self.index, client=store, feature_group_name='titanic')
+
+        for _ in range(2):
+            records = service.get_batch([1, 4, 5])
+            self.assertEqual(records[1]['fare'], '9.5')
+            self.assertIsNone(records[2])
+
+        self.assertEqual(records[0]['pclass'], 3)
+        self.assertEqual(service.stats()['fallback_calls'], 2)
+
+    def test_server(self):
+        """ Test the lookups through the TCP endpoint """
+        with ServingServer(FeatureService(self.index)) as server, ServingClient(server.address) as client:
+            self.assertEqual(client.get(1)['sex'], 'male')
+            self.assertEqual(client.get_batch([3, 5]), [self.index.get(3), None])
+            self.assertEqual(client.stats()['indexed'], 3)
+            self.assertIsNone(client.get('x'))
+            self.assertEqual(client.get_batch(['x', '3']), [None, self.index.get(3)])
+            with self.assertRaisesRegex(Exception, 'TypeError'):
+                client.get([1])
+
+
+if __name__ == '__main__':
+    unittest.main()
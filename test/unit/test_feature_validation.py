@@ -0,0 +1,127 @@
+import unittest
+
+import pandas
+import pandera
+
+from feature_validation import (SCHEMA, FeatureValidationError, ValidationStats, pandera_schema, reservoir_sample,
+                                sample_size, sampled_validate, stratified_sample, validate_features)
+
+
+class FeaturesTestCase(unittest.TestCase):
+    """ Valid features and the same features with invalid values in some columns """
+
+    def setUp(self):
+        self.data = pandas.DataFrame({
+            'survived': [0, 1, 1, 0],
+            'sex': ['male', 'female', 'female', 'male'],
+            'pclass': [3, 1, 3, 2],
+            'age_group': pandas.Categorical(['young adult', 'adult', None, 'adult']),
+            'sibsp': [1, 1, 0, 0],
+            'alone': ['no', 'no', 'yes', 'yes'],
+            'parch': [0, 0, 0, 0],
+            'fare': [725.0, 7128.33, 792.5, 5310.0],
+            'embarked': ['S', 'C', None, 'Q'],
+            'hours_traveling': [108.0, 102.0, None, 85.0]
+        })
+
+        self.invalid = self.data.copy()
+        self.invalid['sibsp'] = [6, 1, 9, 0]
+        self.invalid['alone'] = ['no', 'maybe', 'yes', 'yes']
+        self.invalid['fare'] = [725.0, -1.0, 792.5, 60000.0]
+
+
+class TestValidateFeatures(FeaturesTestCase):
+
+    def test_valid(self):
+        """ Test valid features pass both the engine and the reference pandera schema """
+        self.assertTrue(SCHEMA.validate(self.data).empty, 'Valid features failed')
+        pandera_schema().validate(self.data)
+
+    def test_same_as_pandera(self):
+        """ Test the columns failing are the ones failing the reference pandera schema """
+        with self.assertRaises(pandera.errors.SchemaErrors) as context:
+            pandera_schema().validate(self.invalid, lazy=True)
+        expected = set(context.exception.failure_cases['column'].dropna())
+
+        self.assertEqual(set(SCHEMA.validate(self.invalid, fail_fast=False)['column']), expected)
+
+    def test_fail_fast(self):
+        """ Test fail fast mode stops at the first column failing """
+        report = SCHEMA.validate(self.invalid, fail_fast=True)
+        self.assertEqual(report['column'].unique().tolist(), ['sibsp'])
+
+    def test_collect(self):
+        """ Test collect mode reports every failed check with its failing values """
+        report = SCHEMA.validate(self.invalid, fail_fast=False).set_index(['column', 'check'])
+
+        self.assertEqual(report.loc[('sibsp', 'in_range(0, 8)'), 'failure_cases'], [9])
+        self.assertEqual(report.loc[('sibsp', 'notin([6, 7])'), 'failure_cases'], [6])
+        self.assertEqual(report.loc[('fare', 'in_range(0.0, 60000.0)'), 'n_failures'], 2)
+        self.assertEqual(report.loc[('alone', "isin(['yes', 'no'])"), 'failure_cases'], ['maybe'])
+
+    def test_step_raises(self):
+        """ Test the step raises with the report """
+        with self.assertRaises(FeatureValidationError):
+            validate_features.step(data=self.invalid)
+
+
+class TestStreamingValidation(FeaturesTestCase):
+
+    def test_same_as_full(self):
+        """ Test the statistics merged chunk by chunk give the same report as the whole data """
+        stats = ValidationStats()
+        for start in range(0, len(self.invalid), 3):
+            stats.update(self.invalid.iloc[start:start + 3])
+
+        pandas.testing.assert_frame_equal(stats.report(fail_fast=False), SCHEMA.validate(self.invalid, fail_fast=False))
+
+    def test_valid(self):
+        """ Test valid features split in chunks pass, even if no chunk has all the unique values """
+        stats = ValidationStats()
+        for start in range(len(self.data)):
+            stats.update(self.data.iloc[[start]])
+
+        self.assertTrue(stats.report().empty, 'Valid features failed')
+
+
+class TestSampledValidation(FeaturesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.data = self.data.sample(n=10_000, replace=True, random_state=0, ignore_index=True)
+
+    def test_sample_size(self):
+        """ Test the sample detects 0.1% of invalid rows with a 99% confidence """
+        n_rows = sample_size(confidence=0.99, tolerance=0.001)
+        self.assertGreaterEqual(1 - 0.999 ** n_rows, 0.99)
+        self.assertLess(1 - 0.999 ** (n_rows - 1), 0.99)
+
+    def test_stratified_sample(self):
+        """ Test a value appearing in a single row is sampled """
+        self.data.loc[1234, 'sex'] = 'other'
+        sample = stratified_sample(self.data, n_rows=10, strata=['survived', 'sex'], seed=0)
+
+        self.assertIn(1234, sample.index)
+        self.assertEqual(set(sample['sex']), {'male', 'female', 'other'})
+
+    def test_reservoir_sample(self):
+        """ Test the reservoir sample of a stream of chunks has the requested size """
+        chunks = (self.data.iloc[start:start + 1000] for start in range(0, len(self.data), 1000))
+        sample = reservoir_sample(chunks, n_rows=500, seed=0)
+
+        self.assertEqual(len(sample), 500)
+        self.assertTrue(sample.index.isin(self.data.index).all())
+
+    def test_full_validation_on_failure(self):
+        """ Test the whole data is validated when the sample fails """
+        self.assertTrue(sampled_validate(self.data).empty, 'Valid features failed')
+
+        self.data.loc[77, 'sex'] = 'other'
+        report = sampled_validate(self.data, fail_fast=False)
+
+        self.assertEqual(report['column'].tolist(), ['sex'])
+        self.assertEqual(report['failure_cases'][0], ['other'])
+
+
+if __name__ == '__main__':
+    unittest.main()
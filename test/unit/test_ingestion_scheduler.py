@@ -0,0 +1,43 @@
+import unittest
+
+import pandas
+
+from ingestion_scheduler import IngestionScheduler, balanced_batches, plan_concurrency
+
+
+class TestPlanConcurrency(unittest.TestCase):
+
+    def test_small_dataset(self):
+        """ Test small datasets get at least one process and one worker """
+        self.assertEqual(plan_concurrency(n_rows=10, record_latency=0.02, record_cpu_time=0.001, n_cpus=8), (1, 1))
+
+    def test_latency_bound(self):
+        """ Test the workers cover the time records wait for the network, bounded by the CPUs """
+        n_processes, n_workers = plan_concurrency(n_rows=10 ** 6, record_latency=0.02, record_cpu_time=0.001,
+                                                  n_cpus=4)
+        self.assertEqual((n_processes, n_workers), (4, 20))
+
+    def test_overrides(self):
+        """ Test explicit maximums are respected """
+        self.assertEqual(plan_concurrency(n_rows=10 ** 6, record_latency=0.02, record_cpu_time=0.001, n_cpus=4,
+                                          max_workers=5, max_processes=2), (2, 5))
+
+
+class TestIngestionScheduler(unittest.TestCase):
+
+    def test_balanced_batches(self):
+        """ Test batches cover all the rows with balanced sizes """
+        batches = balanced_batches(pandas.DataFrame({'a': range(10)}), 3)
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 4])
+
+    def test_adaptation(self):
+        """ Test workers increase while the throughput improves and back off when it drops """
+        scheduler = IngestionScheduler(n_rows=10 ** 6, n_cpus=1)
+        scheduler.calibrate(n_rows=100, wall_time=1.0, cpu_time=0.125)
+
+        self.assertEqual(scheduler.observe(n_rows=1000, wall_time=1.0), (1, 10))
+        self.assertEqual(scheduler.observe(n_rows=500, wall_time=1.0), (1, 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
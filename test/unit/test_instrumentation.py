@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import numpy
+
+from instrumentation import StepMetrics, profiled, write_metrics
+
+
+class TestStepMetrics(unittest.TestCase):
+
+    def test_nested_phases(self):
+        """ Test the time of a nested phase is not counted in the outer phase """
+        metrics = StepMetrics()
+        with metrics:
+            with metrics.phase('write'):
+                with metrics.phase('read'):
+                    time.sleep(0.05)
+
+        self.assertGreaterEqual(metrics.phases['read'], 0.05)
+        self.assertLess(metrics.phases['write'], 0.05)
+        self.assertGreaterEqual(metrics.seconds, 0.05)
+
+    def test_timed(self):
+        """ Test the time spent getting every item is counted and the items are kept """
+        def slow_items():
+            for item in range(3):
+                time.sleep(0.01)
+                yield item
+
+        metrics = StepMetrics()
+        self.assertEqual(list(metrics.timed('read', slow_items())), [0, 1, 2])
+        self.assertGreaterEqual(metrics.phases['read'], 0.03)
+
+    def test_trace_memory(self):
+        """ Test the peak memory allocated in the step is traced """
+        with StepMetrics(trace_memory=True) as metrics:
+            buffer = bytearray(8 * 2 ** 20)
+        del buffer
+
+        self.assertGreaterEqual(metrics.as_dict()['traced_peak_mb'], 8)
+
+    @unittest.skipUnless(os.path.exists('/proc/self/clear_refs'), 'The peak memory can only be reset on Linux')
+    def test_peak_per_step(self):
+        """ Test the peak resident memory of a step is not the peak of a previous step """
+        with StepMetrics() as first:
+            buffer = numpy.ones(8 * 2 ** 20)
+        del buffer
+
+        with StepMetrics() as second:
+            pass
+
+        self.assertGreaterEqual(first.rss_peak - first.rss_start, 32 * 2 ** 20)
+        self.assertLess(second.rss_peak, first.rss_peak)
+
+
+class TestWriteMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def metrics(self, step_name, seconds):
+        metrics = StepMetrics(step_name=step_name)
+        metrics.seconds = seconds
+        return metrics.as_dict()
+
+    def test_json_lines(self):
+        """ Test the metrics of every step are appended as a JSON line """
+        path = os.path.join(self.tmp_dir.name, 'metrics.jsonl')
+        write_metrics(self.metrics('Data Wrangling', 1.0), path)
+        write_metrics(self.metrics('Data Wrangling', 2.0), path)
+
+        with open(path) as file:
+            self.assertEqual([json.loads(line)['seconds'] for line in file], [1.0, 2.0])
+
+    def test_prometheus(self):
+        """ Test the metrics of a step replace its previous ones in the Prometheus textfile """
+        path = os.path.join(self.tmp_dir.name, 'metrics.prom')
+        write_metrics(self.metrics('Data Wrangling', 1.0), path)
+        write_metrics(self.metrics('Features Processing', 3.0), path)
+        write_metrics(self.metrics('Data Wrangling', 2.0), path)
+
+        with open(path) as file:
+            lines = [line for line in file if line.startswith('pipeline_step_seconds')]
+
+        self.assertEqual(sorted(lines), ['pipeline_step_seconds{step="Data Wrangling"} 2.0\n',
+                                         'pipeline_step_seconds{step="Features Processing"} 3.0\n'])
+
+    def test_profile(self):
+        """ Test the profile of a step is written to the profile directory """
+        args = argparse.Namespace(step_name='Data Wrangling', profile='cprofile', profile_dir=self.tmp_dir.name,
+                                  data_path=None)
+        with profiled(args):
+            sum(range(1000))
+
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, 'data_wrangling.prof')))
+
+
+if __name__ == '__main__':
+    unittest.main()
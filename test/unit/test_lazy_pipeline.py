@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+import pandas
+
+from data_io import write_data
+from data_wrangling import wrangle
+from feature_processing import process_features
+from feature_validation import FeatureValidationError, validate_features
+from lazy_pipeline import LazyFrame, feature_pipeline, parse_predicate
+
+
+class TestLazyPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data = pandas.DataFrame({
+            'PassengerId': [1, 2, 3, 4, 5, 6],
+            'Survived': [0, 1, 1, 0, 1, 0],
+            'Pclass': [3, 1, 3, 2, 1, 3],
+            'Name': ['Braund', 'Cumings', 'Heikkinen', 'Futrelle', 'Allen', 'Moran'],
+            'Sex': ['male', 'female', 'female', 'male', 'female', 'male'],
+            'Age': [22.0, 38.0, None, 4.0, 15.0, 70.0],
+            'SibSp': [1, 1, 0, 0, 0, 0],
+            'Parch': [0, 0, 0, 2, 0, 0],
+            'Ticket': ['A/5 21171', 'PC 17599', '', '113803', '373450', '330877'],
+            'Fare': [7.25, 71.2833, 7.925, 53.1, 8.05, 8.4583],
+            'Cabin': ['', 'C85', '', 'C123', 'nan', ''],
+            'Embarked': ['S', 'C', 'nan', 'Q', 'S', 'C']
+        }).set_index('PassengerId')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, file_format: str) -> str:
+        path = os.path.join(self.tmp_dir.name, f'raw.{file_format}')
+        write_data(self.data, path)
+        return path
+
+    def eager(self) -> pandas.DataFrame:
+        return validate_features.step(process_features.step(wrangle.step(self.data.copy())))
+
+    def test_same_as_eager(self):
+        """ Test the lazy plan gives the dataset of the eager steps, in every format and batch size """
+        for file_format in ['csv', 'parquet', 'feather', 'mmap']:
+            frame = feature_pipeline(self.write(file_format))
+            for chunk_size in [2, 100]:
+                pandas.testing.assert_frame_equal(frame.collect(workers=2, chunk_size=chunk_size), self.eager(),
+                                                  check_dtype=file_format not in ('csv', 'mmap'))
+
+    def test_filters(self):
+        """ Test the filters give the rows of the eager dataset, on the input columns and on the features """
+        frame = feature_pipeline(self.write('parquet'), where=['pclass in 1,3', 'alone == "yes"'])
+        frame = frame.filter(~frame['embarked'].is_null())
+
+        expected = self.eager()
+        expected = expected[expected['pclass'].isin([1, 3]) & (expected['alone'] == 'yes')
+                            & expected['embarked'].notna()]
+        pandas.testing.assert_frame_equal(frame.collect(chunk_size=2), expected)
+
+        # The fare is compared after its scaling, no row is kept
+        frame = feature_pipeline(self.write('parquet'), validate=False)
+        self.assertTrue(frame.filter(frame['fare'] > 8000).collect().empty)
+
+    def test_plan(self):
+        """ Test the projection, the predicates pushed down and the shared subexpressions """
+        frame = feature_pipeline(self.write('parquet'), validate=False)
+        frame = frame.filter(parse_predicate('pclass == 1', frame) & (frame['age_group'] == 'adult'))
+        plan = frame.optimize()
+
+        self.assertEqual(plan.read_columns, ['Survived', 'Pclass', 'Sex', 'Age', 'SibSp', 'Parch', 'Fare', 'Embarked'])
+        self.assertEqual(str(plan.pushed), '(Pclass == 1)')
+        self.assertEqual(len(plan.shared), 1)
+        self.assertEqual(frame.collect().index.tolist(), [2])
+
+        # Only the inputs of the selected columns are read
+        frame = LazyFrame.scan(self.write('feather')).drop(['Name', 'Ticket', 'Cabin', 'Age', 'Fare'])
+        self.assertNotIn('Age', frame.optimize().read_columns)
+
+        with self.assertRaises(ValueError):
+            parse_predicate('pclass', frame)
+
+    def test_validation(self):
+        """ Test the collected dataset is validated across the batches """
+        self.data.loc[6, 'Pclass'] = 7
+
+        with self.assertRaisesRegex(FeatureValidationError, 'pclass'):
+            feature_pipeline(self.write('parquet')).collect(chunk_size=2)
+
+        self.assertEqual(len(feature_pipeline(self.write('parquet'), validate=False).collect()), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+import boto3
+import pandas
+
+from async_ingestion import async_ingest
+from local_feature_store import FeatureStoreServer, LocalFeatureStore, SQLiteBackend, StoreError, feature_definitions
+
+
+def record(record_id, event_time, fare):
+    return [{'FeatureName': 'PassengerId', 'ValueAsString': record_id},
+            {'FeatureName': 'EventTime', 'ValueAsString': event_time},
+            {'FeatureName': 'fare', 'ValueAsString': fare}]
+
+
+class TestLocalFeatureStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data = pandas.DataFrame({'PassengerId': [1, 2, 3], 'fare': [7.25, None, 7.92],
+                                      'EventTime': ['2023-01-01T00:00:00Z'] * 3})
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create(self, store):
+        store.create_feature_group(FeatureGroupName='titanic', RecordIdentifierFeatureName='PassengerId',
+                                   EventTimeFeatureName='EventTime', FeatureDefinitions=feature_definitions(self.data))
+        return store
+
+    def test_event_time(self):
+        """ Test a record is only replaced by a record with a later event time, in both backends """
+        for backend in [None, SQLiteBackend(os.path.join(self.tmp_dir.name, 'store.db'))]:
+            store = self.create(LocalFeatureStore(backend=backend))
+            store.put_record(FeatureGroupName='titanic', Record=record('1', '2023-01-02T00:00:00Z', '8.0'))
+            store.put_record(FeatureGroupName='titanic', Record=record('1', '2023-01-01T00:00:00Z', '7.0'))
+
+            result = store.get_record(FeatureGroupName='titanic', RecordIdentifierValueAsString='1',
+                                      FeatureNames=['fare'])
+            self.assertEqual(result['Record'], [{'FeatureName': 'fare', 'ValueAsString': '8.0'}])
+            self.assertEqual(store.get_record(FeatureGroupName='titanic', RecordIdentifierValueAsString='2'), {})
+
+    def test_errors(self):
+        """ Test the unknown feature groups, the invalid records and the throttled calls are rejected """
+        store = self.create(LocalFeatureStore(max_rps=1))
+
+        with self.assertRaisesRegex(StoreError, 'ValidationError'):
+            store.put_record(FeatureGroupName='titanic', Record=record('1', '2023', '7.0')[:1])
+        with self.assertRaisesRegex(StoreError, 'ThrottlingException'):
+            store.describe_feature_group(FeatureGroupName='titanic')
+
+        store.throttle = None
+        with self.assertRaisesRegex(StoreError, 'ResourceNotFound'):
+            store.describe_feature_group(FeatureGroupName='unknown')
+
+    @mock.patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'local', 'AWS_SECRET_ACCESS_KEY': 'local'})
+    def test_server(self):
+        """ Test the boto3 clients and the async ingestion work against the server """
+        store = self.create(LocalFeatureStore())
+
+        with FeatureStoreServer(store) as server:
+            session = boto3.session.Session(region_name='eu-west-1')
+            description = session.client('sagemaker', endpoint_url=server.endpoint_url).describe_feature_group(
+                FeatureGroupName='titanic')
+            self.assertEqual(description['EventTimeFeatureName'], 'EventTime')
+
+            report = async_ingest(self.data.astype(str), feature_group_name='titanic', region='eu-west-1',
+                                  endpoint_url=server.endpoint_url)
+            self.assertEqual(report['ingested'], 3)
+
+            runtime = session.client('sagemaker-featurestore-runtime', endpoint_url=server.endpoint_url)
+            result = runtime.get_record(FeatureGroupName='titanic', RecordIdentifierValueAsString='3')
+            self.assertIn({'FeatureName': 'fare', 'ValueAsString': '7.92'}, result['Record'])
+
+        self.assertEqual(store.latency_report()['put_calls'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
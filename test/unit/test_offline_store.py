@@ -0,0 +1,51 @@
+import glob
+import os
+import tempfile
+import unittest
+
+import pandas
+
+from offline_store import bulk_write, event_hours, partition_path
+
+
+class TestOfflineStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data = pandas.DataFrame({
+            'PassengerId': [1, 2, 3, 4, 5],
+            'fare': [7.25, None, 7.92, 53.1, 8.05],
+            'EventTime': pandas.array(['2023-01-02T10:15:00Z', '2023-01-01T23:59:59Z', '2023-01-02T10:00:00Z',
+                                       '2023-01-02T10:30:00Z', '2023-01-02T10:45:00Z'], dtype='string')
+        })
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_layout(self):
+        """ Test the records are written to the hourly partitions of their event time """
+        report = bulk_write(self.data, self.tmp_dir.name, 'EventTime', rows_per_file=3, max_workers=2)
+
+        self.assertEqual((report['rows'], report['partitions'], report['files']), (5, 2, 3))
+
+        files = glob.glob(os.path.join(self.tmp_dir.name, '**', '*.parquet'), recursive=True)
+        partition = os.path.join(self.tmp_dir.name, 'year=2023/month=01/day=01/hour=23')
+        self.assertEqual([os.path.dirname(path) for path in files].count(partition), 1)
+        self.assertEqual(pandas.read_parquet(partition)['PassengerId'].tolist(), [2])
+
+        result = pandas.concat(map(pandas.read_parquet, files)).sort_values('PassengerId', ignore_index=True)
+        pandas.testing.assert_frame_equal(result[self.data.columns], self.data, check_dtype=False)
+        self.assertFalse(result['is_deleted'].any())
+        self.assertEqual(result['write_time'].nunique(), 1)
+
+    def test_event_hours(self):
+        """ Test string and numeric event times give the same partitions """
+        seconds = pandas.to_datetime(self.data['EventTime']).map(pandas.Timestamp.timestamp)
+
+        self.assertEqual(event_hours(self.data['EventTime']).tolist(), event_hours(seconds).tolist())
+        self.assertEqual(partition_path(event_hours(self.data['EventTime'])[0]),
+                         'year=2023/month=01/day=02/hour=10')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+import pandas
+
+from feature_processing import process_features
+from feature_validation import validate_features
+from parallel import available_cpus, run_partitioned
+
+
+class TestRunPartitioned(unittest.TestCase):
+
+    def setUp(self):
+        self.data = pandas.DataFrame({
+            'PassengerId': [7, 3, 9, 1, 5, 2, 8, 4],
+            'age': [22.0, 38.0, None, 35.0, 2.0, 14.0, 70.0, 45.0],
+            'embarked': ['S', 'C', 'Q', 'S', None, 'C', 'S', 'Q'],
+            'sibsp': [1, 0, 0, 1, 3, 0, 0, 1],
+            'parch': [0, 0, 0, 0, 2, 0, 0, 1],
+            'fare': [7.25, 71.28, 7.92, 53.1, 21.07, 30.07, 7.75, 26.0]
+        }).set_index('PassengerId')
+
+    def test_same_result(self):
+        """ Test the partitioned result is the serial one, in the original order """
+        expected = process_features.step(data=self.data.copy())
+        result = run_partitioned(process_features, data=self.data.copy(), n_workers=3, min_partition_rows=2)
+
+        pandas.testing.assert_frame_equal(result, expected)
+
+    def test_row_local_guard(self):
+        """ Test steps not declared row-local are not partitioned """
+        self.assertRaises(ValueError, run_partitioned, validate_features, data=self.data, n_workers=2)
+
+    def test_available_cpus(self):
+        """ Test at least one CPU is available """
+        self.assertGreaterEqual(available_cpus(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import unittest
+import warnings
+
+from pipeline import build_pipeline, open_session
+
+
+class TestBuildPipeline(unittest.TestCase):
+
+    def setUp(self):
+        with warnings.catch_warnings():
+            # The pipeline session warns the jobs aren't started when the steps are defined
+            warnings.simplefilter('ignore', UserWarning)
+            session = open_session(local=True)
+            self.pipeline = build_pipeline(session, input_data='file:///data/titanic.csv',
+                                           output_uri='file:///data/pipeline', source_uri='file:///code',
+                                           image_uri='titanic-featuregroup:latest')
+            self.definition = json.loads(self.pipeline.definition())
+        self.steps = {step['Name']: step for step in self.definition['Steps']}
+
+    def _inputs(self, step_name):
+        return {processing_input['InputName']: processing_input['S3Input']['S3Uri']
+                for processing_input in self.steps[step_name]['Arguments']['ProcessingInputs']}
+
+    def _outputs(self, step_name):
+        config = self.steps[step_name]['Arguments'].get('ProcessingOutputConfig', {'Outputs': []})
+        return [output['OutputName'] for output in config['Outputs']]
+
+    def _arguments(self, step_name):
+        return self.steps[step_name]['Arguments']['AppSpecification']['ContainerArguments']
+
+    def test_steps(self):
+        """ Test the steps of the pipeline and their order """
+        self.assertEqual(list(self.steps),
+                         ['WrangleData', 'FeatureEngineering', 'FeatureValidation', 'IngestFeatureGroup'])
+        self.assertEqual({name: step.get('DependsOn') for name, step in self.steps.items()},
+                         {'WrangleData': None, 'FeatureEngineering': None, 'FeatureValidation': None,
+                          'IngestFeatureGroup': ['FeatureValidation']})
+
+    def test_inputs_outputs(self):
+        """ Test every step reads the output of the step before it """
+        self.assertEqual(self._inputs('WrangleData'),
+                         {'code': {'Get': 'Parameters.SourceUri'}, 'input': {'Get': 'Parameters.InputData'}})
+        processed = {'Get': "Steps.FeatureEngineering.ProcessingOutputConfig.Outputs['processed_features']"
+                            ".S3Output.S3Uri"}
+        self.assertEqual(self._inputs('FeatureEngineering')['input'],
+                         {'Get': "Steps.WrangleData.ProcessingOutputConfig.Outputs['wrangled_data'].S3Output.S3Uri"})
+        self.assertEqual(self._inputs('FeatureValidation')['input'], processed)
+        self.assertEqual(self._inputs('IngestFeatureGroup')['input'], processed)
+
+        self.assertEqual({name: self._outputs(name) for name in self.steps},
+                         {'WrangleData': ['wrangled_data'], 'FeatureEngineering': ['processed_features'],
+                          'FeatureValidation': [], 'IngestFeatureGroup': []})
+
+        self.assertIn('input/titanic.csv', self._arguments('WrangleData'))
+        self.assertIn('output/wrangled_data.mmap', self._arguments('WrangleData'))
+        self.assertIn('input/wrangled_data.mmap', self._arguments('FeatureEngineering'))
+        self.assertIn('input/processed_features.mmap', self._arguments('IngestFeatureGroup'))
+
+    def test_cache(self):
+        """ Test the ingestion is never reused from a previous execution """
+        self.assertEqual({name: step.get('CacheConfig', {}).get('Enabled', False)
+                          for name, step in self.steps.items()},
+                         {'WrangleData': True, 'FeatureEngineering': True, 'FeatureValidation': True,
+                          'IngestFeatureGroup': False})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import argparse
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+import pandas
+
+from data_io import read_data
+from feature_validation import validate_file
+from pipeline_runner import run_pipeline
+
+
+class TestRunPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data = pandas.DataFrame({
+            'PassengerId': [1, 2, 3, 4],
+            'Survived': [0, 1, 1, 0],
+            'Pclass': [3, 1, 3, 2],
+            'Name': ['Braund', 'Cumings', 'Heikkinen', 'Futrelle'],
+            'Sex': ['male', 'female', 'female', 'male'],
+            'Age': [22.0, 38.0, None, 35.0],
+            'SibSp': [1, 1, 0, 0],
+            'Parch': [0, 0, 0, 0],
+            'Ticket': ['A/5 21171', 'PC 17599', '', '113803'],
+            'Fare': [7.25, 71.2833, 7.925, 53.1],
+            'Cabin': ['', 'C85', '', 'C123'],
+            'Embarked': ['S', 'C', 'S', 'Q']
+        }).set_index('PassengerId')
+
+        self.args = argparse.Namespace(data_path=self.tmp_dir.name, input_file=None, output_file=None,
+                                       file_format=None, columns=None, spill=False, fg_name=None,
+                                       region='eu-west-1', step_name='pipeline')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_in_memory(self):
+        """ Test the steps are chained in memory without intermediate files """
+        result = run_pipeline(args=self.args, data=self.data.copy())
+
+        self.assertIn('age_group', result.columns, 'Features were not processed')
+        self.assertNotIn('cabin', result.columns, 'Data was not wrangled')
+        self.assertEqual(os.listdir(self.tmp_dir.name), [], 'Intermediate files were written')
+
+    def test_spill(self):
+        """ Test intermediate results are written when requested """
+        self.args.spill = True
+        run_pipeline(args=self.args, data=self.data.copy())
+
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)),
+                         ['processed_features.parquet', 'wrangled_data.parquet'],
+                         'Intermediate files were not written')
+
+    def test_chunked(self):
+        """ Test the streamed steps pass their result to the next step through a temporary file """
+        self.data.to_csv(os.path.join(self.tmp_dir.name, 'titanic.csv'))
+        self.args.input_file = 'titanic.csv'
+        expected = run_pipeline(args=self.args, data=self.data.copy())
+
+        self.args.chunk_size = 3
+        self.args.output_file = 'features.parquet'
+        with mock.patch('pipeline_runner.validate_file', wraps=validate_file) as streamed_validation:
+            self.assertIsNone(run_pipeline(args=self.args))
+
+        streamed_validation.assert_called_once()
+        pandas.testing.assert_frame_equal(read_data(os.path.join(self.tmp_dir.name, 'features.parquet')), expected,
+                                          check_dtype=False)
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)), ['features.parquet', 'titanic.csv'],
+                         'Temporary files were not removed')
+
+    def test_lazy(self):
+        """ Test the lazy mode gives the features of the eager steps """
+        self.data.to_csv(os.path.join(self.tmp_dir.name, 'titanic.csv'))
+        self.args.input_file = 'titanic.csv'
+        self.args.lazy = True
+
+        pandas.testing.assert_frame_equal(run_pipeline(args=self.args),
+                                          run_pipeline(args=self.args, data=self.data.copy()))
+
+
+if __name__ == '__main__':
+    unittest.main()
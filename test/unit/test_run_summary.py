@@ -0,0 +1,76 @@
+import unittest
+
+import numpy
+import pandas
+
+from run_summary import RunSummary
+from sketches import HyperLogLog, TDigest
+
+
+class TestRunSummary(unittest.TestCase):
+
+    def setUp(self):
+        self.data = pandas.DataFrame({
+            'survived': [0, 1, 1, 0, 1, 0],
+            'sex': pandas.Categorical(['male', 'female', None, 'male', 'male', 'female']),
+            'fare': [7.25, None, 7.925, 53.1, 8.05, 8.4583],
+            'embarked': ['S', 'C', None, 'S', 'Q', 'S'],
+        })
+
+    def test_same_as_pandas(self):
+        """ Test the null counts and column stats are the ones of pandas """
+        summary = RunSummary().update(self.data).as_dict(total_time=0)
+
+        self.assertEqual(summary['%nan_values'], round(self.data.isna().sum().sum() / self.data.size * 100, 2))
+        self.assertEqual({col: stats['nulls'] for col, stats in summary['columns'].items()},
+                         self.data.isna().sum().to_dict())
+        self.assertEqual(summary['columns']['fare']['min'], self.data['fare'].min())
+        self.assertEqual(summary['columns']['fare']['mean'], round(self.data['fare'].mean(), 4))
+
+    def test_merge(self):
+        """ Test merging the summaries of two chunks matches the summary of the whole data """
+        full = RunSummary(sketches=True).update(self.data).as_dict(total_time=0)
+        merged = RunSummary(sketches=True).update(self.data.iloc[:3]).merge(
+            RunSummary(sketches=True).update(self.data.iloc[3:])).as_dict(total_time=0)
+
+        for key in ['n_samples', '%nan_values', 'prop_target', 'features', 'columns']:
+            self.assertEqual(full[key], merged[key], f'Summary {key} differs when merged')
+
+    def test_target_column(self):
+        """ Test the target is configurable and data without it is summarized """
+        summary = RunSummary(target_column='embarked').update(self.data).as_dict(total_time=0)
+        self.assertAlmostEqual(summary['prop_target']['S'], 0.5)
+
+        summary = RunSummary().update(self.data.drop(columns=['survived'])).as_dict(total_time=0)
+        self.assertEqual(summary['prop_target'], {})
+
+
+class TestSketches(unittest.TestCase):
+
+    def test_hyperloglog(self):
+        """ Test the distinct count estimate is within a few standard errors """
+        values = numpy.random.default_rng(0).integers(0, 50_000, 200_000)
+        chunks = numpy.array_split(values, 4)
+
+        sketch = HyperLogLog().update(chunks[0])
+        for chunk in chunks[1:]:
+            sketch.merge(HyperLogLog().update(chunk))
+
+        self.assertLess(abs(sketch.count() / len(numpy.unique(values)) - 1), 0.03)
+        self.assertEqual(HyperLogLog().update(pandas.Series(['a', 'b', None, 'a'])).count(), 2)
+
+    def test_tdigest(self):
+        """ Test the quantile estimates are close to the exact quantiles """
+        values = numpy.random.default_rng(0).normal(size=100_000)
+
+        sketch = TDigest()
+        for chunk in numpy.array_split(values, 10):
+            sketch.update(chunk)
+
+        for q in [0.01, 0.5, 0.99]:
+            self.assertAlmostEqual(sketch.quantile(q), numpy.quantile(values, q), delta=0.02)
+        self.assertEqual(sketch.quantile(0), values.min())
+
+
+if __name__ == '__main__':
+    unittest.main()
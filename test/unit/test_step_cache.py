@@ -0,0 +1,102 @@
+import argparse
+import inspect
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+import pandas
+
+import feature_registry
+
+from data_wrangling import wrangle
+from feature_processing import process_features
+from feature_validation import FeatureValidationError, validate_features
+from step_cache import StepCache
+from utils import cached_step
+
+
+class TestStepCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = StepCache(cache_dir=self.tmp_dir.name)
+        self.data = pandas.DataFrame({
+            'PassengerId': [1, 2, 3],
+            'Age': [22.0, None, 35.0]
+        }).set_index('PassengerId')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key(self):
+        """ Test the key only changes with the data or the arguments affecting the result """
+        key = self.cache.key(wrangle.step, self.data, {'output_file': 'a.csv'})
+
+        self.assertEqual(key, self.cache.key(wrangle.step, self.data.copy(), {'output_file': 'b.csv'}),
+                         'Key changed with an argument not affecting the result')
+        self.assertNotEqual(key, self.cache.key(wrangle.step, self.data.iloc[:2], {'output_file': 'a.csv'}),
+                            'Key did not change with the data')
+        self.assertNotEqual(key, self.cache.key(wrangle.step, self.data, {'region': 'eu-west-2'}),
+                            'Key did not change with the arguments')
+
+    def test_key_imported_source(self):
+        """ Test the key changes with the source of the modules imported by the step, like the feature registry """
+        key = self.cache.key(process_features.step, self.data, {})
+        get_source = inspect.getsource
+
+        def edited_source(obj):
+            return get_source(obj) + ('# edited\n' if obj is feature_registry else '')
+
+        with mock.patch('inspect.getsource', side_effect=edited_source):
+            self.assertNotEqual(key, self.cache.key(process_features.step, self.data, {}),
+                                'Key did not change with the feature registry')
+
+    def test_hit_and_miss(self):
+        """ Test stored results are returned and counted """
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.put('key', self.data)
+
+        pandas.testing.assert_frame_equal(self.cache.get('key'), self.data)
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_eviction(self):
+        """ Test the least recently used entries are evicted when the cache is full """
+        self.cache.put('old', self.data)
+        os.utime(os.path.join(self.tmp_dir.name, 'old.parquet'), (0, 0))
+        self.cache.max_bytes = os.path.getsize(os.path.join(self.tmp_dir.name, 'old.parquet'))
+        self.cache.put('new', self.data)
+
+        self.assertEqual(os.listdir(self.tmp_dir.name), ['new.parquet'], 'Least recently used entry not evicted')
+
+    def test_validation_mode(self):
+        """ Test a result validated on a sample is not reused by a validation of all the rows """
+        features = pandas.DataFrame({
+            'survived': [0, 1, 1, 0],
+            'sex': ['male', 'female', 'female', 'male'],
+            'pclass': [3, 1, 3, 2],
+            'age_group': pandas.Categorical(['young adult', 'adult', None, 'adult']),
+            'sibsp': [1, 1, 0, 0],
+            'alone': ['no', 'no', 'yes', 'yes'],
+            'parch': [0, 0, 0, 0],
+            'fare': [725.0, 7128.33, 792.5, -1.0],
+            'embarked': ['S', 'C', None, 'Q'],
+            'hours_traveling': [108.0, 102.0, None, 85.0]
+        })
+
+        def run(mode):
+            args = argparse.Namespace(step_name='validate', validation_mode=mode)
+            return cached_step(validate_features.step, data=features, args=args, cache=self.cache,
+                               step_kwargs={'args': args})
+
+        # The sample misses the invalid fare of the last row
+        with mock.patch('feature_validation.stratified_sample', side_effect=lambda data, **kwargs: data.iloc[:3]):
+            run('sampled')
+
+        with self.assertRaises(FeatureValidationError):
+            run('fail-fast')
+
+
+if __name__ == '__main__':
+    unittest.main()
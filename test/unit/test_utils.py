@@ -0,0 +1,78 @@
+import argparse
+import os
+import tempfile
+import unittest
+
+import pandas
+
+from data_io import read_data
+from data_wrangling import wrangle
+from utils import RunSummary, apply_step
+
+
+class TestRunSummary(unittest.TestCase):
+
+    def test_chunks_aggregation(self):
+        """ Test the summary aggregated by chunks matches the one of the whole data """
+        data = pandas.DataFrame({
+            'survived': [0, 1, 1, 0, 1],
+            'fare': [7.25, None, 7.925, 53.1, 8.05]
+        })
+
+        full = RunSummary().update(data).as_dict(total_time=0)
+        chunked = RunSummary().update(data.iloc[:2]).update(data.iloc[2:]).as_dict(total_time=0)
+
+        for key in ['n_samples', 'n_features', '%nan_values', 'prop_target', 'features']:
+            self.assertEqual(full[key], chunked[key], f'Summary {key} differs when aggregated by chunks')
+
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        pandas.DataFrame({
+            'PassengerId': range(1, 11),
+            'Survived': [0, 1] * 5,
+            'Name': ['Braund'] * 10,
+            'Ticket': ['PC 17599'] * 10,
+            'Cabin': ['C85', ''] * 5,
+            'Age': [22.0, None, 2.0, 35.0, 54.0] * 2
+        }).to_csv(os.path.join(self.tmp_dir.name, 'titanic.csv'), index=False)
+
+        self.args = argparse.Namespace(data_path=self.tmp_dir.name, input_file='titanic.csv', output_file=None,
+                                       file_format=None, columns=None, chunk_size=None, step_name='test')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_chunked_output(self):
+        """ Test streaming a row-local step writes the same output as processing the whole input """
+        self.args.output_file = 'full.parquet'
+        wrangle(args=self.args)
+
+        self.args.output_file = 'chunked.parquet'
+        self.args.chunk_size = 3
+        result = wrangle(args=self.args)
+
+        self.assertIsNone(result, 'Streamed result was kept in memory')
+        pandas.testing.assert_frame_equal(read_data(os.path.join(self.tmp_dir.name, 'full.parquet')),
+                                          read_data(os.path.join(self.tmp_dir.name, 'chunked.parquet')))
+
+
+class TestApplyStep(unittest.TestCase):
+
+    def test_step_args(self):
+        """ Test the steps declaring an `args` parameter receive the step arguments, whatever the number of workers """
+        def label(data: pandas.DataFrame, args: argparse.Namespace) -> pandas.DataFrame:
+            return data.assign(step=args.step_name)
+
+        data = pandas.DataFrame({'fare': [7.25, 8.05]})
+        for workers in [None, 2]:
+            args = argparse.Namespace(step_name='Labelling', workers=workers)
+            result = apply_step(label, data=data, args=args, step_kwargs={'args': args})
+
+            self.assertEqual(result['step'].tolist(), ['Labelling'] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()